@@ -0,0 +1,157 @@
+"""Async (ASGI-native) versions of the JSON API views.
+
+Same URLs and payloads as the sync views in ``views.py``; enabled by setting
+``NOTES_ASYNC_API = True`` (see ``urls.py``) when serving through ``asgi.py``.
+Reads and writes go through Django's async ORM, CPU-bound work (markdown
+rendering, article extraction) runs in worker threads, and URL imports fetch
+through the shared pooled async HTTP client so one process can keep many
+slow imports in flight.
+"""
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.http import HttpRequest, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from .conditional import collection_etag, is_conditional, not_modified, note_etag, set_validators
+from .models import Note
+from .pagination import akeyset_page, parse_fields, parse_page_size
+from .search import MAX_LIMIT, search_notes
+from .views import _parse_json, _serialize_note_row, build_preview, delete_note, update_note
+
+
+def _is_authenticated(request) -> bool:
+    # Resolves the lazy request.user (a session/DB lookup) outside the loop
+    return request.user.is_authenticated
+
+
+class AsyncApiView(View):
+    async def dispatch(self, request: HttpRequest, *args, **kwargs):
+        if not await sync_to_async(_is_authenticated)(request):
+            return JsonResponse({"detail": "Authentication required"}, status=401)
+        if request.method.lower() in self.http_method_names:
+            handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+        else:
+            handler = self.http_method_not_allowed
+        return await handler(request, *args, **kwargs)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class NotesListCreate(AsyncApiView):
+    async def get(self, request: HttpRequest):
+        try:
+            fields = parse_fields(request.GET.get("fields"))
+            limit = parse_page_size(request.GET.get("limit"))
+        except ValueError as e:
+            return JsonResponse({"detail": str(e)}, status=400)
+        etag = await sync_to_async(collection_etag)(request)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        qs = Note.objects.filter(owner=request.user).values(*set(fields) | {"id", "updated_at"})
+        q = request.GET.get("q")
+        next_cursor = None
+        if q:
+            hits = await sync_to_async(search_notes)(request.user, q, min(limit, MAX_LIMIT))
+            by_id = {r["id"]: r async for r in qs.filter(pk__in=[h["id"] for h in hits])}
+            rows = [by_id[h["id"]] for h in hits if h["id"] in by_id]
+        else:
+            try:
+                rows, next_cursor = await akeyset_page(qs, request.GET.get("cursor"), limit)
+            except ValueError as e:
+                return JsonResponse({"detail": str(e)}, status=400)
+        data = [_serialize_note_row(r, fields) for r in rows]
+        return set_validators(JsonResponse({"results": data, "next_cursor": next_cursor}, status=200), etag)
+
+    async def post(self, request: HttpRequest):
+        payload = _parse_json(request) if request.content_type == "application/json" else request.POST
+        title = (payload.get("title") or "").strip()
+        content = payload.get("content") or ""
+        if not title:
+            return JsonResponse({"detail": "title is required"}, status=400)
+        base = title
+        suffix = 1
+        while True:
+            try:
+                note = await Note.objects.acreate(owner=request.user, title=title, content=content)
+                break
+            except IntegrityError:
+                suffix += 1
+                cut = 200 - len(f" ({suffix})")
+                title = f"{base[:cut]} ({suffix})"
+                if suffix > 1000:
+                    return JsonResponse({"detail": "too many duplicates"}, status=409)
+        return JsonResponse({"id": note.id, "title": note.title, "content": note.content}, status=201)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class NotesDetail(AsyncApiView):
+    async def get_object(self, request: HttpRequest, pk: int):
+        return await Note.objects.filter(owner=request.user, pk=pk).afirst()
+
+    async def get(self, request: HttpRequest, pk: int):
+        if is_conditional(request):
+            qs = Note.objects.filter(owner=request.user, pk=pk).values_list("version", "updated_at")
+            stamp = await qs.afirst()
+            if stamp is None:
+                return JsonResponse({"detail": "not found"}, status=404)
+            cached = not_modified(request, note_etag(pk, stamp[0]), stamp[1])
+            if cached is not None:
+                return cached
+        note = await self.get_object(request, pk)
+        if not note:
+            return JsonResponse({"detail": "not found"}, status=404)
+        data = {
+            "id": note.id,
+            "title": note.title,
+            "content": note.content,
+            "version": note.version,
+            "created_at": note.created_at.isoformat(),
+            "updated_at": note.updated_at.isoformat(),
+        }
+        return set_validators(JsonResponse(data, status=200), note_etag(note.pk, note.version), note.updated_at)
+
+    async def patch(self, request: HttpRequest, pk: int):
+        note = await self.get_object(request, pk)
+        if not note:
+            return JsonResponse({"detail": "not found"}, status=404)
+        return await sync_to_async(update_note)(request, note, _parse_json(request))
+
+    put = patch
+
+    async def delete(self, request: HttpRequest, pk: int):
+        note = await self.get_object(request, pk)
+        if not note:
+            return JsonResponse({"detail": "not found"}, status=404)
+        return await sync_to_async(delete_note)(request, note, _parse_json(request))
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class NotesPreview(AsyncApiView):
+    async def post(self, request: HttpRequest):
+        data, status = await sync_to_async(build_preview)(request.user.pk, _parse_json(request))
+        return JsonResponse(data, status=status)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class NotesImportUrl(AsyncApiView):
+    """Import a URL inline without holding a thread while the page downloads."""
+
+    async def post(self, request: HttpRequest):
+        from .importer import ImportFailed, afetch_article, build_content, create_note_unique, is_valid_url
+
+        payload = _parse_json(request)
+        url = (payload.get('url') or '').strip()
+        summarize = bool(payload.get('summarize'))
+        if not is_valid_url(url):
+            return JsonResponse({"detail": "valid http(s) url required"}, status=400)
+        try:
+            title, markdown_body, final_url = await afetch_article(url)
+            content = await sync_to_async(build_content, thread_sensitive=False)(
+                title, final_url, markdown_body, summarize
+            )
+            note = await sync_to_async(create_note_unique)(request.user, title, content)
+        except ImportFailed as e:
+            return JsonResponse({"detail": str(e)}, status=400)
+        return JsonResponse({"id": note.id, "title": note.title}, status=201)
@@ -0,0 +1,226 @@
+"""Synthetic corpora and endpoint benchmarks (see the ``benchmark`` command).
+
+``generate_corpus`` fills the database with users and notes whose size
+distribution and wikilink density are configurable; ``run_benchmarks`` then
+drives the real views through the test client and reports latency
+percentiles and SQL query counts per scenario, as plain JSON-serializable
+dicts so results from different commits can be compared.
+"""
+import json
+import math
+import random
+import statistics
+import time
+from typing import Callable, Optional
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .bulk import create_notes_bulk
+from .models import Note
+
+SIZE_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+SCENARIOS = ("list", "list_api", "search", "detail", "preview", "export", "import")
+VOCABULARY_SIZE = 2000
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "an", "el", "or", "um", "is", "et")
+
+
+def make_vocabulary(rng: random.Random, size: int = VOCABULARY_SIZE) -> list[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def note_size(rng: random.Random, mean: int, distribution: str) -> int:
+    if distribution == "fixed":
+        return mean
+    if distribution == "uniform":
+        return rng.randint(mean // 2, mean * 3 // 2)
+    if distribution == "lognormal":
+        # sigma=1 gives a long tail; mu keeps the mean at ``mean``
+        sigma = 1.0
+        return max(1, int(rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)))
+    raise ValueError(f"unknown size distribution: {distribution}")
+
+
+def make_content(rng: random.Random, vocabulary: list[str], size: int, links: list[str]) -> str:
+    words: list[str] = []
+    length = 0
+    while length < size:
+        word = rng.choice(vocabulary)
+        words.append(word)
+        length += len(word) + 1
+    for title in links:
+        words.insert(rng.randrange(len(words) + 1), f"[[{title}]]")
+    # Paragraphs of ~60 words keep block-mode previews realistic
+    paras = [" ".join(words[i:i + 60]) for i in range(0, len(words), 60)]
+    return "\n\n".join(paras)
+
+
+def generate_corpus(
+    users: int = 2,
+    notes_per_user: int = 200,
+    link_density: float = 2.0,
+    mean_size: int = 1500,
+    size_distribution: str = "lognormal",
+    seed: int = 0,
+) -> dict:
+    """Create ``users`` users with ``notes_per_user`` notes each.
+
+    ``link_density`` is the average number of wikilinks per note, pointing at
+    random notes of the same user. Returns the created users, the vocabulary
+    and the generation parameters.
+    """
+    if size_distribution not in SIZE_DISTRIBUTIONS:
+        raise ValueError(f"unknown size distribution: {size_distribution}")
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    User = get_user_model()
+    created_users = []
+    for u in range(users):
+        user = User(username=f"bench-{seed}-{u}-{rng.getrandbits(32):08x}")
+        user.set_unusable_password()
+        user.save()
+        titles = [f"Note {u}-{i} {rng.choice(vocabulary)}" for i in range(notes_per_user)]
+        items = []
+        for title in titles:
+            n_links = min(len(titles), int(rng.expovariate(1 / link_density))) if link_density > 0 else 0
+            links = rng.sample(titles, n_links)
+            size = note_size(rng, mean_size, size_distribution)
+            items.append((title, make_content(rng, vocabulary, size, links)))
+        create_notes_bulk(user, items)
+        created_users.append(user)
+    return {
+        "users": created_users,
+        "vocabulary": vocabulary,
+        "params": {
+            "users": users,
+            "notes_per_user": notes_per_user,
+            "link_density": link_density,
+            "mean_size": mean_size,
+            "size_distribution": size_distribution,
+            "seed": seed,
+        },
+    }
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct
+    lo, hi = math.floor(k), math.ceil(k)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def measure(call: Callable[[int], object], iterations: int, warmup: int = 1) -> dict:
+    """Time ``call(i)`` and count its queries; responses must not be errors."""
+    for i in range(warmup):
+        _consume(call(-1 - i))
+    timings, queries, errors = [], [], 0
+    for i in range(iterations):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = call(i)
+            _consume(response)
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            errors += 1
+        timings.append(elapsed * 1000)
+        queries.append(len(ctx.captured_queries))
+    return {
+        "iterations": iterations,
+        "errors": errors,
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": round(_percentile(timings, 0.5), 3),
+        "p95_ms": round(_percentile(timings, 0.95), 3),
+        "min_ms": round(min(timings), 3),
+        "max_ms": round(max(timings), 3),
+        "queries_min": min(queries),
+        "queries_max": max(queries),
+    }
+
+
+def _consume(response) -> None:
+    if getattr(response, "streaming", False):
+        for _ in response.streaming_content:
+            pass
+
+
+def run_benchmarks(corpus: dict, iterations: int = 20, scenarios=SCENARIOS, warmup: int = 1,
+                   import_size: int = 50, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    user = corpus["users"][0]
+    vocabulary = corpus["vocabulary"]
+    note_ids = list(Note.objects.filter(owner=user).values_list("pk", flat=True))
+    sample_text = Note.objects.filter(owner=user).values_list("content", flat=True).first() or ""
+    client = Client()
+    client.force_login(user)
+
+    def preview(i):
+        # Keep the per-user preview rate limit out of the measurement
+        cache.delete(f"notes_preview_rate_{user.pk}")
+        return client.post("/api/notes/preview/", {"text": sample_text}, content_type="application/json")
+
+    def do_import(i):
+        lines = "\n".join(
+            json.dumps({"title": f"Imported {i}-{j}-{rng.getrandbits(32):08x}", "content": " ".join(
+                rng.choices(vocabulary, k=200))})
+            for j in range(import_size)
+        )
+        return client.post("/api/notes/import/", lines, content_type="application/x-ndjson")
+
+    calls: dict[str, Callable[[int], object]] = {
+        "list": lambda i: client.get("/"),
+        "list_api": lambda i: client.get("/api/notes/?limit=50"),
+        "search": lambda i: client.get("/api/notes/search/", {"q": rng.choice(vocabulary)}),
+        "detail": lambda i: client.get(f"/{rng.choice(note_ids)}/"),
+        "preview": preview,
+        "export": lambda i: client.get("/api/notes/export/", {"all": 1, "links": 1}),
+        "import": do_import,
+    }
+    results = {}
+    for name in scenarios:
+        if name not in calls:
+            raise ValueError(f"unknown scenario: {name}")
+        results[name] = measure(calls[name], iterations, warmup)
+    return results
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """Relative p50 change and query delta per scenario present in both runs."""
+    diff = {}
+    for name, result in current.get("results", {}).items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        p50 = base["p50_ms"]
+        diff[name] = {
+            "p50_change_pct": round((result["p50_ms"] - p50) / p50 * 100, 1) if p50 else None,
+            "queries_delta": result["queries_max"] - base["queries_max"],
+        }
+    return diff
+
+
+def environment_info() -> dict:
+    import platform
+    import subprocess
+
+    import django
+
+    commit: Optional[str] = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except Exception:
+        pass
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "platform": platform.platform(),
+    }
@@ -0,0 +1,346 @@
+"""Bulk note writes shared by the import and batch endpoints.
+
+Titles are deduplicated in memory against one pre-fetched set of the owner's
+titles, rows are written with ``bulk_create``/``bulk_update`` in batches, and
+search/link maintenance runs once per batch or once at the end rather than
+per row.
+"""
+from typing import Iterable, Optional
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .changes import record_changes
+from .links import (
+    chunked,
+    link_set_hash,
+    resolve_pending_links,
+    sync_outbound_links,
+    unresolve_inbound_links,
+)
+from .models import Note, NoteChange, NoteLink
+from .revisions import record_revisions
+from .search import get_search_backend
+from .signals import suspend_note_signals
+from .textpatch import apply_patch
+from .utils import extract_wikilinks
+from .versions import GRAPH, TITLES, bump_versions
+
+TITLE_MAX_LENGTH = 200
+BATCH_SIZE = 500
+BATCH_OPS = ("create", "update", "delete")
+
+
+class BatchError(Exception):
+    """The batch was rejected; ``errors`` lists ``{"index", "status", "detail"}``
+    for each offending operation and nothing was written."""
+
+    def __init__(self, errors: list[dict]):
+        super().__init__(f"{len(errors)} invalid operation(s)")
+        self.errors = errors
+
+
+def unique_title(title: str, taken: set) -> Optional[str]:
+    """Return ``title`` or ``"title (n)"`` not present in ``taken``.
+
+    Mirrors the suffix scheme of the single-note create endpoint and gives up
+    (returns None) after 1000 attempts.
+    """
+    base = (title or "").strip()[:TITLE_MAX_LENGTH]
+    candidate = base
+    suffix = 1
+    while candidate in taken:
+        suffix += 1
+        if suffix > 1000:
+            return None
+        cut = TITLE_MAX_LENGTH - len(f" ({suffix})")
+        candidate = f"{base[:cut]} ({suffix})"
+    return candidate
+
+
+def create_notes_bulk(owner, items: Iterable[tuple[str, str]], batch_size: int = BATCH_SIZE) -> dict:
+    """Create notes from ``(title, content)`` pairs for ``owner``.
+
+    ``items`` is consumed lazily, so callers can stream input. Returns a
+    summary with ``created`` (list of ``(id, title)``), ``results`` (one
+    ``(id, title)`` or None per input item, in order), ``renamed`` count and
+    ``skipped`` titles that could not be made unique.
+
+    Raises BatchError (409) if a concurrent write takes one of the titles
+    before the transaction commits; nothing is written then.
+    """
+    created: list[tuple[int, str]] = []
+    results: list = []
+    wanted_links: dict[int, list[str]] = {}
+    renamed = 0
+    skipped: list[str] = []
+    backend = get_search_backend()
+
+    def flush(batch, batch_links):
+        Note.objects.bulk_create(batch, batch_size=batch_size)
+        backend.index_notes(batch)
+        record_changes(owner.pk, [(note.pk, NoteChange.CREATED, note.title) for note in batch])
+        for note, titles in zip(batch, batch_links):
+            created.append((note.pk, note.title))
+            results[note._result_index] = (note.pk, note.title)
+            if titles:
+                wanted_links[note.pk] = titles
+
+    try:
+        with transaction.atomic():
+            taken = set(Note.objects.filter(owner=owner).values_list("title", flat=True))
+            batch: list[Note] = []
+            batch_links: list[list[str]] = []
+            for title, content in items:
+                results.append(None)
+                final = unique_title(title, taken)
+                if final is None or not final:
+                    skipped.append(title)
+                    continue
+                if final != (title or "").strip():
+                    renamed += 1
+                taken.add(final)
+                titles = extract_wikilinks(content or "")
+                note = Note(owner=owner, title=final, content=content or "", links_hash=link_set_hash(titles))
+                note._result_index = len(results) - 1
+                batch.append(note)
+                batch_links.append(titles)
+                if len(batch) >= batch_size:
+                    flush(batch, batch_links)
+                    batch, batch_links = [], []
+            if batch:
+                flush(batch, batch_links)
+            # One pass once every title exists, so imported notes can link to each other
+            sync_outbound_links(owner.pk, wanted_links, created=[pk for pk, _ in created])
+            # Existing notes that were waiting for one of the new titles
+            resolve_pending_links(owner.pk, {title: pk for pk, title in created})
+    except IntegrityError:
+        # A title was taken by a concurrent write after it was read
+        raise BatchError([{"index": None, "status": 409, "detail": "title conflict while creating notes"}])
+    if created:
+        bump_versions(owner.pk, GRAPH, TITLES)
+
+    return {"created": created, "results": results, "renamed": renamed, "skipped": skipped}
+
+
+def _integer(value) -> Optional[int]:
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def _note_id(op: dict) -> Optional[int]:
+    return _integer(op.get("id"))
+
+
+def _clean_title(value) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    title = value.strip()
+    return title if 0 < len(title) <= TITLE_MAX_LENGTH else None
+
+
+def apply_batch(owner, operations: list) -> list[dict]:
+    """Apply create/update/delete operations for ``owner`` all-or-nothing.
+
+    Each operation is ``{"op": "create", "title", "content"}``,
+    ``{"op": "update", "id", "title"?, "content"?|"patch"?, "version"?}`` or
+    ``{"op": "delete", "id", "version"?}``, applied in order: a delete frees
+    its title for later operations, and several updates of one note merge.
+    Created titles get the ``" (n)"`` suffix on collision like the single
+    create endpoint; renaming onto a taken title is a conflict, and so is a
+    ``version`` that is not the note's stored one. A ``patch`` (see
+    ``textpatch.py``) needs a ``version`` and applies to the content left by
+    earlier operations.
+
+    Everything is planned in memory first, then written with a fixed number
+    of queries per chunk, and links, search and versions are maintained
+    once for all affected notes. Returns one result dict per operation;
+    raises ``BatchError`` if any operation is invalid.
+    """
+    ids = {_note_id(op) for op in operations if isinstance(op, dict) and op.get("op") in ("update", "delete")}
+    ids.discard(None)
+    notes: dict[int, Note] = {}
+    for chunk in chunked(ids):
+        notes.update((n.pk, n) for n in Note.objects.filter(owner=owner, pk__in=chunk))
+    # Stored state of each note, kept as a revision if an update changes it
+    originals = {pk: (n.title, n.content, n.version) for pk, n in notes.items()}
+    taken = dict(Note.objects.filter(owner=owner).values_list("title", "pk"))
+
+    errors: list[dict] = []
+    results: list[dict] = []
+    creates: list[Note] = []
+    updated: dict[int, Note] = {}
+    deleted: dict[int, Note] = {}
+    renamed_from: dict[int, str] = {}
+
+    def fail(index, status, detail):
+        errors.append({"index": index, "status": status, "detail": detail})
+
+    for index, op in enumerate(operations):
+        kind = op.get("op") if isinstance(op, dict) else None
+        if kind not in BATCH_OPS:
+            fail(index, 400, f"op must be one of {', '.join(BATCH_OPS)}")
+            continue
+        content = op.get("content")
+        if content is not None and not isinstance(content, str):
+            fail(index, 400, "content must be a string")
+            continue
+        if kind == "create":
+            title = _clean_title(op.get("title"))
+            final = unique_title(title, taken) if title else None
+            if not final:
+                fail(index, 400, "title is required" if not title else "too many duplicates")
+                continue
+            note = Note(owner=owner, title=final, content=content or "")
+            # Placeholder key until bulk_create assigns the pk
+            taken[final] = note
+            creates.append(note)
+            results.append({"op": kind, "note": note})
+            continue
+
+        pk = _note_id(op)
+        if pk is None:
+            fail(index, 400, "id must be an integer")
+            continue
+        note = notes.get(pk)
+        if note is None or note.pk in deleted:
+            fail(index, 404, "not found")
+            continue
+        version = op.get("version")
+        if version is not None and _integer(version) is None:
+            fail(index, 400, "version must be an integer")
+            continue
+        if version is not None and version != note.version:
+            fail(index, 409, f"version conflict: current version is {note.version}")
+            continue
+        if kind == "delete":
+            deleted[note.pk] = note
+            updated.pop(note.pk, None)
+            if taken.get(note.title) == note.pk:
+                del taken[note.title]
+            results.append({"op": kind, "id": note.pk})
+            continue
+        if "title" in op:
+            title = _clean_title(op["title"])
+            if title is None:
+                fail(index, 400, "title must be 1-200 characters")
+                continue
+            if title != note.title:
+                if title in taken:
+                    fail(index, 409, "note with same title already exists")
+                    continue
+                del taken[note.title]
+                taken[title] = note.pk
+                renamed_from.setdefault(note.pk, note.title)
+                note.title = title
+        if op.get("patch") is not None:
+            if content is not None or version is None:
+                fail(index, 400, "patch needs a version and no content")
+                continue
+            try:
+                content = apply_patch(note.content, op["patch"])
+            except ValueError as e:
+                fail(index, 400, str(e))
+                continue
+        if content is not None:
+            note.content = content
+        updated[note.pk] = note
+        results.append({"op": kind, "note": note})
+
+    if errors:
+        raise BatchError(errors)
+
+    now = timezone.now()
+    wanted_links: dict[int, list[str]] = {}
+    backend = get_search_backend()
+
+    try:
+        with transaction.atomic(), suspend_note_signals():
+            # The plan was checked against rows read outside the transaction:
+            # lock them and make sure no other write got in between
+            touched = [*deleted, *updated]
+            stored = {}
+            for chunk in chunked(touched):
+                stored.update(Note.objects.select_for_update().filter(pk__in=chunk).values_list("pk", "version"))
+            moved = sorted(pk for pk in touched if stored.get(pk) != originals[pk][2])
+            if moved:
+                raise BatchError([{
+                    "index": None, "status": 409,
+                    "detail": f"notes changed while the batch was applied: {', '.join(map(str, moved))}",
+                }])
+            if deleted:
+                # Links into deleted notes become pending again under the
+                # titles they had before this batch
+                inbound = []
+                for chunk in chunked(deleted):
+                    inbound += NoteLink.objects.filter(to_note_id__in=chunk).values_list("from_note_id", "to_note_id")
+                for chunk in chunked(deleted):
+                    Note.objects.filter(pk__in=chunk).delete()
+                backend.remove_notes(list(deleted))
+                unresolve_inbound_links(owner.pk, [
+                    (source, renamed_from.get(target, deleted[target].title))
+                    for source, target in inbound if source not in deleted
+                ])
+
+            renamed = {pk: old for pk, old in renamed_from.items() if pk in updated and updated[pk].title != old}
+            if renamed:
+                inbound = []
+                for chunk in chunked(renamed):
+                    links = NoteLink.objects.filter(to_note_id__in=chunk)
+                    inbound += [(source, renamed[target]) for source, target in
+                                links.values_list("from_note_id", "to_note_id")]
+                    links.delete()
+                unresolve_inbound_links(owner.pk, inbound)
+
+            if updated:
+                changed = list(updated.values())
+                for note in changed:
+                    titles = extract_wikilinks(note.content)
+                    digest = link_set_hash(titles)
+                    if digest != note.links_hash:
+                        note.links_hash = digest
+                        wanted_links[note.pk] = titles
+                    note.updated_at = now
+                    note.version += 1
+                Note.objects.bulk_update(
+                    changed, ["title", "content", "links_hash", "updated_at", "version"], batch_size=BATCH_SIZE
+                )
+                backend.index_notes(changed)
+                record_revisions((note, *originals[note.pk]) for note in changed)
+
+            if creates:
+                for note in creates:
+                    titles = extract_wikilinks(note.content)
+                    note.links_hash = link_set_hash(titles)
+                    note._wanted_titles = titles
+                Note.objects.bulk_create(creates, batch_size=BATCH_SIZE)
+                backend.index_notes(creates)
+                wanted_links.update((note.pk, note._wanted_titles) for note in creates if note._wanted_titles)
+
+            record_changes(owner.pk, [
+                (pk, NoteChange.DELETED, renamed_from.get(pk, note.title)) for pk, note in deleted.items()
+            ] + [
+                (pk, NoteChange.RENAMED, note.title, renamed[pk]) if pk in renamed else (pk, NoteChange.UPDATED, note.title)
+                for pk, note in updated.items()
+            ] + [(note.pk, NoteChange.CREATED, note.title) for note in creates])
+
+            # Every title exists now, so batch notes can link to each other
+            sync_outbound_links(owner.pk, wanted_links, created=[n.pk for n in creates])
+            new_titles = {n.title: n.pk for n in creates}
+            new_titles.update((updated[pk].title, pk) for pk in renamed)
+            resolve_pending_links(owner.pk, new_titles)
+    except IntegrityError:
+        # e.g. titles swapped between notes within one UPDATE statement
+        raise BatchError([{"index": None, "status": 409, "detail": "title conflict while applying the batch"}])
+
+    if creates or deleted or renamed:
+        bump_versions(owner.pk, GRAPH, TITLES)
+    elif wanted_links:
+        bump_versions(owner.pk, GRAPH)
+
+    out = []
+    for result in results:
+        note = result.pop("note", None)
+        if note is not None:
+            result.update(id=note.pk, title=note.title, version=note.version)
+        out.append(result)
+    return out
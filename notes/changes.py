@@ -0,0 +1,149 @@
+"""Per-owner change feed for delta sync.
+
+Every note write appends a ``NoteChange`` row (from the save/delete signals,
+or in bulk from ``bulk.py``) numbered from the owner's ``ChangeSequence``;
+that number is what clients poll from. ``changes_since`` reads one page of
+log entries after a cursor, collapses them to the latest state per note and
+loads the current rows of the notes that still exist with one query, so a
+poll costs O(changes) rather than O(corpus). Deleted notes come back as
+tombstones.
+
+Sequence numbers are allocated under a lock on the owner's sequence row,
+held until the entries commit. An owner's entries therefore become visible
+in sequence order, and a poll that has seen entry N never misses an entry
+below N that commits later (as auto-increment ids could on Postgres).
+"""
+from typing import Iterable, Optional
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import ChangeSequence, Note, NoteChange
+from .pagination import DEFAULT_PAGE_SIZE, NOTE_FIELDS
+
+BATCH_SIZE = 500
+
+
+def _advance(owner_id, count: int) -> Optional[int]:
+    """Add ``count`` to the owner's sequence; the new value, or None without a row."""
+    if connection.vendor == "postgresql" or (
+        connection.vendor == "sqlite" and connection.features.can_return_rows_from_bulk_insert
+    ):
+        # One statement instead of an UPDATE and a read (SQLite has RETURNING from 3.35,
+        # the same versions Django returns bulk-insert rows for)
+        table = connection.ops.quote_name(ChangeSequence._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET value = value + %s WHERE owner_id = %s RETURNING value", [count, owner_id]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+    sequence = ChangeSequence.objects.filter(owner_id=owner_id)
+    if not sequence.update(value=F("value") + count):
+        return None
+    return sequence.values_list("value", flat=True).get()
+
+
+def allocate_seqs(owner_id, count: int = 1) -> int:
+    """Reserve ``count`` sequence numbers for the owner and return the first.
+
+    Call inside the transaction that inserts the entries: the row lock taken
+    here is what orders their visibility.
+    """
+    value = _advance(owner_id, count)
+    if value is None:
+        try:
+            with transaction.atomic():
+                ChangeSequence.objects.create(owner_id=owner_id, value=count)
+            value = count
+        except IntegrityError:
+            # Another writer created it first
+            value = _advance(owner_id, count)
+    return value - count + 1
+
+
+def current_seq(owner_id) -> int:
+    """The owner's last allocated sequence number (0 before any change)."""
+    return ChangeSequence.objects.filter(owner_id=owner_id).values_list("value", flat=True).first() or 0
+
+
+def record_change(owner_id, note_id, kind: str, title: str, old_title: str = "") -> None:
+    record_changes(owner_id, [(note_id, kind, title, old_title)])
+
+
+def record_changes(owner_id, entries: Iterable[tuple]) -> None:
+    """Log ``(note_id, kind, title[, old_title])`` entries in order."""
+    entries = list(entries)
+    if not entries:
+        return
+    with transaction.atomic(savepoint=False):
+        first = allocate_seqs(owner_id, len(entries))
+        rows = [
+            NoteChange(owner_id=owner_id, seq=first + i, note_id=e[0], kind=e[1], title=e[2],
+                       old_title=e[3] if len(e) > 3 else "")
+            for i, e in enumerate(entries)
+        ]
+        NoteChange.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def parse_since(value) -> int:
+    try:
+        since = int(value) if value else 0
+    except (TypeError, ValueError):
+        raise ValueError("invalid since")
+    if since < 0:
+        raise ValueError("invalid since")
+    return since
+
+
+def changes_since(owner_id, since: int = 0, limit: int = DEFAULT_PAGE_SIZE, fields=NOTE_FIELDS) -> dict:
+    """One page of the owner's changes after sequence ``since``.
+
+    Returns ``{"changes", "cursor", "has_more"}``. Each change is either
+    ``{"op": "upsert", "seq", "id", <fields>, "renamed_from"?}`` with the
+    note's current values, or ``{"op": "delete", "seq", "id", "title"}``.
+    ``cursor`` is the sequence to pass as ``since`` next time; it equals
+    ``since`` when nothing changed.
+    """
+    entries = list(
+        NoteChange.objects.filter(owner_id=owner_id, seq__gt=since)
+        .order_by("seq")
+        .values_list("seq", "note_id", "kind", "title", "old_title")[: limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    latest: dict[int, tuple] = {}
+    renamed_from: dict[int, str] = {}
+    created: set[int] = set()
+    for seq, note_id, kind, title, old_title in entries:
+        # Re-inserting keeps notes ordered by their last change
+        latest.pop(note_id, None)
+        latest[note_id] = (seq, kind, title)
+        if kind == NoteChange.CREATED:
+            created.add(note_id)
+        elif kind == NoteChange.RENAMED and note_id not in created:
+            # Only titles the client may already hold are worth reporting
+            renamed_from.setdefault(note_id, old_title)
+
+    live_ids = [pk for pk, (_, kind, _) in latest.items() if kind != NoteChange.DELETED]
+    rows = {}
+    if live_ids:
+        values = Note.objects.filter(owner_id=owner_id, pk__in=live_ids).values(*set(fields) | {"id", "title"})
+        rows = {row["id"]: row for row in values}
+
+    changes = []
+    for note_id, (seq, kind, title) in latest.items():
+        row: Optional[dict] = rows.get(note_id)
+        if row is None:
+            # Deleted, possibly by an entry on a later page
+            changes.append({"op": "delete", "seq": seq, "id": note_id, "title": title})
+            continue
+        change = {"op": "upsert", "seq": seq, "id": note_id}
+        for f in fields:
+            v = row[f]
+            change[f] = v.isoformat() if hasattr(v, "isoformat") else v
+        if note_id in renamed_from and renamed_from[note_id] != row["title"]:
+            change["renamed_from"] = renamed_from[note_id]
+        changes.append(change)
+    cursor = entries[-1][0] if entries else since
+    return {"changes": changes, "cursor": cursor, "has_more": has_more}
@@ -0,0 +1,83 @@
+"""HTTP validators (``ETag`` / ``Last-Modified``) for note resources.
+
+- A single note is validated by its ``version``, which every write path
+  advances. It also gets ``updated_at`` as Last-Modified. The same ETag
+  serves as the ``If-Match`` precondition for writes (``requested_version``).
+- A note's HTML page also shows its links and backlinks and their titles,
+  so its ETag adds the owner's change sequence (any note write) and GRAPH
+  version (link rebuilds, which may run after the write commits). It gets
+  no Last-Modified, because a backlink change does not touch ``updated_at``.
+- An owner's collection (list and search API) is validated by the owner's
+  change sequence plus the query string.
+
+The change sequence lives in the database (see ``changes.py``), so every
+process sees every write. The cache-backed GRAPH counter is only an extra
+input: with a per-process cache it can miss other processes' bumps, but
+those writes have already moved the sequence.
+
+Views answer ``If-None-Match`` / ``If-Modified-Since`` with ``not_modified``
+before loading or rendering anything. Unconditional requests take the normal
+path and only get the headers added, so they pay no extra query.
+"""
+import hashlib
+from typing import Optional
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_etags
+
+from .changes import current_seq
+
+
+def is_conditional(request) -> bool:
+    return "If-None-Match" in request.headers or "If-Modified-Since" in request.headers
+
+
+def note_etag(pk, version: int) -> str:
+    return f'"note-{pk}-v{version}"'
+
+
+def note_page_etag(pk, version: int, seq: int, graph_version: int) -> str:
+    """``seq`` and ``graph_version`` must be read before the page's links are loaded."""
+    return f'W/"page-{pk}-v{version}-{seq}-{graph_version}"'
+
+
+def collection_etag(request) -> str:
+    query = "&".join(sorted(f"{k}={v}" for k, values in request.GET.lists() for v in values))
+    digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+    return f'W/"notes-{current_seq(request.user.pk)}-{digest}"'
+
+
+def set_validators(response, etag: str, updated_at=None):
+    response["ETag"] = etag
+    if updated_at is not None:
+        response["Last-Modified"] = http_date(updated_at.timestamp())
+    # Per-user data: browsers may keep it but must revalidate every time
+    response["Cache-Control"] = "private, no-cache"
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
+
+def not_modified(request, etag: str, updated_at=None) -> Optional[object]:
+    """The 304 (or 412) response for a request whose validators match, else None."""
+    last_modified = int(updated_at.timestamp()) if updated_at is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, updated_at)
+    return response
+
+
+def requested_version(request, payload: dict, pk, current: int) -> Optional[int]:
+    """The note version a write was based on, or None if the client sent no precondition.
+
+    Taken from ``If-Match`` (the note's ETag) or, for clients that cannot set
+    headers, an integer ``version`` in the body. An If-Match naming any other
+    ETag yields 0, which no stored version equals. ``If-Match: *`` only asks
+    for the note to exist, so it counts as no precondition.
+    """
+    header = request.headers.get("If-Match", "").strip()
+    if header and header != "*":
+        return current if note_etag(pk, current) in parse_etags(header) else 0
+    version = payload.get("version")
+    if isinstance(version, int) and not isinstance(version, bool):
+        return version
+    return None
@@ -0,0 +1,35 @@
+"""Article extraction: readability for the main content, markdownify for markdown.
+
+Kept free of Django imports so it can run in a process pool worker.
+"""
+import re
+
+
+def extract_article(html: str) -> tuple[str, str]:
+    """Return ``(title, markdown)`` for the main content of ``html``."""
+    title = ''
+    main_html = ''
+    try:
+        from readability import Document  # type: ignore
+        doc = Document(html)
+        title = (doc.short_title() or '').strip()
+        main_html = (doc.summary(html_partial=True) or '')
+    except Exception:
+        # Fallback: naive title
+        m = re.search(r'<title>(.*?)</title>', html, flags=re.I | re.S)
+        if m:
+            title = re.sub(r'\s+', ' ', m.group(1)).strip()
+        # As last resort keep full html
+        main_html = html
+
+    if not title:
+        title = 'Imported Note'
+
+    # Convert to markdown (best-effort)
+    try:
+        import markdownify  # type: ignore
+        markdown_body = markdownify.markdownify(main_html or html)
+    except Exception:
+        # Simple strip tags
+        markdown_body = re.sub(r'<[^>]+>', '', main_html or html)
+    return title, (markdown_body or '').strip()
@@ -0,0 +1,136 @@
+"""Database-backed cache of fetched pages for URL imports.
+
+Entries are keyed by the normalized URL and keep the body, its validators
+(ETag / Last-Modified) and the extracted article. A repeat import within
+``NOTES_FETCH_CACHE_MAX_AGE`` seconds skips the network entirely; after that
+the page is revalidated with ``If-None-Match``/``If-Modified-Since``, and a
+304 (or an identical body) reuses the stored article so readability and
+markdownify do not run again.
+"""
+import hashlib
+from datetime import timedelta
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .http import Page
+from .models import FetchCache
+
+DEFAULT_MAX_AGE = 300
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+
+Article = tuple[str, str, str]  # (title, markdown, final_url)
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form used as the cache key.
+
+    Lowercases scheme and host, drops default ports, fragments and tracking
+    parameters, and sorts the query string.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+
+def body_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="replace")).hexdigest()
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "NOTES_FETCH_CACHE", True)
+
+
+def lookup(url: str) -> Optional[FetchCache]:
+    if not is_enabled():
+        return None
+    return FetchCache.objects.filter(url_hash=url_hash(url)).first()
+
+
+def lookup_many(urls) -> dict:
+    """Map each of ``urls`` to its cache entry (missing URLs are left out)."""
+    if not is_enabled():
+        return {}
+    keys = {url_hash(u): u for u in urls}
+    by_hash = {e.url_hash: e for e in FetchCache.objects.filter(url_hash__in=list(keys))}
+    return {u: by_hash[h] for h, u in keys.items() if h in by_hash}
+
+
+def is_fresh(entry: Optional[FetchCache]) -> bool:
+    if entry is None or not entry.body_hash:
+        return False
+    max_age = getattr(settings, "NOTES_FETCH_CACHE_MAX_AGE", DEFAULT_MAX_AGE)
+    return entry.validated_at >= timezone.now() - timedelta(seconds=max_age)
+
+
+def conditional_headers(entry: Optional[FetchCache]) -> dict:
+    headers = {}
+    if entry is not None and entry.body_hash:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+    return headers
+
+
+def cached_article(entry: FetchCache) -> Article:
+    return entry.title, entry.markdown, entry.final_url
+
+
+def reuse(entry: Optional[FetchCache], page: Page) -> Optional[Article]:
+    """The stored article if ``page`` shows it is still current, else None."""
+    if entry is None or not entry.body_hash:
+        return None
+    if page.status == 304 or entry.body_hash == body_hash(page.text):
+        return cached_article(entry)
+    return None
+
+
+def store(url: str, page: Page, article: Article) -> None:
+    """Record a fetch; a 304 only refreshes validators and ``validated_at``."""
+    if not is_enabled():
+        return
+    now = timezone.now()
+    key = url_hash(url)
+    if page.status == 304:
+        fields = {"validated_at": now}
+        if page.etag:
+            fields["etag"] = page.etag
+        if page.last_modified:
+            fields["last_modified"] = page.last_modified
+        FetchCache.objects.filter(url_hash=key).update(**fields)
+        return
+    title, markdown, final_url = article
+    defaults = {
+        "url": normalize_url(url),
+        "final_url": final_url,
+        "etag": page.etag[:255],
+        "last_modified": page.last_modified[:64],
+        "body": page.text,
+        "body_hash": body_hash(page.text),
+        "title": title[:255],
+        "markdown": markdown,
+        "fetched_at": now,
+        "validated_at": now,
+    }
+    try:
+        with transaction.atomic():
+            FetchCache.objects.update_or_create(url_hash=key, defaults=defaults)
+    except IntegrityError:
+        # A concurrent import stored the same URL first
+        pass
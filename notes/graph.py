@@ -0,0 +1,103 @@
+"""The per-owner note link graph as compact adjacency lists.
+
+The whole graph is built from two queries (node ids/titles and link pairs)
+and cached per owner under the ``graph`` version counter, which signals bump
+when notes are created, renamed or deleted or when links change.
+"""
+from bisect import bisect_left
+from collections import deque
+from typing import Optional
+
+from django.core.cache import cache
+
+from .models import Note, NoteLink
+from .versions import GRAPH, get_version
+
+GRAPH_CACHE_TIMEOUT = 24 * 3600
+MAX_HOPS = 5
+
+
+def load_graph(owner_id) -> dict:
+    """Return ``{"version", "ids", "titles", "adj"}`` for one owner.
+
+    ``ids``/``titles`` are parallel lists ordered by id; ``adj`` maps a node
+    index to the sorted indices of its outbound link targets and ``radj`` to
+    the indices of the nodes linking to it.
+    """
+    version = get_version(GRAPH, owner_id)
+    key = f"notes:graph:{owner_id}:{version}"
+    graph = cache.get(key)
+    if graph is None:
+        graph = _build_graph(owner_id)
+        graph["version"] = version
+        cache.set(key, graph, GRAPH_CACHE_TIMEOUT)
+    return graph
+
+
+def _build_graph(owner_id) -> dict:
+    nodes = list(Note.objects.filter(owner_id=owner_id).order_by("id").values_list("id", "title"))
+    index = {pk: i for i, (pk, _) in enumerate(nodes)}
+    adj: dict[int, list[int]] = {}
+    radj: dict[int, list[int]] = {}
+    pairs = NoteLink.objects.filter(from_note__owner_id=owner_id).values_list("from_note_id", "to_note_id")
+    for from_id, to_id in pairs:
+        if from_id in index and to_id in index:
+            adj.setdefault(index[from_id], []).append(index[to_id])
+            radj.setdefault(index[to_id], []).append(index[from_id])
+    for targets in adj.values():
+        targets.sort()
+    return {
+        "ids": [pk for pk, _ in nodes],
+        "titles": [title for _, title in nodes],
+        "adj": adj,
+        "radj": radj,
+    }
+
+
+def node_index(graph: dict, note_id: int) -> Optional[int]:
+    i = bisect_left(graph["ids"], note_id)
+    if i < len(graph["ids"]) and graph["ids"][i] == note_id:
+        return i
+    return None
+
+
+def neighbourhood(graph: dict, node_index: int, hops: int) -> list[int]:
+    """Indices within ``hops`` links of ``node_index``, following both directions."""
+    adj, radj = graph["adj"], graph["radj"]
+    seen = {node_index}
+    frontier = deque([(node_index, 0)])
+    while frontier:
+        node, depth = frontier.popleft()
+        if depth >= hops:
+            continue
+        for nxt in adj.get(node, []) + radj.get(node, []):
+            if nxt not in seen:
+                seen.add(nxt)
+                frontier.append((nxt, depth + 1))
+    return sorted(seen)
+
+
+def subgraph(graph: dict, indices: list[int]) -> tuple[list[int], list[str], list[list[int]]]:
+    """Restrict ``graph`` to ``indices``; returns ids, titles and re-indexed adjacency."""
+    remap = {old: new for new, old in enumerate(indices)}
+    ids = [graph["ids"][i] for i in indices]
+    titles = [graph["titles"][i] for i in indices]
+    adj = [[remap[t] for t in graph["adj"].get(i, []) if t in remap] for i in indices]
+    return ids, titles, adj
+
+
+def encode_compact(ids, titles, adj) -> dict:
+    """CSR encoding: targets of node i are ``targets[offsets[i]:offsets[i+1]]``."""
+    offsets = [0]
+    targets: list[int] = []
+    for row in adj:
+        targets.extend(row)
+        offsets.append(len(targets))
+    return {"ids": ids, "titles": titles, "offsets": offsets, "targets": targets}
+
+
+def encode_json(ids, titles, adj) -> dict:
+    return {
+        "nodes": [{"id": pk, "title": title} for pk, title in zip(ids, titles)],
+        "edges": [[ids[i], ids[t]] for i, row in enumerate(adj) for t in row],
+    }
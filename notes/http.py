@@ -0,0 +1,221 @@
+"""Shared, pooled HTTP clients for outbound page fetches.
+
+Both clients keep connections alive between imports and stop reading a
+response once ``MAX_BODY_BYTES`` have arrived, instead of downloading the
+whole body and truncating afterwards.
+
+- ``fetch``/``fetch_page`` use one ``requests.Session`` per process (urllib
+  when requests is not installed).
+- ``afetch``/``afetch_page`` use one ``httpx.AsyncClient`` per event loop with a per-host
+  concurrency limit, falling back to ``fetch`` in a worker thread when httpx
+  is not installed. The client is closed and forgotten when its loop shuts
+  down, so the short-lived loops ``async_to_sync`` runs per request do not
+  leak connection pools.
+"""
+import asyncio
+import threading
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+USER_AGENT = "NotesBot/1.0 (+https://example.local)"
+TIMEOUT = 10
+MAX_BODY_BYTES = 2_000_000
+CHUNK_SIZE = 64 * 1024
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE = 20
+PER_HOST_LIMIT = 4
+
+
+class FetchError(Exception):
+    """A fetch failed; ``status`` is the HTTP status of an error response, else None."""
+
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.status = status
+
+
+def _error_status(e: Exception):
+    """HTTP status carried by a requests/httpx/urllib error, if any."""
+    response = getattr(e, "response", None)
+    status = getattr(response, "status_code", None) if response is not None else getattr(e, "code", None)
+    return status if isinstance(status, int) else None
+
+
+class Page(NamedTuple):
+    """A fetched page. ``status`` 304 means the conditional request matched
+    and ``text`` is empty; ``etag``/``last_modified`` are the new validators.
+    """
+
+    text: str
+    url: str
+    status: int = 200
+    etag: str = ""
+    last_modified: str = ""
+
+
+def _decode(body: bytes, encoding) -> str:
+    return body.decode(encoding or "utf-8", errors="replace")
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide ``requests.Session`` with a sized connection pool."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=MAX_KEEPALIVE, pool_maxsize=PER_HOST_LIMIT)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["User-Agent"] = USER_AGENT
+                _session = session
+    return _session
+
+
+def fetch(url: str, headers: dict = None) -> tuple[str, str]:
+    """GET ``url`` and return ``(text, final_url)`` capped at MAX_BODY_BYTES."""
+    page = fetch_page(url, headers)
+    return page.text, page.url
+
+
+def fetch_page(url: str, headers: dict = None) -> Page:
+    """GET ``url`` as a ``Page``; pass validators in ``headers`` to revalidate."""
+    try:
+        session = get_session()
+    except ImportError:
+        return _fetch_urllib(url, headers)
+    try:
+        with session.get(url, headers=headers, timeout=TIMEOUT, allow_redirects=True, stream=True) as resp:
+            if resp.status_code == 304:
+                return _not_modified(resp.url or url, resp.headers)
+            resp.raise_for_status()
+            body = bytearray()
+            for chunk in resp.iter_content(CHUNK_SIZE):
+                body += chunk
+                if len(body) >= MAX_BODY_BYTES:
+                    break
+            text = _decode(bytes(body[:MAX_BODY_BYTES]), resp.encoding)
+            return _page(text, resp.url or url, resp.headers)
+    except Exception as e:
+        raise FetchError(str(e), _error_status(e)) from e
+
+
+def _page(text: str, url: str, headers, status: int = 200) -> Page:
+    return Page(text, url, status, headers.get("ETag") or "", headers.get("Last-Modified") or "")
+
+
+def _not_modified(url: str, headers) -> Page:
+    return _page("", url, headers, status=304)
+
+
+def _fetch_urllib(url: str, headers: dict = None) -> Page:
+    import urllib.error
+    import urllib.request
+
+    req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT, **(headers or {})})
+    try:
+        with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
+            body = resp.read(MAX_BODY_BYTES)
+            text = _decode(body, resp.headers.get_content_charset())
+            return _page(text, resp.geturl() or url, resp.headers)
+    except urllib.error.HTTPError as e:
+        # urllib reports 304 as an error
+        if e.code == 304:
+            return _not_modified(e.geturl() or url, e.headers)
+        raise FetchError(str(e), _error_status(e)) from e
+    except Exception as e:
+        raise FetchError(str(e), _error_status(e)) from e
+
+
+# Keyed by event loop. The values hold their loop (semaphores bind to it), so
+# entries are dropped explicitly rather than through weak references.
+_async_clients: dict = {}
+_host_limits: dict = {}
+
+
+def _forget_loop(loop) -> None:
+    _async_clients.pop(loop, None)
+    _host_limits.pop(loop, None)
+
+
+async def _release_at_shutdown(loop, client):
+    # Loops finalize live async generators on shutdown (``asyncio.run`` does)
+    try:
+        yield
+    finally:
+        # A replaced client must not take its successor's entry with it
+        if _async_clients.get(loop, (None,))[0] is client:
+            _forget_loop(loop)
+        await client.aclose()
+
+
+def get_async_client():
+    """The ``httpx.AsyncClient`` for the running loop (clients are loop-bound)."""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None or entry[0].is_closed:
+        # Loops closed without shutting down their async generators
+        for stale in [other for other in _async_clients if other.is_closed()]:
+            _forget_loop(stale)
+        client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+        )
+        closer = _release_at_shutdown(loop, client)
+        # Run it to its ``yield`` (no awaits before it) so the loop tracks it
+        try:
+            closer.asend(None).send(None)
+        except StopIteration:
+            pass
+        entry = _async_clients[loop] = (client, closer)
+    return entry[0]
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    limits = _host_limits.setdefault(asyncio.get_running_loop(), {})
+    host = urlsplit(url).netloc.lower()
+    sem = limits.get(host)
+    if sem is None:
+        sem = limits[host] = asyncio.Semaphore(PER_HOST_LIMIT)
+    return sem
+
+
+async def afetch(url: str, headers: dict = None) -> tuple[str, str]:
+    """Async ``fetch``: streams the body and stops at MAX_BODY_BYTES."""
+    page = await afetch_page(url, headers)
+    return page.text, page.url
+
+
+async def afetch_page(url: str, headers: dict = None) -> Page:
+    try:
+        client = get_async_client()
+    except ImportError:
+        from asgiref.sync import sync_to_async
+
+        return await sync_to_async(fetch_page, thread_sensitive=False)(url, headers)
+    try:
+        async with _host_semaphore(url):
+            async with client.stream("GET", url, headers=headers) as resp:
+                if resp.status_code == 304:
+                    return _not_modified(str(resp.url), resp.headers)
+                resp.raise_for_status()
+                body = bytearray()
+                async for chunk in resp.aiter_bytes(CHUNK_SIZE):
+                    body += chunk
+                    if len(body) >= MAX_BODY_BYTES:
+                        break
+                text = _decode(bytes(body[:MAX_BODY_BYTES]), resp.charset_encoding)
+                return _page(text, str(resp.url), resp.headers)
+    except Exception as e:
+        raise FetchError(str(e), _error_status(e)) from e
@@ -0,0 +1,224 @@
+"""Import a web page as a note: fetch, extract, convert, summarize, create.
+
+Each step is a plain function so the pipeline can run inline, from the job
+worker (``jobs.py``) or from the async API views.
+"""
+import atexit
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+from typing import Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import fetch_cache
+from .extract import extract_article
+from .http import FetchError, Page, afetch_page, fetch_page
+from .models import Note
+from .summaries import summarize_text
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INPUT_CHARS = 8000
+DEFAULT_FETCH_WORKERS = 8
+
+
+class ImportFailed(Exception):
+    """The page could not be imported; the message is safe to show users.
+
+    ``permanent`` failures (a 4xx response, too many duplicate titles) will
+    not succeed on retry.
+    """
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+def _fetch_failed(e: FetchError) -> ImportFailed:
+    # Timeouts and rate limits are worth retrying; other client errors are not
+    permanent = e.status is not None and 400 <= e.status < 500 and e.status not in (408, 429)
+    return ImportFailed(f"fetch failed: {e}", permanent=permanent)
+
+
+def is_valid_url(url: str) -> bool:
+    return bool(url) and bool(re.match(r'^https?://', url))
+
+
+def fetch_url(url: str, headers: dict = None) -> Page:
+    """Download ``url`` (at most 2MB) as a ``Page``."""
+    try:
+        return fetch_page(url, headers)
+    except FetchError as e:
+        raise _fetch_failed(e) from e
+
+
+async def afetch_url(url: str, headers: dict = None) -> Page:
+    try:
+        return await afetch_page(url, headers)
+    except FetchError as e:
+        raise _fetch_failed(e) from e
+
+
+def fetch_article(url: str, extract=None) -> tuple[str, str, str]:
+    """Return ``(title, markdown, final_url)`` for ``url`` via the fetch cache.
+
+    ``extract`` (default ``extract_article``) is only called when the page is
+    new or its body changed.
+    """
+    entry = fetch_cache.lookup(url)
+    page, article = _revalidate(url, entry, extract or extract_article)
+    if page is not None:
+        fetch_cache.store(url, page, article)
+    return article
+
+
+def _revalidate(url: str, entry, extract) -> tuple[Optional[Page], tuple[str, str, str]]:
+    # Network half of fetch_article; touches no database so it can run in threads
+    if fetch_cache.is_fresh(entry):
+        return None, fetch_cache.cached_article(entry)
+    page = fetch_url(url, fetch_cache.conditional_headers(entry))
+    article = fetch_cache.reuse(entry, page)
+    if article is None:
+        if page.status == 304:
+            raise ImportFailed("fetch failed: unexpected 304 response")
+        title, markdown_body = extract(page.text)
+        article = (title, markdown_body, page.url)
+    return page, article
+
+
+async def afetch_article(url: str) -> tuple[str, str, str]:
+    from asgiref.sync import sync_to_async
+
+    entry = await sync_to_async(fetch_cache.lookup)(url)
+    if fetch_cache.is_fresh(entry):
+        return fetch_cache.cached_article(entry)
+    page = await afetch_url(url, fetch_cache.conditional_headers(entry))
+    article = fetch_cache.reuse(entry, page)
+    if article is None:
+        if page.status == 304:
+            raise ImportFailed("fetch failed: unexpected 304 response")
+        title, markdown_body = await sync_to_async(extract_article, thread_sensitive=False)(page.text)
+        article = (title, markdown_body, page.url)
+    await sync_to_async(fetch_cache.store)(url, page, article)
+    return article
+
+
+def build_content(title: str, final_url: str, markdown_body: str, summarize: bool = False) -> str:
+    header = f"Source: {final_url}\nFetched: {datetime.utcnow().isoformat()}Z\n\n# {title}\n\n"
+    content = header + markdown_body
+    if summarize:
+        try:
+            summary = summarize_text(markdown_body[:SUMMARY_INPUT_CHARS])
+            if summary:
+                content += f"\n\n---\n## Summary\n\n{summary}\n"
+        except Exception:
+            pass
+    return content
+
+
+def create_note_unique(owner, title: str, content: str) -> Note:
+    """Create a note, suffixing `` (n)`` to the title until it is unique."""
+    base, t = title, title
+    suffix = 1
+    while True:
+        try:
+            with transaction.atomic():
+                return Note.objects.create(owner=owner, title=t[:200], content=content)
+        except IntegrityError:
+            suffix += 1
+            cut = 200 - len(f" ({suffix})")
+            t = f"{base[:cut]} ({suffix})"
+            if suffix > 1000:
+                raise ImportFailed("too many duplicates", permanent=True)
+
+
+def import_url(owner, url: str, summarize: bool = False) -> Note:
+    """Run the whole pipeline for one URL; raises ImportFailed."""
+    title, markdown_body, final_url = fetch_article(url)
+    content = build_content(title, final_url, markdown_body, summarize)
+    return create_note_unique(owner, title, content)
+
+
+_extract_pool: Optional[ProcessPoolExecutor] = None
+_extract_pool_lock = Lock()
+
+
+def get_extract_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared process pool for article extraction, or None to run inline.
+
+    Sized by ``NOTES_IMPORT_PROCESS_WORKERS``; 0 disables the pool. Workers
+    are spawned rather than forked, since the pool is fed from fetch threads
+    and forking a multithreaded process can copy held locks; the pool is
+    shut down at exit.
+    """
+    global _extract_pool
+    workers = getattr(settings, 'NOTES_IMPORT_PROCESS_WORKERS', 2)
+    if not workers:
+        return None
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            _extract_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_extract_pool.shutdown, cancel_futures=True)
+        return _extract_pool
+
+
+def _prepare_url(url: str, entry, summarize: bool, pool: Optional[ProcessPoolExecutor]):
+    # Runs in a fetch thread: network I/O here, CPU-bound extraction in the pool
+    def extract(html):
+        try:
+            if pool is not None:
+                return pool.submit(extract_article, html).result()
+            return extract_article(html)
+        except Exception as e:
+            raise ImportFailed(f"extract failed: {e}") from e
+
+    page, (title, markdown_body, final_url) = _revalidate(url, entry, extract)
+    content = build_content(title, final_url, markdown_body, summarize)
+    return page, (title, markdown_body, final_url), content
+
+
+def import_urls(owner, urls: list[str], summarize: bool = False) -> list[dict]:
+    """Import several URLs at once and return one result dict per URL.
+
+    Pages are fetched concurrently (``NOTES_IMPORT_FETCH_WORKERS`` threads),
+    extracted in the process pool and created with one ``create_notes_bulk``
+    call, so titles are deduped against a single pre-fetched set (a concurrent
+    title conflict raises its BatchError). Fetch cache reads and writes stay on
+    the calling thread.
+    """
+    from .bulk import create_notes_bulk
+
+    pool = get_extract_pool()
+    entries = fetch_cache.lookup_many(urls)
+    workers = max(1, min(len(urls), getattr(settings, 'NOTES_IMPORT_FETCH_WORKERS', DEFAULT_FETCH_WORKERS)))
+    results = [{"url": url, "status": "failed"} for url in urls]
+    prepared = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_prepare_url, url, entries.get(url), summarize, pool) for url in urls]
+        for i, future in enumerate(futures):
+            try:
+                page, article, content = future.result()
+            except ImportFailed as e:
+                results[i]["error"] = str(e)
+                continue
+            except Exception:
+                # One bad URL must not fail the whole list
+                logger.exception("importing %s crashed", urls[i])
+                results[i]["error"] = "import failed"
+                continue
+            if page is not None:
+                fetch_cache.store(urls[i], page, article)
+            prepared.append((i, (article[0], content)))
+
+    summary = create_notes_bulk(owner, (item for _, item in prepared))
+    for (i, _), created in zip(prepared, summary["results"]):
+        if created is None:
+            results[i]["error"] = "too many duplicates"
+        else:
+            results[i].update(status="created", id=created[0], title=created[1])
+    return results
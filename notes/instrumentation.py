@@ -0,0 +1,263 @@
+"""Per-request performance instrumentation.
+
+``InstrumentationMiddleware`` measures each request and records:
+
+- SQL query count and time, through an execute wrapper installed on every
+  database connection;
+- named sections timed with ``timed()`` (markdown rendering, link rebuilds,
+  template rendering);
+- total wall time, per resolved view.
+
+Each response gets a ``Server-Timing`` header, and totals are kept in a
+process-wide registry that ``metrics_view`` serves in the Prometheus text
+format at ``/metrics``. Recording is a few ``perf_counter`` calls and dict
+updates per event, so it is meant to stay on in production; set
+``NOTES_INSTRUMENTATION = False`` to disable it, or
+``NOTES_SERVER_TIMING = False`` to keep metrics but drop the header.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+DB = "db"
+RENDER = "render"
+LINKS = "links"
+TEMPLATE = "template"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    """Counts and seconds per section for one request."""
+
+    __slots__ = ("sections",)
+
+    def __init__(self):
+        self.sections: dict[str, list] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        entry = self.sections.get(name)
+        if entry is None:
+            self.sections[name] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def count(self, name: str) -> int:
+        return self.sections.get(name, (0, 0.0))[0]
+
+    def seconds(self, name: str) -> float:
+        return self.sections.get(name, (0, 0.0))[1]
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("notes_request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+class MetricsRegistry:
+    """Process-wide totals rendered by ``metrics_view``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = defaultdict(int)  # (view, method, status) -> count
+            self.duration_sum = defaultdict(float)  # view -> seconds
+            self.duration_buckets = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+            self.sections = defaultdict(lambda: [0, 0.0])  # (view, section) -> [count, seconds]
+
+    def observe(self, view: str, method: str, status: int, seconds: float, timings: RequestTimings) -> None:
+        with self._lock:
+            self.requests[(view, method, status)] += 1
+            self.duration_sum[view] += seconds
+            buckets = self.duration_buckets[view]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[-1] += 1
+            for name, (count, secs) in timings.sections.items():
+                entry = self.sections[(view, name)]
+                entry[0] += count
+                entry[1] += secs
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [
+                "# HELP notes_http_requests_total Requests by view, method and status.",
+                "# TYPE notes_http_requests_total counter",
+            ]
+            for (view, method, status), n in sorted(self.requests.items()):
+                lines.append(f'notes_http_requests_total{{view="{view}",method="{method}",status="{status}"}} {n}')
+            lines += [
+                "# HELP notes_http_request_duration_seconds Request wall time by view.",
+                "# TYPE notes_http_request_duration_seconds histogram",
+            ]
+            for view, buckets in sorted(self.duration_buckets.items()):
+                cumulative = 0
+                for bound, n in zip(DURATION_BUCKETS, buckets):
+                    cumulative += n
+                    lines.append(f'notes_http_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                cumulative += buckets[-1]
+                lines.append(f'notes_http_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {cumulative}')
+                lines.append(f'notes_http_request_duration_seconds_sum{{view="{view}"}} {self.duration_sum[view]:.6f}')
+                lines.append(f'notes_http_request_duration_seconds_count{{view="{view}"}} {cumulative}')
+            lines += [
+                "# HELP notes_section_calls_total Timed sections (db queries, render, links, template) by view.",
+                "# TYPE notes_section_calls_total counter",
+            ]
+            for (view, name), (count, _) in sorted(self.sections.items()):
+                lines.append(f'notes_section_calls_total{{view="{view}",section="{name}"}} {count}')
+            lines += [
+                "# HELP notes_section_seconds_total Time spent in timed sections by view.",
+                "# TYPE notes_section_seconds_total counter",
+            ]
+            for (view, name), (_, secs) in sorted(self.sections.items()):
+                lines.append(f'notes_section_seconds_total{{view="{view}",section="{name}"}} {secs:.6f}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def timed(name: str):
+    """Add the time spent in the block to the current request under ``name``.
+
+    Outside a request (management commands, workers) this only costs a
+    context variable lookup.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add(DB, time.perf_counter() - start)
+
+
+def install_query_hook(connection) -> None:
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install_query_hook(connection)
+
+
+connection_created.connect(_on_connection_created, dispatch_uid="notes_instrumentation_query_hook")
+
+
+def _view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return (match.view_name if match else "") or "unresolved"
+
+
+def server_timing(timings: RequestTimings, total: float) -> str:
+    parts = []
+    for name, (count, secs) in timings.sections.items():
+        desc = f';desc="{count} queries"' if name == DB else ""
+        parts.append(f"{name};dur={secs * 1000:.1f}{desc}")
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "NOTES_INSTRUMENTATION", True)
+        self.emit_header = getattr(settings, "NOTES_SERVER_TIMING", True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        # Connections opened before this module loaded miss connection_created
+        for conn in connections.all():
+            install_query_hook(conn)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        timings = RequestTimings()
+        # sync_to_async copies the context, so DB work in worker threads is counted too
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings, time.perf_counter() - start)
+
+    def process_template_response(self, request, response):
+        timings = _current.get()
+        if timings is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                timings.add(TEMPLATE, time.perf_counter() - start)
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def _finish(self, request, response, timings: RequestTimings, total: float):
+        registry.observe(_view_name(request), request.method, response.status_code, total, timings)
+        if self.emit_header:
+            response["Server-Timing"] = server_timing(timings, total)
+        return response
+
+
+def _metrics_allowed(request) -> bool:
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+    allowed = getattr(settings, "NOTES_METRICS_ALLOWED_IPS", ("127.0.0.1", "::1"))
+    return request.META.get("REMOTE_ADDR") in allowed
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint (staff users or ``NOTES_METRICS_ALLOWED_IPS``)."""
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
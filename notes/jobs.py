@@ -0,0 +1,161 @@
+"""DB-backed job queue for URL imports.
+
+Jobs live in ``ImportJob``; the ``import_worker`` management command claims
+them with a compare-and-set UPDATE (so several workers can share a
+database), runs them on a bounded thread pool, and retries failures with
+exponential backoff; permanent ``ImportFailed`` errors fail at once. No
+external broker is required.
+"""
+import logging
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .importer import ImportFailed, import_url
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_ACTIVE_PER_USER = 10
+DEFAULT_MAX_DAILY_PER_USER = 500
+RETRY_BASE_SECONDS = 30
+STALE_AFTER_SECONDS = 10 * 60
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def enqueue_import(owner, url: str, summarize: bool = False) -> ImportJob:
+    """Queue an import for ``owner``; raises QuotaExceeded over the limits.
+
+    The owner's row is locked while the limits are checked, so concurrent
+    requests cannot all pass them before any job is inserted.
+    """
+    max_active = getattr(settings, "NOTES_IMPORT_MAX_ACTIVE_PER_USER", DEFAULT_MAX_ACTIVE_PER_USER)
+    max_daily = getattr(settings, "NOTES_IMPORT_MAX_DAILY_PER_USER", DEFAULT_MAX_DAILY_PER_USER)
+    with transaction.atomic():
+        list(get_user_model().objects.select_for_update().filter(pk=owner.pk).values_list("pk", flat=True))
+        jobs = ImportJob.objects.filter(owner=owner)
+        if jobs.filter(status__in=ImportJob.ACTIVE_STATUSES).count() >= max_active:
+            raise QuotaExceeded(f"at most {max_active} imports can be pending")
+        if jobs.filter(created_at__gte=timezone.now() - timedelta(days=1)).count() >= max_daily:
+            raise QuotaExceeded(f"at most {max_daily} imports per day")
+        return ImportJob.objects.create(owner=owner, url=url, summarize=summarize)
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"[:64]
+
+
+def claim_jobs(worker: str, limit: int) -> list[ImportJob]:
+    """Atomically mark up to ``limit`` due jobs as running for ``worker``."""
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    candidates = list(
+        ImportJob.objects.filter(status=ImportJob.QUEUED, run_after__lte=now)
+        .order_by("run_after", "id")
+        .values_list("id", flat=True)[: limit * 2]
+    )
+    claimed = []
+    for job_id in candidates:
+        updated = ImportJob.objects.filter(pk=job_id, status=ImportJob.QUEUED).update(
+            status=ImportJob.RUNNING, locked_at=now, locked_by=worker, attempts=F("attempts") + 1,
+        )
+        if updated:
+            claimed.append(job_id)
+            if len(claimed) >= limit:
+                break
+    return list(ImportJob.objects.filter(pk__in=claimed).select_related("owner"))
+
+
+def requeue_stale_jobs(stale_after: int = STALE_AFTER_SECONDS) -> int:
+    """Return jobs left running by a crashed worker to the queue.
+
+    Jobs that have used all their attempts are marked failed instead, so a
+    URL that kills the worker is not retried forever. Returns how many jobs
+    were requeued.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = ImportJob.objects.filter(status=ImportJob.RUNNING, locked_at__lt=cutoff)
+    stale.filter(attempts__gte=F("max_attempts")).update(
+        status=ImportJob.FAILED, error="the worker stopped while running this job",
+        locked_at=None, locked_by="", updated_at=timezone.now(),
+    )
+    return stale.update(status=ImportJob.QUEUED, locked_at=None, locked_by="")
+
+
+def run_job(job: ImportJob) -> None:
+    """Run one claimed job and record the outcome (retrying transient failures)."""
+    try:
+        note = import_url(job.owner, job.url, job.summarize)
+    except Exception as e:
+        if not isinstance(e, ImportFailed):
+            logger.exception("import job %s crashed", job.pk)
+        job.error = str(e)[:2000]
+        job.locked_at = None
+        job.locked_by = ""
+        if job.attempts < job.max_attempts and not getattr(e, "permanent", False):
+            job.status = ImportJob.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+        else:
+            job.status = ImportJob.FAILED
+        job.save(update_fields=["status", "error", "run_after", "locked_at", "locked_by", "updated_at"])
+        return
+    job.status = ImportJob.SUCCEEDED
+    job.note = note
+    job.error = ""
+    job.locked_at = None
+    job.locked_by = ""
+    job.save(update_fields=["status", "note", "error", "locked_at", "locked_by", "updated_at"])
+
+
+def _run_in_thread(job: ImportJob) -> None:
+    try:
+        run_job(job)
+    finally:
+        # Worker threads own their DB connection
+        connection.close()
+
+
+def run_pending_jobs(limit: int = 100) -> int:
+    """Run due jobs inline in the current thread; returns how many ran."""
+    jobs = claim_jobs(worker_id(), limit)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
+
+
+def run_worker(concurrency: int = DEFAULT_CONCURRENCY, poll_interval: float = 1.0, once: bool = False) -> None:
+    """Process jobs forever (or until the queue is drained with ``once``)."""
+    worker = worker_id()
+    inflight = set()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="import-job") as pool:
+        last_stale_check = 0.0
+        while True:
+            close_old_connections()
+            if time.monotonic() - last_stale_check > 60:
+                requeue_stale_jobs()
+                last_stale_check = time.monotonic()
+            for job in claim_jobs(worker, concurrency - len(inflight)):
+                inflight.add(pool.submit(_run_in_thread, job))
+            if not inflight:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+            done, inflight = wait(inflight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is not None:
+                    # Recording the outcome failed; requeue_stale_jobs picks the job up again
+                    logger.error("import job failed to record its outcome", exc_info=fut.exception())
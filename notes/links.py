@@ -0,0 +1,142 @@
+"""Set-based maintenance of ``NoteLink`` rows.
+
+Instead of a SELECT/INSERT pair per wikilink, callers hand over the wanted
+link titles of many notes at once and the rows are reconciled with a handful
+of queries: one title lookup, one read of existing links, one delete and one
+``bulk_create``. References to titles that do not exist yet are kept in
+``UnresolvedLink`` and completed when a note with that title is created or
+renamed.
+"""
+import hashlib
+from typing import Iterable, Mapping
+
+from .models import Note, NoteLink, UnresolvedLink
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+TITLE_MAX_LENGTH = 200
+
+
+def chunked(items, size: int = CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def link_set_hash(titles: Iterable[str]) -> str:
+    """Stable digest of a wikilink title set; empty for no links."""
+    titles = sorted(set(titles))
+    if not titles:
+        return ""
+    return hashlib.sha256("\0".join(titles).encode("utf-8")).hexdigest()
+
+
+def resolve_titles(owner_id, titles: Iterable[str]) -> dict:
+    """Map existing titles to note ids for one owner, chunking large sets."""
+    title_map = {}
+    for chunk in chunked(set(titles)):
+        title_map.update(Note.title_map(owner_id, chunk))
+    return title_map
+
+
+def sync_outbound_links(owner_id, wanted: Mapping[int, Iterable[str]], created: Iterable[int] = ()) -> None:
+    """Make the outbound links of each note match its wikilink titles.
+
+    ``wanted`` maps note id -> titles referenced by that note. Titles that
+    resolve to a note of the same owner become ``NoteLink`` rows (self-links
+    are dropped); the rest are recorded as ``UnresolvedLink`` rows so the
+    link can be completed when such a note appears. Notes in ``created`` were
+    just inserted, so they have no rows to read or delete.
+    """
+    if not wanted:
+        return
+    wanted = {pk: set(titles) for pk, titles in wanted.items()}
+    title_map = resolve_titles(owner_id, set().union(*wanted.values()))
+    desired = set()
+    dangling = set()
+    for pk, titles in wanted.items():
+        for t in titles:
+            if t in title_map:
+                if title_map[t] != pk:
+                    desired.add((pk, title_map[t]))
+            elif len(t) <= TITLE_MAX_LENGTH:
+                dangling.add((pk, t))
+
+    created = set(created)
+    existing_ids = [pk for pk in wanted if pk not in created]
+    _reconcile(
+        NoteLink.objects.all(), "from_note_id", "to_note_id", existing_ids, desired,
+        lambda f, t: NoteLink(from_note_id=f, to_note_id=t),
+    )
+    _reconcile(
+        UnresolvedLink.objects.all(), "source_id", "title", existing_ids, dangling,
+        lambda f, t: UnresolvedLink(owner_id=owner_id, source_id=f, title=t),
+    )
+
+
+def _reconcile(qs, source_field, target_field, note_ids, desired, build) -> None:
+    """Delete rows of ``qs`` for ``note_ids`` not in ``desired``; insert the missing ones."""
+    stale_ids = []
+    existing = set()
+    for chunk in chunked(note_ids):
+        rows = qs.filter(**{f"{source_field}__in": chunk}).values_list("id", source_field, target_field)
+        for row_id, source, target in rows:
+            if (source, target) in desired:
+                existing.add((source, target))
+            else:
+                stale_ids.append(row_id)
+    for chunk in chunked(stale_ids):
+        qs.filter(pk__in=chunk).delete()
+    to_add = desired - existing
+    if to_add:
+        qs.model.objects.bulk_create(
+            [build(source, target) for source, target in to_add],
+            ignore_conflicts=True,
+            batch_size=CHUNK_SIZE,
+        )
+
+
+def resolve_pending_links(owner_id, title_map: Mapping[str, int]) -> None:
+    """Turn pending ``[[title]]`` references into links to newly named notes.
+
+    ``title_map`` maps each new title to its note id, e.g. after notes were
+    created or renamed.
+    """
+    if not title_map:
+        return
+    resolved_ids = []
+    links = []
+    for chunk in chunked(title_map):
+        rows = UnresolvedLink.objects.filter(owner_id=owner_id, title__in=chunk).values_list(
+            "id", "source_id", "title"
+        )
+        for row_id, source_id, title in rows:
+            resolved_ids.append(row_id)
+            target_id = title_map[title]
+            if source_id != target_id:
+                links.append(NoteLink(from_note_id=source_id, to_note_id=target_id))
+    if links:
+        NoteLink.objects.bulk_create(links, ignore_conflicts=True, batch_size=CHUNK_SIZE)
+    for chunk in chunked(resolved_ids):
+        UnresolvedLink.objects.filter(pk__in=chunk).delete()
+
+
+def unresolve_inbound_links(owner_id, pairs: Iterable[tuple[int, str]]) -> None:
+    """Record ``(source id, title)`` references as pending again.
+
+    Used for links whose target was renamed away or deleted. Sources that no
+    longer exist are skipped.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return
+    alive = set()
+    for chunk in chunked({source_id for source_id, _ in pairs}):
+        alive.update(Note.objects.filter(pk__in=chunk).values_list("pk", flat=True))
+    rows = [
+        UnresolvedLink(owner_id=owner_id, source_id=source_id, title=title)
+        for source_id, title in pairs
+        if source_id in alive
+    ]
+    if rows:
+        UnresolvedLink.objects.bulk_create(rows, ignore_conflicts=True, batch_size=CHUNK_SIZE)
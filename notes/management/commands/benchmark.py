@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from notes.benchmark import SCENARIOS, SIZE_DISTRIBUTIONS, compare, environment_info, generate_corpus, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic corpus and benchmark the notes endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2, help="Number of users to generate")
+        parser.add_argument("--notes", type=int, default=200, help="Notes per user")
+        parser.add_argument("--link-density", type=float, default=2.0, help="Average wikilinks per note")
+        parser.add_argument("--size", type=int, default=1500, help="Mean note size in characters")
+        parser.add_argument("--size-distribution", choices=SIZE_DISTRIBUTIONS, default="lognormal")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=20, help="Timed requests per scenario")
+        parser.add_argument("--warmup", type=int, default=1, help="Untimed requests per scenario")
+        parser.add_argument("--import-size", type=int, default=50, help="Notes per import request")
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS, dest="scenarios",
+                            help="Scenario to run (repeatable, default: all)")
+        parser.add_argument("--output", help="Write JSON results to this file")
+        parser.add_argument("--compare", help="Baseline JSON results to compare against")
+        parser.add_argument("--keep", action="store_true",
+                            help="Commit the generated corpus instead of rolling it back")
+
+    def handle(self, *args, **opts):
+        if opts["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1")
+        started = datetime.now(dt_timezone.utc)
+        # The test client talks to the app in-process; the corpus and every
+        # write made by the scenarios are rolled back unless --keep is given
+        with override_settings(ALLOWED_HOSTS=["testserver"]), transaction.atomic():
+            corpus = generate_corpus(
+                users=opts["users"],
+                notes_per_user=opts["notes"],
+                link_density=opts["link_density"],
+                mean_size=opts["size"],
+                size_distribution=opts["size_distribution"],
+                seed=opts["seed"],
+            )
+            results = run_benchmarks(
+                corpus,
+                iterations=opts["iterations"],
+                scenarios=opts["scenarios"] or SCENARIOS,
+                warmup=opts["warmup"],
+                import_size=opts["import_size"],
+                seed=opts["seed"],
+            )
+            if not opts["keep"]:
+                transaction.set_rollback(True)
+
+        report = {
+            "started_at": started.isoformat(),
+            "environment": environment_info(),
+            "corpus": corpus["params"],
+            "iterations": opts["iterations"],
+            "results": results,
+        }
+        if opts["compare"]:
+            with open(opts["compare"], encoding="utf-8") as f:
+                report["compared_to"] = opts["compare"]
+                report["comparison"] = compare(report, json.load(f))
+
+        self._print(report)
+        if opts["output"]:
+            with open(opts["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {opts['output']}")
+
+    def _print(self, report):
+        comparison = report.get("comparison", {})
+        self.stdout.write(f"{'scenario':<10} {'p50 ms':>9} {'p95 ms':>9} {'queries':>9}")
+        for name, r in report["results"].items():
+            line = f"{name:<10} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['queries_max']:>9}"
+            if name in comparison and comparison[name]["p50_change_pct"] is not None:
+                c = comparison[name]
+                line += f"   p50 {c['p50_change_pct']:+.1f}%  queries {c['queries_delta']:+d}"
+            if r["errors"]:
+                line += f"   ({r['errors']} errors)"
+            self.stdout.write(line)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from notes.models import Note
+from notes.revisions import compact_note_revisions
+
+
+class Command(BaseCommand):
+    help = "Apply the revision retention policy, dropping old note revisions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--note", type=int, action="append", dest="notes",
+                            help="Only compact this note (repeatable)")
+
+    def handle(self, *args, notes=None, **options):
+        qs = Note.objects.filter(revisions__isnull=False).distinct()
+        if notes:
+            qs = qs.filter(pk__in=notes)
+        compacted = removed = 0
+        for note in qs.only("id").iterator():
+            n = compact_note_revisions(note)
+            if n:
+                compacted += 1
+                removed += n
+        self.stdout.write(f"Removed {removed} revisions from {compacted} notes")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from notes.jobs import DEFAULT_CONCURRENCY, run_worker
+
+
+class Command(BaseCommand):
+    help = "Process queued URL import jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                            help="Maximum number of imports running at once")
+        parser.add_argument("--poll", type=float, default=1.0,
+                            help="Seconds to wait between queue polls")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit when no jobs are due instead of polling forever")
+
+    def handle(self, *args, concurrency, poll, once, **options):
+        self.stdout.write(f"Import worker started (concurrency={concurrency})")
+        run_worker(concurrency=max(1, concurrency), poll_interval=poll, once=once)
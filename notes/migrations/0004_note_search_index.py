@@ -0,0 +1,50 @@
+# Generated manually: full-text search index for notes (see notes/search.py)
+from django.db import migrations, OperationalError
+
+FTS_TABLE = 'notes_note_fts'
+PG_INDEX = 'notes_note_search_gin'
+
+
+def create_search_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == 'sqlite':
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                    f"USING fts5(title, content, tokenize='unicode61 remove_diacritics 2')"
+                )
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE}(rowid, title, content) "
+                    f"SELECT id, title, content FROM notes_note"
+                )
+        except OperationalError:
+            # SQLite built without FTS5 — search falls back to icontains
+            return
+    elif conn.vendor == 'postgresql':
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON notes_note USING GIN (("
+                "setweight(to_tsvector('simple'::regconfig, COALESCE(title, '')), 'A') || "
+                "setweight(to_tsvector('simple'::regconfig, COALESCE(content, '')), 'B')))"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    conn = schema_editor.connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        elif conn.vendor == 'postgresql':
+            cursor.execute(f"DROP INDEX IF EXISTS {PG_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0003_notelink_and_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0004_note_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['owner', '-updated_at', '-id'], name='note_owner_updated_idx'),
+        ),
+    ]
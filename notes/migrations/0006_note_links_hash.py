@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0005_note_owner_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='links_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
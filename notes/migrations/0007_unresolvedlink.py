@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:46
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+WIKILINK_RE = re.compile(r"\[\[([^\[\]]+)\]\]")
+
+
+def backfill_links(apps, schema_editor):
+    """Scan every note once: record dangling wikilinks and add missing links.
+
+    Links to notes created after their referrer were never built before, so
+    this also completes those. links_hash is cleared so the next save
+    re-validates through the regular signal path.
+    """
+    Note = apps.get_model('notes', 'Note')
+    NoteLink = apps.get_model('notes', 'NoteLink')
+    UnresolvedLink = apps.get_model('notes', 'UnresolvedLink')
+    owner_ids = Note.objects.values_list('owner_id', flat=True).distinct()
+    for owner_id in list(owner_ids):
+        title_map = dict(Note.objects.filter(owner_id=owner_id).values_list('title', 'id'))
+        existing = set(
+            NoteLink.objects.filter(from_note__owner_id=owner_id).values_list('from_note_id', 'to_note_id')
+        )
+        links, pending = [], []
+        notes = Note.objects.filter(owner_id=owner_id).values_list('id', 'content')
+        for note_id, content in notes.iterator(chunk_size=500):
+            titles = {m.group(1).strip() for m in WIKILINK_RE.finditer(content or '')}
+            for title in titles:
+                target = title_map.get(title)
+                if target is None:
+                    if len(title) <= 200:
+                        pending.append(UnresolvedLink(owner_id=owner_id, source_id=note_id, title=title))
+                elif target != note_id and (note_id, target) not in existing:
+                    links.append(NoteLink(from_note_id=note_id, to_note_id=target))
+        NoteLink.objects.bulk_create(links, ignore_conflicts=True, batch_size=500)
+        UnresolvedLink.objects.bulk_create(pending, ignore_conflicts=True, batch_size=500)
+    Note.objects.update(links_hash='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0006_note_links_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnresolvedLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unresolved_links', to='notes.note')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'title'], name='unresolved_owner_title_idx')],
+                'unique_together': {('source', 'title')},
+            },
+        ),
+        migrations.RunPython(backfill_links, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:53
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0008_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FetchCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_hash', models.CharField(max_length=64, unique=True)),
+                ('url', models.TextField()),
+                ('final_url', models.TextField(blank=True)),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('last_modified', models.CharField(blank=True, max_length=64)),
+                ('body', models.TextField(blank=True)),
+                ('body_hash', models.CharField(blank=True, max_length=64)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('markdown', models.TextField(blank=True)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('validated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_changes(apps, schema_editor):
+    """Log every existing note as created, in updated_at order, so a client
+    syncing from the start of the feed sees the whole corpus."""
+    Note = apps.get_model('notes', 'Note')
+    NoteChange = apps.get_model('notes', 'NoteChange')
+    rows = Note.objects.order_by('updated_at', 'id').values_list('id', 'owner_id', 'title')
+    batch = []
+    for note_id, owner_id, title in rows.iterator(chunk_size=500):
+        batch.append(NoteChange(owner_id=owner_id, note_id=note_id, kind='created', title=title))
+        if len(batch) >= 500:
+            NoteChange.objects.bulk_create(batch)
+            batch = []
+    NoteChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0009_fetchcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('note_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('renamed', 'Renamed'), ('deleted', 'Deleted')], max_length=16)),
+                ('title', models.CharField(max_length=200)),
+                ('old_title', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'id'], name='notechange_owner_seq_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+import django.db.models.deletion
+
+
+def backfill_sequences(apps, schema_editor):
+    """Number existing log entries by their id, which already orders them,
+    and start each owner's sequence after its last entry."""
+    NoteChange = apps.get_model('notes', 'NoteChange')
+    ChangeSequence = apps.get_model('notes', 'ChangeSequence')
+    NoteChange.objects.update(seq=models.F('id'))
+    ChangeSequence.objects.bulk_create([
+        ChangeSequence(owner_id=row['owner_id'], value=row['last'])
+        for row in NoteChange.objects.values('owner_id').annotate(last=Max('seq')).order_by()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0012_noterevision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notechange',
+            name='seq',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RemoveIndex(
+            model_name='notechange',
+            name='notechange_owner_seq_idx',
+        ),
+        migrations.RunPython(backfill_sequences, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notechange',
+            constraint=models.UniqueConstraint(fields=('owner', 'seq'), name='notechange_owner_seq_uniq'),
+        ),
+    ]
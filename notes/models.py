@@ -1,7 +1,8 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 import re
-from .utils import render_markdown_safe, extract_wikilinks
+from .utils import render_wikilinked, extract_wikilinks
 
 
 class Note(models.Model):
@@ -10,40 +11,99 @@ class Note(models.Model):
     content = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Digest of the wikilink title set the NoteLink rows were built from
+    links_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
+    # Bumped by every save; clients send it back (If-Match) to detect lost updates
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         ordering = ["-updated_at"]
         unique_together = (("owner", "title"),)
+        indexes = [
+            # Keyset pagination: owner filter + (-updated_at, -id) order
+            models.Index(fields=["owner", "-updated_at", "-id"], name="note_owner_updated_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored title so renames can be detected without a query
+        instance._loaded_title = instance.__dict__.get("title")
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        self.version += 1
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        if transaction.get_connection(kwargs.get("using")).in_atomic_block:
+            super().save(*args, **kwargs)
+            return
+        # The save signals lock the row and log its old state; hold the lock until they are done
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+    def save_if_version(self, expected: int) -> bool:
+        """Save only if the stored row is still at version ``expected``.
+
+        The stored state is read under a row lock first, so of two concurrent
+        writers holding the same version exactly one wins. Returns False (and
+        writes nothing) for the loser. The save signals reuse that read rather
+        than locking the row again.
+        """
+        with transaction.atomic():
+            stored = (
+                Note.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values_list("title", "content", "version")
+                .first()
+            )
+            if stored is None or stored[2] != expected:
+                return False
+            self._stored_state = stored
+            try:
+                self.save()
+            finally:
+                self._stored_state = None
+        return True
+
+    def delete_if_version(self, expected: int) -> bool:
+        """Delete only if the stored row is still at version ``expected`` (see ``save_if_version``)."""
+        with transaction.atomic():
+            if not Note.objects.filter(pk=self.pk, version=expected).update(version=expected):
+                return False
+            self.delete()
+        return True
+
     WIKILINK_RE = re.compile(r"\[\[([^\[\]]+)\]\]")
 
     def extract_wikilinks(self):
         return list({m.group(1).strip(): None for m in self.WIKILINK_RE.finditer(self.content)}.keys())
 
-    def render_content(self):
+    def render_content(self, title_map: dict = None):
         """Render content to HTML with safe markdown and wikilinks.
 
-        Strategy: pre-process wikilinks [[Title]] into <a> tags (or plain text
-        if not found), then run through safe markdown renderer allowing anchors.
+        Strategy: resolve wikilink targets with one title lookup, then render
+        through the cached pipeline keyed by content plus resolved targets, so
+        unchanged notes skip markdown entirely. Callers that already loaded
+        the outbound links can pass them as ``title_map`` to skip the lookup.
         """
         text = self.content or ""
-        titles = extract_wikilinks(text)
-        title_map = {}
-        if titles:
-            title_map = {n.title: n for n in Note.objects.filter(owner=self.owner, title__in=titles)}
+        if title_map is None:
+            title_map = Note.title_map(self.owner_id, extract_wikilinks(text))
+        return render_wikilinked(text, title_map)
 
-        def repl(match):
-            title = match.group(1).strip()
-            target = title_map.get(title)
-            if target:
-                return f'<a href="/{target.pk}/" data-wikilink="{title}">{title}</a>'
-            return title
-
-        preprocessed = self.WIKILINK_RE.sub(repl, text)
-        return render_markdown_safe(preprocessed)
+    @classmethod
+    def title_map(cls, owner_id, titles) -> dict:
+        """Map each existing title in ``titles`` to its note id for one owner."""
+        if not titles:
+            return {}
+        return dict(cls.objects.filter(owner_id=owner_id, title__in=list(titles)).values_list("title", "pk"))
 
 
 class NoteLink(models.Model):
@@ -56,3 +116,165 @@ class NoteLink(models.Model):
 
     def __str__(self) -> str:
         return f"{self.from_note_id} -> {self.to_note_id}"
+
+
+class UnresolvedLink(models.Model):
+    """A wikilink whose target title has no note (yet).
+
+    Indexed by ``(owner, title)`` so creating or renaming a note can pick up
+    its pending inbound links with one lookup instead of scanning content.
+    """
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    source = models.ForeignKey(Note, on_delete=models.CASCADE, related_name="unresolved_links")
+    title = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = (("source", "title"),)
+        indexes = [
+            models.Index(fields=["owner", "title"], name="unresolved_owner_title_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.source_id} -> [[{self.title}]]"
+
+
+class NoteChange(models.Model):
+    """Append-only change log behind the delta-sync feed (see ``changes.py``).
+
+    ``seq`` is the feed's per-owner sequence number, allocated from the
+    owner's ``ChangeSequence``. ``note_id`` is a plain integer so tombstones
+    outlive the note they describe.
+    """
+
+    CREATED = "created"
+    UPDATED = "updated"
+    RENAMED = "renamed"
+    DELETED = "deleted"
+    KIND_CHOICES = [
+        (CREATED, "Created"),
+        (UPDATED, "Updated"),
+        (RENAMED, "Renamed"),
+        (DELETED, "Deleted"),
+    ]
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    seq = models.BigIntegerField()
+    note_id = models.BigIntegerField()
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    title = models.CharField(max_length=200)
+    old_title = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "seq"], name="notechange_owner_seq_uniq"),
+        ]
+
+    def __str__(self) -> str:
+        return f"#{self.seq} {self.kind} {self.note_id}"
+
+
+class ChangeSequence(models.Model):
+    """An owner's last allocated ``NoteChange.seq``.
+
+    Allocation locks this row until the transaction that logs the changes
+    commits, so an owner's changes become visible in sequence order.
+    """
+
+    owner = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="+")
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.owner_id}: {self.value}"
+
+
+class NoteRevision(models.Model):
+    """A past state of a note (see ``revisions.py``).
+
+    ``data`` is zlib-compressed: either the full text (a snapshot) or a
+    reverse delta that turns the next newer state into this one, so the head
+    stays in ``Note.content`` and only the past is stored as diffs.
+    ``since_snapshot`` counts the deltas created since the last snapshot and
+    keeps reconstruction chains short.
+    """
+
+    SNAPSHOT = "snapshot"
+    DELTA = "delta"
+    KIND_CHOICES = [(SNAPSHOT, "Snapshot"), (DELTA, "Delta")]
+
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name="revisions")
+    version = models.PositiveIntegerField()
+    title = models.CharField(max_length=200)
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField(default=0)
+    since_snapshot = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-version"]
+        unique_together = (("note", "version"),)
+
+    def __str__(self) -> str:
+        return f"{self.note_id} v{self.version} ({self.kind})"
+
+
+class ImportJob(models.Model):
+    """A queued URL import, processed by the ``import_worker`` command."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="import_jobs")
+    url = models.CharField(max_length=2000)
+    summarize = models.BooleanField(default=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=64, blank=True)
+    note = models.ForeignKey(Note, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="importjob_status_run_idx"),
+            models.Index(fields=["owner", "status"], name="importjob_owner_status_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.url} ({self.status})"
+
+
+class FetchCache(models.Model):
+    """Last fetched copy of a URL and its extracted article, shared by all
+    users' imports (see ``fetch_cache.py``).
+    """
+
+    url_hash = models.CharField(max_length=64, unique=True)
+    url = models.TextField()
+    final_url = models.TextField(blank=True)
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=64, blank=True)
+    body = models.TextField(blank=True)
+    body_hash = models.CharField(max_length=64, blank=True)
+    title = models.CharField(max_length=255, blank=True)
+    markdown = models.TextField(blank=True)
+    fetched_at = models.DateTimeField(default=timezone.now)
+    validated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return self.url
@@ -0,0 +1,92 @@
+"""Keyset (cursor) pagination for note listings.
+
+Pages are ordered by ``(-updated_at, -id)`` and the cursor encodes the last
+row's ``(updated_at, id)``, so each page is a single range scan on the
+``(owner, -updated_at, -id)`` index no matter how deep the client pages.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Fields the notes list API can project; id/updated_at are always fetched
+# because the cursor needs them.
+NOTE_FIELDS = ("id", "title", "content", "version", "created_at", "updated_at")
+
+
+def encode_cursor(updated_at: datetime, pk: int) -> str:
+    raw = f"{updated_at.isoformat()}|{pk}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Inverse of ``encode_cursor``; raises ValueError on malformed input."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, pk = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        updated_at = parse_datetime(ts)
+        if updated_at is None:
+            raise ValueError("bad timestamp")
+        return updated_at, int(pk)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {e}") from e
+
+
+def parse_page_size(value, default: int = DEFAULT_PAGE_SIZE) -> int:
+    try:
+        size = int(value) if value else default
+    except (TypeError, ValueError):
+        raise ValueError("invalid limit")
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def parse_fields(value) -> tuple[str, ...]:
+    """Parse a ``fields=a,b`` projection; raises ValueError on unknown names."""
+    if not value:
+        return NOTE_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in NOTE_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return fields or NOTE_FIELDS
+
+
+def _row_key(row):
+    if isinstance(row, dict):
+        return row["updated_at"], row["id"]
+    return row.updated_at, row.pk
+
+
+def _page_queryset(qs, cursor, limit: int):
+    qs = qs.order_by("-updated_at", "-id")
+    if cursor:
+        updated_at, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=pk))
+    return qs[: limit + 1]
+
+
+def _finish_page(rows: list, limit: int):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*_row_key(rows[-1]))
+    return rows, next_cursor
+
+
+def keyset_page(qs, cursor=None, limit: int = DEFAULT_PAGE_SIZE):
+    """Return ``(rows, next_cursor)`` for one page of ``qs``.
+
+    ``qs`` may be a model or ``values()`` queryset; ``next_cursor`` is None on
+    the last page.
+    """
+    return _finish_page(list(_page_queryset(qs, cursor, limit)), limit)
+
+
+async def akeyset_page(qs, cursor=None, limit: int = DEFAULT_PAGE_SIZE):
+    """Async ``keyset_page`` using the async ORM."""
+    rows = [row async for row in _page_queryset(qs, cursor, limit)]
+    return _finish_page(rows, limit)
@@ -0,0 +1,274 @@
+"""Note revision history with delta-compressed storage.
+
+Every save that changes a note's title or text keeps the state it replaces
+as a ``NoteRevision``, numbered by the note version that state had. The head
+stays uncompressed in ``Note.content``; a revision stores a reverse delta
+(line-level ``difflib`` opcodes, zlib-compressed) that turns the next newer
+state into its own text. Every ``NOTES_REVISION_SNAPSHOT_EVERY``-th revision,
+and any revision whose delta would not be smaller, is a compressed full
+snapshot instead, so reading any revision applies a bounded number of deltas
+starting from the nearest newer snapshot or from the head.
+
+Autosaves are coalesced: a save within ``NOTES_REVISION_COALESCE_SECONDS`` of
+the newest revision re-encodes that revision against the new head instead of
+adding another, so a burst of edits keeps the state from before the burst.
+``compact_note_revisions`` (the ``compact_revisions`` command) thins out old
+history according to the retention settings.
+"""
+import difflib
+import json
+import zlib
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .links import chunked
+from .models import Note, NoteRevision
+
+SNAPSHOT_EVERY = 20
+COALESCE_SECONDS = 60
+# Keep everything this recent, then one revision per day up to MAX_AGE_DAYS
+FULL_HISTORY_DAYS = 7
+MAX_AGE_DAYS = 365
+MAX_PER_NOTE = 500
+# Longer texts are stored as snapshots rather than diffed
+MAX_DIFF_LINES = 20_000
+BATCH_SIZE = 500
+
+
+def _setting(name: str, default):
+    return getattr(settings, f"NOTES_REVISION_{name}", default)
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"))
+
+
+def decompress_text(data) -> str:
+    return zlib.decompress(bytes(data)).decode("utf-8")
+
+
+def make_delta(base: str, target: str) -> Optional[bytes]:
+    """Compressed instructions that rebuild ``target`` from ``base``.
+
+    Each instruction is either ``[i, j]`` (copy lines ``i:j`` of ``base``)
+    or a string to insert. None if either text is too long to diff.
+    """
+    a = base.splitlines(keepends=True)
+    b = target.splitlines(keepends=True)
+    if len(a) > MAX_DIFF_LINES or len(b) > MAX_DIFF_LINES:
+        return None
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(b[j1:j2]))
+    return zlib.compress(json.dumps(ops, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def apply_delta(base: str, data) -> str:
+    lines = base.splitlines(keepends=True)
+    return "".join(
+        "".join(lines[op[0]:op[1]]) if isinstance(op, list) else op
+        for op in json.loads(zlib.decompress(bytes(data)))
+    )
+
+
+def encode(newer: str, text: str, since_snapshot: int) -> tuple[str, bytes, int]:
+    """``(kind, data, since_snapshot)`` storing ``text`` given the next newer state.
+
+    ``since_snapshot`` is the revision's position after the last snapshot;
+    a snapshot resets it to 0.
+    """
+    snapshot = compress_text(text)
+    if since_snapshot < _setting("SNAPSHOT_EVERY", SNAPSHOT_EVERY):
+        delta = make_delta(newer, text)
+        if delta is not None and len(delta) < len(snapshot):
+            return NoteRevision.DELTA, delta, since_snapshot
+    return NoteRevision.SNAPSHOT, snapshot, 0
+
+
+def _newest_revisions(note_ids: list) -> dict:
+    newest = {}
+    for chunk in chunked(note_ids):
+        heads = (
+            NoteRevision.objects.filter(note_id__in=chunk)
+            .values("note_id")
+            .annotate(top=Max("version"))
+            .values("top")
+        )
+        # One note's top version may be an older version of another: keep the highest
+        rows = NoteRevision.objects.filter(note_id__in=chunk, version__in=heads)
+        for rev in rows:
+            current = newest.get(rev.note_id)
+            if current is None or rev.version > current.version:
+                newest[rev.note_id] = rev
+    return newest
+
+
+def record_revisions(entries: Iterable[tuple]) -> None:
+    """Keep the states replaced by a write.
+
+    ``entries`` are ``(note, old_title, old_content, old_version)`` with
+    ``note`` already holding the new title and text. Entries that changed
+    neither are skipped. Costs one query to find each note's newest revision
+    plus one insert and one update for the whole set.
+    """
+    entries = [e for e in entries if (e[1], e[2]) != (e[0].title, e[0].content)]
+    if not entries:
+        return
+    now = timezone.now()
+    coalesce = timedelta(seconds=_setting("COALESCE_SECONDS", COALESCE_SECONDS))
+    newest = _newest_revisions([note.pk for note, *_ in entries])
+    created, rewritten = [], []
+    for note, old_title, old_content, old_version in entries:
+        previous = newest.get(note.pk)
+        if previous is not None and now - previous.created_at < coalesce:
+            # Part of the same burst: keep the older state, re-based on the new head
+            if previous.kind == NoteRevision.DELTA:
+                text = apply_delta(old_content, previous.data)
+                previous.kind, previous.data, previous.since_snapshot = encode(
+                    note.content, text, previous.since_snapshot
+                )
+                rewritten.append(previous)
+            continue
+        since = previous.since_snapshot + 1 if previous is not None else 1
+        kind, data, since = encode(note.content, old_content, since)
+        created.append(NoteRevision(
+            note_id=note.pk, version=old_version, title=old_title, kind=kind, data=data,
+            size=len(old_content), since_snapshot=since, created_at=now,
+        ))
+    if created:
+        NoteRevision.objects.bulk_create(created, batch_size=BATCH_SIZE)
+    if rewritten:
+        NoteRevision.objects.bulk_update(rewritten, ["kind", "data", "since_snapshot"], batch_size=BATCH_SIZE)
+
+
+def list_revisions(note: Note, before: Optional[int] = None, limit: int = 50) -> dict:
+    """Newest-first page of ``note``'s revisions, without their data.
+
+    Returns ``{"revisions", "next"}``; ``next`` is the ``before`` value for
+    the following page, or None.
+    """
+    qs = note.revisions.all()
+    if before is not None:
+        qs = qs.filter(version__lt=before)
+    rows = list(qs.values("version", "title", "kind", "size", "created_at")[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    for row in rows:
+        row["created_at"] = row["created_at"].isoformat()
+    return {"revisions": rows, "next": rows[-1]["version"] if has_more else None}
+
+
+def get_revision(note: Note, version: int) -> Optional[tuple[NoteRevision, str]]:
+    """Revision ``version`` of ``note`` and its reconstructed text, or None.
+
+    One query: the revision and the newer ones up to the nearest snapshot
+    are streamed oldest first, then deltas are applied from that snapshot
+    (or from the head) back down to the requested version.
+    """
+    chain: list[NoteRevision] = []
+    rows = note.revisions.filter(version__gte=version).order_by("version")
+    for rev in rows.iterator(chunk_size=_setting("SNAPSHOT_EVERY", SNAPSHOT_EVERY) + 1):
+        if not chain and rev.version != version:
+            return None
+        chain.append(rev)
+        if rev.kind == NoteRevision.SNAPSHOT:
+            break
+    if not chain:
+        return None
+    top = chain[-1]
+    text = decompress_text(top.data) if top.kind == NoteRevision.SNAPSHOT else apply_delta(note.content, top.data)
+    for rev in reversed(chain[:-1]):
+        text = apply_delta(text, rev.data)
+    return chain[0], text
+
+
+def state_at(note: Note, version: int) -> Optional[tuple[str, str]]:
+    """``(title, text)`` of ``note`` at ``version``, the head included."""
+    if version == note.version:
+        return note.title, note.content
+    found = get_revision(note, version)
+    if found is None:
+        return None
+    revision, text = found
+    return revision.title, text
+
+
+def diff_texts(old: str, new: str, old_label: str, new_label: str) -> str:
+    return "".join(difflib.unified_diff(
+        old.splitlines(keepends=True), new.splitlines(keepends=True), fromfile=old_label, tofile=new_label,
+    ))
+
+
+def retained_versions(revisions: Iterable[tuple], now=None) -> set:
+    """Versions to keep among ``(version, created_at)`` pairs.
+
+    Everything younger than ``NOTES_REVISION_FULL_HISTORY_DAYS`` is kept;
+    older revisions are thinned to the newest one per day and dropped after
+    ``NOTES_REVISION_MAX_AGE_DAYS``. At most ``NOTES_REVISION_MAX_PER_NOTE``
+    survive, newest first. A limit of 0 disables it.
+    """
+    now = now or timezone.now()
+    full = timedelta(days=_setting("FULL_HISTORY_DAYS", FULL_HISTORY_DAYS))
+    max_age_days = _setting("MAX_AGE_DAYS", MAX_AGE_DAYS)
+    max_count = _setting("MAX_PER_NOTE", MAX_PER_NOTE)
+    keep, days = [], set()
+    for version, created_at in sorted(revisions, reverse=True):
+        age = now - created_at
+        if max_age_days and age > timedelta(days=max_age_days):
+            continue
+        if age > full:
+            day = timezone.localdate(created_at)
+            if day in days:
+                continue
+            days.add(day)
+        keep.append(version)
+    if max_count:
+        keep = keep[:max_count]
+    return set(keep)
+
+
+def compact_note_revisions(note: Note, now=None) -> int:
+    """Apply the retention policy to ``note``; returns the number of revisions removed.
+
+    The kept revisions are re-encoded against their new neighbours, so the
+    history stays readable and snapshots stay evenly spaced. The note row is
+    locked and re-read first: the newest revision is encoded against the
+    head, so a save must not slip in between the read and the rewrite.
+    """
+    with transaction.atomic():
+        note = Note.objects.select_for_update().filter(pk=note.pk).only("id", "content").first()
+        if note is None:
+            return 0
+        revisions = list(note.revisions.order_by("-version"))
+        keep = retained_versions(((r.version, r.created_at) for r in revisions), now)
+        if len(keep) == len(revisions):
+            return 0
+        texts = {}
+        newer = note.content
+        for rev in revisions:
+            newer = decompress_text(rev.data) if rev.kind == NoteRevision.SNAPSHOT else apply_delta(newer, rev.data)
+            texts[rev.version] = newer
+
+        kept = [r for r in revisions if r.version in keep]
+        newer, since = note.content, 0
+        # Newest first, each against the next newer kept state...
+        for rev in kept:
+            rev.kind, rev.data, _ = encode(newer, texts[rev.version], 1)
+            newer = texts[rev.version]
+        # ...then the snapshot cadence is applied in creation order
+        for rev in reversed(kept):
+            since += 1
+            if since >= _setting("SNAPSHOT_EVERY", SNAPSHOT_EVERY) or rev.kind == NoteRevision.SNAPSHOT:
+                rev.kind, rev.data, since = NoteRevision.SNAPSHOT, compress_text(texts[rev.version]), 0
+            rev.since_snapshot = since
+        note.revisions.exclude(version__in=keep).delete()
+        NoteRevision.objects.bulk_update(kept, ["kind", "data", "since_snapshot"], batch_size=BATCH_SIZE)
+    return len(revisions) - len(kept)
@@ -0,0 +1,270 @@
+"""Full-text search over notes.
+
+The active backend is chosen from ``settings.NOTES_SEARCH_BACKEND`` (a dotted
+path) or, by default, from the database vendor: SQLite uses an FTS5 virtual
+table, PostgreSQL uses a weighted ``tsvector``. When neither is available the
+basic backend falls back to ``icontains`` filtering so search keeps working.
+
+Backends are kept in sync from ``Note`` saves/deletes (see ``signals.py``).
+"""
+import html
+import re
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import connection, OperationalError, ProgrammingError
+from django.utils.module_loading import import_string
+
+FTS_TABLE = "notes_note_fts"
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Control characters never appear in note text, so they are safe to use as
+# highlight markers before escaping the snippet.
+MARK_START = "\x02"
+MARK_END = "\x03"
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def format_snippet(raw: str) -> str:
+    """Escape a backend snippet and turn highlight markers into <mark> tags."""
+    s = html.escape(raw or "")
+    return s.replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+
+def query_tokens(query: str) -> list[str]:
+    return TOKEN_RE.findall(query or "")
+
+
+def _as_datetime(value):
+    # Raw SQLite queries may hand back strings or naive datetimes
+    from datetime import timezone as dt_timezone
+    from django.utils import timezone
+    from django.utils.dateparse import parse_datetime
+
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is not None and settings.USE_TZ and timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+class BaseSearchBackend:
+    """Interface every search backend implements.
+
+    ``search`` returns a list of dicts with ``id``, ``title``, ``snippet`` (safe
+    HTML), ``rank`` (higher is better) and ``updated_at``, best match first.
+    """
+
+    name = "base"
+
+    def index_note(self, note) -> None:
+        pass
+
+    def index_notes(self, notes: Iterable) -> None:
+        for note in notes:
+            self.index_note(note)
+
+    def remove_note(self, note_id: int) -> None:
+        pass
+
+    def remove_notes(self, note_ids: Iterable[int]) -> None:
+        for note_id in note_ids:
+            self.remove_note(note_id)
+
+    def search(self, owner, query: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+        raise NotImplementedError
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    """Index-free fallback: ``icontains`` on title and content."""
+
+    name = "basic"
+    snippet_radius = 60
+
+    def search(self, owner, query, limit=DEFAULT_LIMIT):
+        from django.db.models import Q
+        from .models import Note
+
+        q = (query or "").strip()
+        if not q:
+            return []
+        qs = (
+            Note.objects.filter(owner=owner)
+            .filter(Q(title__icontains=q) | Q(content__icontains=q))
+            .order_by("-updated_at")[:limit]
+        )
+        results = []
+        for n in qs:
+            title_hit = q.lower() in n.title.lower()
+            results.append({
+                "id": n.pk,
+                "title": n.title,
+                "snippet": self._snippet(n.content or "", q),
+                "rank": 2.0 if title_hit else 1.0,
+                "updated_at": n.updated_at,
+            })
+        results.sort(key=lambda r: -r["rank"])
+        return results
+
+    def _snippet(self, text: str, q: str) -> str:
+        idx = text.lower().find(q.lower())
+        if idx < 0:
+            return format_snippet(text[: self.snippet_radius * 2])
+        start = max(0, idx - self.snippet_radius)
+        end = min(len(text), idx + len(q) + self.snippet_radius)
+        raw = (
+            ("…" if start else "")
+            + text[start:idx] + MARK_START + text[idx:idx + len(q)] + MARK_END
+            + text[idx + len(q):end]
+            + ("…" if end < len(text) else "")
+        )
+        return format_snippet(raw)
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """SQLite FTS5 index stored in ``notes_note_fts`` (rowid = note id).
+
+    Ranking uses bm25 with titles weighted over content; every query token is
+    matched as a prefix so search-as-you-type works.
+    """
+
+    name = "sqlite_fts5"
+    title_weight = 10.0
+    content_weight = 1.0
+    snippet_tokens = 16
+
+    def index_note(self, note):
+        self.index_notes([note])
+
+    def index_notes(self, notes):
+        rows = [(n.pk, n.title or "", n.content or "") for n in notes]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            # FTS5 honours OR REPLACE on rowid, so a re-index is one statement
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO {FTS_TABLE}(rowid, title, content) VALUES (%s, %s, %s)", rows
+            )
+
+    def remove_note(self, note_id):
+        self.remove_notes([note_id])
+
+    def remove_notes(self, note_ids):
+        ids = [(i,) for i in note_ids]
+        if not ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", ids)
+
+    def match_expression(self, query: str) -> str:
+        return " ".join(f'"{t}"*' for t in query_tokens(query))
+
+    def search(self, owner, query, limit=DEFAULT_LIMIT):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        sql = (
+            f"SELECT n.id, n.title, n.updated_at, "
+            f"snippet({FTS_TABLE}, 1, %s, %s, '…', %s), "
+            f"bm25({FTS_TABLE}, %s, %s) AS score "
+            f"FROM {FTS_TABLE} JOIN notes_note n ON n.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND n.owner_id = %s "
+            f"ORDER BY score LIMIT %s"
+        )
+        params = [
+            MARK_START, MARK_END, self.snippet_tokens,
+            self.title_weight, self.content_weight,
+            match, owner.pk, limit,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        results = []
+        for pk, title, updated_at, snippet, score in rows:
+            results.append({
+                "id": pk,
+                "title": title,
+                "snippet": format_snippet(snippet),
+                # bm25 scores are negative, lower is better
+                "rank": -float(score),
+                "updated_at": _as_datetime(updated_at),
+            })
+        return results
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """PostgreSQL ``tsvector`` search.
+
+    The vector is computed from the row itself, so there is nothing to keep in
+    sync; migration 0004 adds a GIN expression index matching ``vector()``.
+    """
+
+    name = "postgres"
+    config = "simple"
+
+    def vector(self):
+        from django.contrib.postgres.search import SearchVector
+
+        return (
+            SearchVector("title", weight="A", config=self.config)
+            + SearchVector("content", weight="B", config=self.config)
+        )
+
+    def search(self, owner, query, limit=DEFAULT_LIMIT):
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+        from .models import Note
+
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        sq = SearchQuery(" & ".join(f"{t}:*" for t in tokens), search_type="raw", config=self.config)
+        qs = (
+            Note.objects.filter(owner=owner)
+            .annotate(search=self.vector())
+            .filter(search=sq)
+            .annotate(
+                rank=SearchRank(self.vector(), sq),
+                snippet=SearchHeadline(
+                    "content", sq, config=self.config,
+                    start_sel=MARK_START, stop_sel=MARK_END, max_words=24, min_words=8,
+                ),
+            )
+            .order_by("-rank", "-updated_at")
+            .values("id", "title", "snippet", "rank", "updated_at")[:limit]
+        )
+        return [dict(r, snippet=format_snippet(r["snippet"]), rank=float(r["rank"])) for r in qs]
+
+
+_backend: Optional[BaseSearchBackend] = None
+
+
+def _fts_available() -> bool:
+    try:
+        return FTS_TABLE in connection.introspection.table_names()
+    except (OperationalError, ProgrammingError):
+        return False
+
+
+def get_search_backend() -> BaseSearchBackend:
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "NOTES_SEARCH_BACKEND", None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == "sqlite" and _fts_available():
+            _backend = SQLiteFTSBackend()
+        elif connection.vendor == "postgresql":
+            _backend = PostgresSearchBackend()
+        else:
+            _backend = BasicSearchBackend()
+    return _backend
+
+
+def reset_search_backend() -> None:
+    global _backend
+    _backend = None
+
+
+def search_notes(owner, query: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+    limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+    return get_search_backend().search(owner, query, limit=limit)
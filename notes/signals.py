@@ -1,33 +1,259 @@
-from django.db.models.signals import post_save
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
 from django.dispatch import receiver
-from django.db import OperationalError, ProgrammingError
+from django.db import OperationalError, ProgrammingError, transaction
 
-from .models import Note, NoteLink
+from .changes import record_change
+from .instrumentation import LINKS, timed
+from .links import (
+    link_set_hash,
+    resolve_pending_links,
+    sync_outbound_links,
+    unresolve_inbound_links,
+)
+from .models import Note, NoteChange, NoteLink
+from .revisions import record_revisions
+from .search import get_search_backend
+from .titles import title_deleted, title_saved
+from .versions import GRAPH, TITLES, bump_version
 from .utils import extract_wikilinks
 
 
+_suspended: ContextVar[bool] = ContextVar("notes_signals_suspended", default=False)
+
+
+@contextmanager
+def suspend_note_signals():
+    """Skip the per-note handlers below for writes done inside the block.
+
+    For bulk writers that maintain links, search and versions themselves in
+    one pass (see ``bulk.apply_batch``).
+    """
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def _bump_on_commit(scope: str, owner_id) -> None:
+    # A bump before commit would let a concurrent read cache pre-commit rows under the new version
+    transaction.on_commit(lambda: bump_version(scope, owner_id))
+
+
+def _run_link_task(task):
+    if getattr(settings, "NOTES_DEFER_LINK_REBUILD", False):
+        transaction.on_commit(task)
+    else:
+        task()
+
+
+@receiver(pre_save, sender=Note)
+def track_note_links(sender, instance: Note, update_fields=None, **kwargs):
+    """Stash the wikilink set if it differs from the one links were built from.
+
+    The new digest is written in the same row update as the note itself (for
+    ``update_fields`` saves without ``links_hash`` it is simply recomputed on
+    the next save).
+    """
+    if _suspended.get():
+        return
+    instance._pending_link_titles = None
+    if update_fields is not None and "content" not in update_fields:
+        return
+    titles = extract_wikilinks(instance.content)
+    digest = link_set_hash(titles)
+    if digest != instance.links_hash:
+        instance.links_hash = digest
+        instance._pending_link_titles = titles
+
+
+@receiver(post_save, sender=Note)
+def rebuild_note_links(sender, instance: Note, created: bool = False, **kwargs):
+    if _suspended.get():
+        return
+    titles = getattr(instance, "_pending_link_titles", None)
+    if titles is None:
+        return
+    instance._pending_link_titles = None
+    owner_id, pk = instance.owner_id, instance.pk
+
+    def sync():
+        try:
+            with timed(LINKS):
+                sync_outbound_links(owner_id, {pk: titles}, created=[pk] if created else ())
+                _bump_on_commit(GRAPH, owner_id)
+        except (OperationalError, ProgrammingError):
+            # Tables may not exist yet (before migrations) — fail quietly
+            return
+        except Exception:
+            # Forget the digest so the next save retries the rebuild
+            Note.objects.filter(pk=pk).update(links_hash="")
+            raise
+
+    _run_link_task(sync)
+
+
+@receiver(pre_save, sender=Note)
+def track_note_title(sender, instance: Note, update_fields=None, **kwargs):
+    if _suspended.get():
+        return
+    instance._renamed_from = None
+    if instance._state.adding or (update_fields is not None and "title" not in update_fields):
+        return
+    old = getattr(instance, "_loaded_title", None)
+    if old is None:
+        old = Note.objects.filter(pk=instance.pk).values_list("title", flat=True).first()
+    if old is not None and old != instance.title:
+        instance._renamed_from = old
+
+
+@receiver(pre_save, sender=Note)
+def capture_note_revision(sender, instance: Note, update_fields=None, **kwargs):
+    """Read the stored state the save replaces, for ``record_note_revision``.
+
+    It is read from the row rather than from the instance, which may be stale;
+    for the same reason the new version follows the stored one, so a version
+    number is never given to two different states. The row stays locked until
+    the save's transaction ends (``Note.save`` runs updates in one), so two
+    concurrent saves cannot both build on the same stored version.
+    """
+    if _suspended.get():
+        return
+    instance._revision_base = None
+    if instance._state.adding:
+        return
+    # Already read under the lock by ``Note.save_if_version``
+    stored = getattr(instance, "_stored_state", None)
+    instance._stored_state = None
+    if stored is None:
+        try:
+            stored = (
+                Note.objects.select_for_update()
+                .filter(pk=instance.pk)
+                .values_list("title", "content", "version")
+                .first()
+            )
+        except (OperationalError, ProgrammingError):
+            return
+    if stored is None:
+        return
+    instance.version = stored[2] + 1
+    if update_fields is None or {"title", "content"} & set(update_fields):
+        instance._revision_base = stored
+
+
+@receiver(post_save, sender=Note)
+def record_note_revision(sender, instance: Note, created: bool = False, **kwargs):
+    if _suspended.get():
+        return
+    base = getattr(instance, "_revision_base", None)
+    instance._revision_base = None
+    if base is None:
+        return
+    title, content, version = base
+    try:
+        record_revisions([(instance, title, content, version)])
+    except (OperationalError, ProgrammingError):
+        return
+
+
+@receiver(post_save, sender=Note)
+def log_note_saved(sender, instance: Note, created: bool = False, **kwargs):
+    # Registered before resolve_links_to_note, which clears _renamed_from
+    if _suspended.get():
+        return
+    renamed_from = getattr(instance, "_renamed_from", None)
+    if created:
+        kind = NoteChange.CREATED
+    elif renamed_from is not None:
+        kind = NoteChange.RENAMED
+    else:
+        kind = NoteChange.UPDATED
+    record_change(instance.owner_id, instance.pk, kind, instance.title, renamed_from or "")
+
+
 @receiver(post_save, sender=Note)
-def rebuild_note_links(sender, instance: Note, **kwargs):
+def resolve_links_to_note(sender, instance: Note, created: bool = False, **kwargs):
+    """Link pending ``[[title]]`` references when a note appears or is renamed.
+
+    On rename, links that pointed here through the old title become pending
+    again under that title.
+    """
+    if _suspended.get():
+        return
+    renamed_from = getattr(instance, "_renamed_from", None)
+    instance._renamed_from = None
+    instance._loaded_title = instance.title
+    if not created and renamed_from is None:
+        return
+    owner_id, pk, title = instance.owner_id, instance.pk, instance.title
+    # After commit, so a rolled-back save leaves no title behind in the index
+    transaction.on_commit(lambda: title_saved(owner_id, bump_version(TITLES, owner_id), pk, title))
+
+    def sync():
+        try:
+            if renamed_from is not None:
+                inbound = NoteLink.objects.filter(to_note_id=pk)
+                unresolve_inbound_links(
+                    owner_id, [(source_id, renamed_from) for source_id in inbound.values_list("from_note_id", flat=True)]
+                )
+                inbound.delete()
+            resolve_pending_links(owner_id, {title: pk})
+            _bump_on_commit(GRAPH, owner_id)
+        except (OperationalError, ProgrammingError):
+            return
+
+    _run_link_task(sync)
+
+
+@receiver(pre_delete, sender=Note)
+def capture_inbound_links(sender, instance: Note, **kwargs):
+    if _suspended.get():
+        return
     try:
-        titles = extract_wikilinks(instance.content)
-        # Desired target notes
-        desired = set()
-        if titles:
-            targets = {n.title: n for n in Note.objects.filter(owner=instance.owner, title__in=titles)}
-            desired = {n.pk for t, n in targets.items() if n and n.pk != instance.pk}
-
-        # Existing outbound target IDs
-        existing = set(
-            NoteLink.objects.filter(from_note=instance).values_list('to_note_id', flat=True)
+        instance._inbound_sources = list(
+            NoteLink.objects.filter(to_note_id=instance.pk).values_list("from_note_id", flat=True)
         )
+    except (OperationalError, ProgrammingError):
+        instance._inbound_sources = []
 
-        to_add = desired - existing
-        to_remove = existing - desired
 
-        if to_remove:
-            NoteLink.objects.filter(from_note=instance, to_note_id__in=list(to_remove)).delete()
-        for tid in to_add:
-            NoteLink.objects.get_or_create(from_note=instance, to_note_id=tid)
+@receiver(post_delete, sender=Note)
+def unresolve_links_to_deleted_note(sender, instance: Note, **kwargs):
+    if _suspended.get():
+        return
+    record_change(instance.owner_id, instance.pk, NoteChange.DELETED, instance.title)
+    owner_id, pk = instance.owner_id, instance.pk
+    _bump_on_commit(GRAPH, owner_id)
+    transaction.on_commit(lambda: title_deleted(owner_id, bump_version(TITLES, owner_id), pk))
+    sources = getattr(instance, "_inbound_sources", None)
+    if not sources:
+        return
+    try:
+        unresolve_inbound_links(instance.owner_id, [(source_id, instance.title) for source_id in sources])
+    except (OperationalError, ProgrammingError):
+        return
+
+
+@receiver(post_save, sender=Note)
+def index_note_for_search(sender, instance: Note, **kwargs):
+    if _suspended.get():
+        return
+    try:
+        get_search_backend().index_note(instance)
+    except (OperationalError, ProgrammingError):
+        return
+
+
+@receiver(post_delete, sender=Note)
+def remove_note_from_search(sender, instance: Note, **kwargs):
+    if _suspended.get():
+        return
+    try:
+        get_search_backend().remove_note(instance.pk)
     except (OperationalError, ProgrammingError):
-        # Tables may not exist yet (before migrations) — fail quietly
         return
@@ -1,11 +1,13 @@
 /* Missing links and inline editing with server-rendered preview + mode toggle */
 (function () {
   const missingBox = document.getElementById('missing-links-detail');
-  const contentEl = document.getElementById('note-content-raw');
+  // Exact stored text (JSON keeps leading newlines and \r that <pre> would lose): the base for save patches
+  const rawEl = document.getElementById('note-content-raw');
+  const rawContent = rawEl ? JSON.parse(rawEl.textContent) : null;
   const viewBox = document.getElementById('note-content');
   const titleEl = document.getElementById('note-title');
   const editorBox = document.getElementById('inline-editor');
-  const existingTitles = (window.EXISTING_TITLES || []).map((s) => (s || '').trim()).filter(Boolean);
+  let existingTitles = new Set();
 
   function extractTitles(md) {
     const set = new Set();
@@ -16,11 +18,12 @@
     return Array.from(set.values());
   }
 
-  if (missingBox && contentEl) {
-    const titles = extractTitles(contentEl.textContent || '');
-    const missing = titles.filter((t) => !existingTitles.includes(t));
+  window.NoteTitles.load().then((titles) => {
+    existingTitles = titles;
+    if (!missingBox || rawContent === null) return;
+    const missing = extractTitles(rawContent).filter((t) => !existingTitles.has(t));
     missingBox.innerHTML = missing.length ? missing.map((t) => `<a href="/create/?title=${encodeURIComponent(t)}">Create "${t}"</a>`).join(' · ') : '<span class="muted">No missing links</span>';
-  }
+  });
 
   function debounce(fn, wait) { let t; return function (...args) { clearTimeout(t); t = setTimeout(() => fn.apply(this, args), wait); }; }
   async function renderServer(md) {
@@ -32,10 +35,21 @@
     } catch { return ''; }
   }
 
+  // One splice from the common prefix/suffix, with offsets in code points like the server
+  function diffPatch(base, next) {
+    const a = Array.from(base), b = Array.from(next);
+    let start = 0;
+    while (start < a.length && start < b.length && a[start] === b[start]) start++;
+    let endA = a.length, endB = b.length;
+    while (endA > start && endB > start && a[endA - 1] === b[endB - 1]) { endA--; endB--; }
+    if (start === endA && start === endB) return [];
+    return [{ offset: start, delete: endA - start, insert: b.slice(start, endB).join('') }];
+  }
+
   function startEdit() {
-    if (!contentEl || !viewBox || !editorBox) return;
+    if (rawContent === null || !viewBox || !editorBox) return;
     const currentTitle = (titleEl?.textContent || '').trim();
-    const currentContent = contentEl.textContent || '';
+    const currentContent = rawContent;
 
     editorBox.innerHTML = `
       <div>
@@ -96,7 +110,7 @@
 
     const updateMissingFromMd = function () {
       const titles = extractTitles(mdText || '');
-      const missing = titles.filter((tt) => !existingTitles.includes(tt) && tt !== (tInput.value || ''));
+      const missing = titles.filter((tt) => !existingTitles.has(tt) && tt !== (tInput.value || ''));
       miss.innerHTML = missing.length ? missing.map((tt) => `<a href="/create/?title=${encodeURIComponent(tt)}">Create \"${tt}\"</a>`).join(' · ') : '<span class="muted">No missing links</span>';
     };
 
@@ -123,13 +137,22 @@
     async function save() {
       const noteId = window.NOTE_ID; if (!noteId) return; btnSave.disabled = true;
       try {
-        const res = await fetch(`/api/notes/${noteId}/`, { method: 'PATCH', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ title: tInput.value || '', content: mdText || '' }) });
+        // Send only the changed span; the version makes the server reject it if the note moved on
+        const body = { title: tInput.value || '', version: window.NOTE_VERSION, patch: diffPatch(currentContent, mdText || '') };
+        const res = await fetch(`/api/notes/${noteId}/`, { method: 'PATCH', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(body) });
+        if (res.status === 409) {
+          const data = await res.json();
+          alert(data.version ? 'This note was changed elsewhere. Copy your edits and reload to see the latest version.' : (data.detail || 'Failed to save.'));
+          btnSave.disabled = false;
+          return;
+        }
         if (!res.ok) throw new Error('Save failed'); location.reload();
       } catch (e) { alert('Failed to save. Please try again.'); btnSave.disabled = false; }
     }
 
     wys.addEventListener('input', () => { mdText = htmlToMd(wys.innerHTML); updateMissingFromMd(); });
     ta.addEventListener('input', () => { mdText = ta.value || ''; updateMissingFromMd(); });
+    window.NoteTitles.attachAutocomplete(ta);
     tInput.addEventListener('input', updateMissingFromMd);
     btnCancel.addEventListener('click', (e) => { e.preventDefault(); stopEdit(); });
     btnSave.addEventListener('click', (e) => { e.preventDefault(); save(); });
@@ -3,23 +3,57 @@
   const textarea = document.querySelector('textarea#id_content');
   const preview = document.getElementById('preview');
   const missingBox = document.getElementById('missing-links');
-  const existingTitles = (window.EXISTING_TITLES || []).map((s) => (s || '').trim()).filter(Boolean);
+  let existingTitles = new Set();
 
   function debounce(fn, wait) { let t; return function (...args) { clearTimeout(t); t = setTimeout(() => fn.apply(this, args), wait); }; }
 
-  async function renderServer(md) {
+  // Block-diff preview: the server only returns HTML for blocks we don't
+  // already hold, keyed by stable block ids; we reorder/patch the DOM.
+  const blockEls = new Map();
+
+  async function renderBlocks(md) {
     try {
       const res = await fetch('/api/notes/preview/', {
-        method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ text: md || '' })
+        method: 'POST', headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ text: md || '', mode: 'blocks', known: Array.from(blockEls.keys()) })
       });
-      if (!res.ok) return '';
+      // Rate-limit and size notices come back as blocks too, with a 429 for the former
       const data = await res.json();
-      return data.html || '';
-    } catch { return ''; }
+      return data.blocks || null;
+    } catch { return null; }
+  }
+
+  function patchPreview(blocks) {
+    // A block we were told we "know" may have been dropped by a newer response
+    if (blocks.some((b) => b.html === undefined && !blockEls.has(b.id))) return false;
+    const next = new Map();
+    const frag = document.createDocumentFragment();
+    blocks.forEach((b) => {
+      let el = blockEls.get(b.id);
+      if (!el || b.html !== undefined) {
+        el = document.createElement('div');
+        el.className = 'preview-block';
+        el.dataset.blockId = b.id;
+        el.innerHTML = b.html || '';
+      }
+      next.set(b.id, el);
+      frag.appendChild(el);
+    });
+    blockEls.clear();
+    next.forEach((el, id) => blockEls.set(id, el));
+    preview.replaceChildren(frag);
+    return true;
   }
 
   const update = debounce(async function () {
-    if (preview) preview.innerHTML = await renderServer(textarea.value || '');
+    if (preview) {
+      let blocks = await renderBlocks(textarea.value || '');
+      if (blocks && !patchPreview(blocks)) {
+        blockEls.clear();
+        blocks = await renderBlocks(textarea.value || '');
+        if (blocks) patchPreview(blocks);
+      }
+    }
     updateMissing();
   }, 250);
 
@@ -35,14 +69,16 @@
   function updateMissing() {
     if (!missingBox) return;
     const titles = extractTitles(textarea.value || '');
-    const missing = titles.filter((t) => !existingTitles.includes(t) && (document.querySelector('#id_title')?.value || '') !== t);
+    const missing = titles.filter((t) => !existingTitles.has(t) && (document.querySelector('#id_title')?.value || '') !== t);
     if (!missing.length) { missingBox.innerHTML = '<span class="muted">No missing links</span>'; return; }
     missingBox.innerHTML = missing.map((t) => `<a href="/create/?title=${encodeURIComponent(t)}">Create "${t}"</a>`).join(' · ');
   }
 
   if (textarea) {
     textarea.addEventListener('input', update);
+    window.NoteTitles.attachAutocomplete(textarea);
     update();
+    window.NoteTitles.load().then((titles) => { existingTitles = titles; updateMissing(); });
   }
 })();
 
@@ -15,8 +15,17 @@
         body: JSON.stringify({ url, summarize: !!summarize?.checked })
       });
       if (!res.ok) { const t = await res.text(); alert('Import failed: ' + t); return; }
-      const data = await res.json();
-      if (data.id) location.href = '/' + data.id + '/'; else location.reload();
+      let data = await res.json();
+      // 202: the import runs in the background; poll the job until it settles
+      while (res.status === 202 && data.status_url && (data.status === 'queued' || data.status === 'running')) {
+        await new Promise((r) => setTimeout(r, 1000));
+        const poll = await fetch(data.status_url);
+        if (!poll.ok) break;
+        data = await poll.json();
+      }
+      if (data.status === 'failed') { alert('Import failed: ' + (data.error || 'unknown error')); return; }
+      const noteId = data.note_id || data.id;
+      if (noteId) location.href = '/' + noteId + '/'; else location.reload();
     } catch (e) {
       alert('Network error.');
     }
@@ -0,0 +1,97 @@
+/* Shared title index: fetched once per page; the browser revalidates it by ETag */
+window.NoteTitles = (function () {
+  let pending = null;
+
+  function load() {
+    if (!pending) {
+      pending = fetch('/api/notes/titles/', { cache: 'no-cache', credentials: 'same-origin' })
+        .then((res) => (res.ok ? res.json() : { titles: [] }))
+        .then((data) => new Set((data.titles || []).map((s) => (s || '').trim()).filter(Boolean)))
+        .catch(() => new Set());
+    }
+    return pending;
+  }
+
+  // [[wikilink]] autocomplete for a textarea, backed by the suggest API
+  function attachAutocomplete(textarea) {
+    if (!textarea || textarea.dataset.autocomplete) return;
+    textarea.dataset.autocomplete = '1';
+    const list = document.createElement('ul');
+    list.className = 'autocomplete';
+    list.setAttribute('role', 'listbox');
+    list.style.display = 'none';
+    textarea.insertAdjacentElement('afterend', list);
+
+    let items = [];
+    let active = 0;
+    let start = -1;
+    let seq = 0;
+    let timer;
+
+    function close() { list.style.display = 'none'; items = []; start = -1; }
+
+    function render() {
+      list.replaceChildren(...items.map((item, i) => {
+        const li = document.createElement('li');
+        li.textContent = item.title;
+        li.setAttribute('role', 'option');
+        if (i === active) li.className = 'active';
+        li.addEventListener('mousedown', (e) => { e.preventDefault(); choose(i); });
+        return li;
+      }));
+      list.style.display = items.length ? '' : 'none';
+    }
+
+    function choose(i) {
+      const item = items[i];
+      if (!item || start < 0) return;
+      const caret = textarea.selectionStart;
+      const after = textarea.value.slice(caret);
+      const closing = after.startsWith(']]') ? '' : ']]';
+      textarea.value = textarea.value.slice(0, start) + item.title + closing + after;
+      const pos = start + item.title.length + 2;
+      textarea.setSelectionRange(pos, pos);
+      close();
+      textarea.dispatchEvent(new Event('input', { bubbles: true }));
+    }
+
+    async function query(q) {
+      const mine = ++seq;
+      try {
+        const res = await fetch(`/api/notes/titles/suggest/?limit=8&q=${encodeURIComponent(q)}`, { credentials: 'same-origin' });
+        if (!res.ok || mine !== seq) return;
+        items = (await res.json()).results || [];
+        active = 0;
+        render();
+      } catch { close(); }
+    }
+
+    textarea.addEventListener('input', () => {
+      const before = textarea.value.slice(0, textarea.selectionStart);
+      const m = before.match(/\[\[([^\[\]\n]*)$/);
+      clearTimeout(timer);
+      if (!m || !m[1].trim()) { seq++; close(); return; }
+      start = before.length - m[1].length;
+      timer = setTimeout(() => query(m[1]), 60);
+    });
+    textarea.addEventListener('keydown', (e) => {
+      if (!items.length || list.style.display === 'none') return;
+      if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+        e.preventDefault();
+        active = (active + (e.key === 'ArrowDown' ? 1 : items.length - 1)) % items.length;
+        render();
+      } else if (e.key === 'Enter' || e.key === 'Tab') {
+        e.preventDefault();
+        e.stopPropagation();
+        choose(active);
+      } else if (e.key === 'Escape') {
+        e.preventDefault();
+        e.stopPropagation();
+        close();
+      }
+    });
+    textarea.addEventListener('blur', () => setTimeout(close, 100));
+  }
+
+  return { load, attachAutocomplete };
+})();
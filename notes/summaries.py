@@ -0,0 +1,233 @@
+"""Summarization service used by URL imports.
+
+A pluggable backend (``settings.NOTES_SUMMARIZER``, a dotted path) does the
+actual work; the service in front of it adds:
+
+- a result cache keyed by backend name + content hash, so an article imported
+  by several users is summarized once;
+- coalescing of identical concurrent requests in this process (the first
+  caller computes, the rest wait for its result);
+- a fallback backend when the primary one fails (fallback output is not
+  cached, so a transient outage does not pin naive summaries);
+- timing counters, exposed by ``summary_stats()``.
+
+The default backend is OpenAI when ``OPENAI_API_KEY`` is set and the client
+is installed, otherwise the offline extractive summarizer.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+SUMMARY_CACHE_PREFIX = "notes:summary:v1:"
+SUMMARY_CACHE_TIMEOUT = 30 * 24 * 3600
+SENTENCE_RE = re.compile(r"(?<=[.!?。！？])\s+|\n+")
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class SummaryError(Exception):
+    pass
+
+
+class BaseSummarizer:
+    name = "base"
+
+    def summarize(self, text: str) -> str:
+        raise NotImplementedError
+
+
+class NaiveSummarizer(BaseSummarizer):
+    """First few paragraphs; never fails."""
+
+    name = "naive"
+    paragraphs = 3
+
+    def summarize(self, text):
+        paras = [p.strip() for p in text.split('\n') if p.strip()]
+        return '\n'.join(paras[:self.paragraphs])
+
+
+class ExtractiveSummarizer(BaseSummarizer):
+    """Offline frequency-based extractive summary.
+
+    Scores sentences by the document frequency of their words and returns the
+    best ``sentences`` of them in their original order.
+    """
+
+    name = "extractive"
+    sentences = 5
+    min_word_length = 3
+
+    def summarize(self, text):
+        sentences = [s.strip() for s in SENTENCE_RE.split(text or '') if s.strip()]
+        if len(sentences) <= self.sentences:
+            return '\n'.join(sentences)
+        words = [w.lower() for w in WORD_RE.findall(text) if len(w) >= self.min_word_length]
+        freq = Counter(words)
+        scored = []
+        for i, sentence in enumerate(sentences):
+            tokens = [w.lower() for w in WORD_RE.findall(sentence) if len(w) >= self.min_word_length]
+            if tokens:
+                scored.append((sum(freq[t] for t in tokens) / len(tokens), i))
+        best = sorted(i for _, i in sorted(scored, reverse=True)[:self.sentences])
+        return '\n'.join(sentences[i] for i in best)
+
+
+class OpenAISummarizer(BaseSummarizer):
+    name = "openai"
+    model = "gpt-4o-mini"
+
+    def summarize(self, text):
+        try:
+            import openai  # type: ignore
+        except ImportError as e:
+            raise SummaryError("openai is not installed") from e
+        api_key = os.environ.get('OPENAI_API_KEY')
+        if not api_key:
+            raise SummaryError('no api key')
+        client = openai.OpenAI(api_key=api_key) if hasattr(openai, 'OpenAI') else openai
+        prompt = (
+            "请用中文给出该文章的简要摘要（150~300字），并给出5个要点。\n\n" + text
+        )
+        if not (hasattr(client, 'chat') and hasattr(client.chat, 'completions')):
+            raise SummaryError('unsupported openai client')
+        resp = client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.4,
+        )
+        return resp.choices[0].message.content.strip()
+
+
+def default_backend() -> BaseSummarizer:
+    if os.environ.get('OPENAI_API_KEY'):
+        try:
+            import openai  # type: ignore  # noqa: F401
+            return OpenAISummarizer()
+        except ImportError:
+            pass
+    return ExtractiveSummarizer()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class SummaryService:
+    def __init__(self, backend: BaseSummarizer, fallback: Optional[BaseSummarizer] = None, cache=None):
+        self.backend = backend
+        self.fallback = fallback
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._inflight: dict[str, _InFlight] = {}
+        self._stats = Counter()
+
+    def cache_key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return f"{SUMMARY_CACHE_PREFIX}{self.backend.name}:{digest}"
+
+    def summarize(self, text: str) -> str:
+        if not text.strip():
+            return ''
+        key = self.cache_key(text)
+        self._count("requests")
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._count("cache_hits")
+                return cached
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+        if not leader:
+            self._count("coalesced")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._compute(key, text)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _compute(self, key: str, text: str) -> str:
+        start = time.perf_counter()
+        try:
+            summary = self.backend.summarize(text)
+        except Exception:
+            self._count("errors")
+            if self.fallback is None:
+                raise
+            self._count("fallbacks")
+            return self.fallback.summarize(text)
+        finally:
+            self._count("backend_calls")
+            self._count("backend_seconds", time.perf_counter() - start)
+        if self.cache is not None and summary:
+            self.cache.set(key, summary, getattr(settings, 'NOTES_SUMMARY_CACHE_TIMEOUT', SUMMARY_CACHE_TIMEOUT))
+        return summary
+
+    def _count(self, name: str, amount=1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        calls = stats.get("backend_calls", 0)
+        stats["backend"] = self.backend.name
+        stats["avg_backend_seconds"] = stats.get("backend_seconds", 0.0) / calls if calls else 0.0
+        return stats
+
+
+_service: Optional[SummaryService] = None
+_service_lock = threading.Lock()
+
+
+def get_summary_service() -> SummaryService:
+    global _service
+    if _service is None:
+        from django.core.cache import caches
+
+        with _service_lock:
+            if _service is None:
+                path = getattr(settings, 'NOTES_SUMMARIZER', None)
+                backend = import_string(path)() if path else default_backend()
+                _service = SummaryService(
+                    backend,
+                    fallback=NaiveSummarizer(),
+                    cache=caches[getattr(settings, 'NOTES_SUMMARY_CACHE_ALIAS', 'default')],
+                )
+    return _service
+
+
+def reset_summary_service() -> None:
+    global _service
+    _service = None
+
+
+def summarize_text(text: str) -> str:
+    return get_summary_service().summarize(text)
+
+
+def summary_stats() -> dict:
+    return get_summary_service().stats()
@@ -1,17 +1,56 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
-from .models import Note, NoteLink
+from .models import Note, NoteLink, NoteRevision
 
 
 User = get_user_model()
 
 
+class StubPageHandler(BaseHTTPRequestHandler):
+    """Serves ``<title>Page</title>`` pages with an ETag; ``/missing`` is a 404."""
+
+    etag = '"v1"'
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path == "/missing":
+            self.send_error(404)
+            return
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.send_header("ETag", self.etag)
+            self.end_headers()
+            return
+        body = f"<html><head><title>Page</title></head><body><p>{self.path}</p></body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", self.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
 class NotesApiTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="apiuser", password="pw")
 
+    def start_stub_server(self) -> str:
+        StubPageHandler.requests = []
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubPageHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
     def test_requires_auth(self):
         resp = self.client.get("/api/notes/")
         self.assertEqual(resp.status_code, 401)
@@ -46,6 +85,12 @@ class NotesApiTests(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp.json()["title"], "Alpha")
 
+        # Links built
+        alpha = Note.objects.get(pk=alpha_id)
+        beta = Note.objects.get(pk=beta_id)
+        self.assertTrue(NoteLink.objects.filter(from_note=alpha, to_note=beta).exists())
+        self.assertTrue(NoteLink.objects.filter(from_note=beta, to_note=alpha).exists())
+
         # Update
         resp = self.client.patch(
             f"/api/notes/{alpha_id}/",
@@ -54,12 +99,7 @@ class NotesApiTests(TestCase):
         )
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp.json()["content"], "Updated")
-
-        # Links built
-        alpha = Note.objects.get(pk=alpha_id)
-        beta = Note.objects.get(pk=beta_id)
-        self.assertTrue(NoteLink.objects.filter(from_note=alpha, to_note=beta).exists())
-        self.assertTrue(NoteLink.objects.filter(from_note=beta, to_note=alpha).exists())
+        self.assertFalse(NoteLink.objects.filter(from_note=alpha, to_note=beta).exists())
 
         # Delete
         resp = self.client.delete(f"/api/notes/{alpha_id}/")
@@ -79,3 +119,751 @@ class NotesApiTests(TestCase):
         html = resp.json().get("html", "")
         self.assertIn(f"/{note.pk}/", html)
         self.assertIn("<strong>", html)
+
+    def test_search_endpoint(self):
+        self.client.login(username="apiuser", password="pw")
+        Note.objects.create(owner=self.user, title="Gardening", content="Tomatoes need full sun and water")
+        Note.objects.create(owner=self.user, title="Cooking", content="Roast the tomatoes slowly")
+        other = User.objects.create_user(username="other", password="pw")
+        Note.objects.create(owner=other, title="Tomato secrets", content="tomatoes")
+
+        resp = self.client.get("/api/notes/search/?q=tomato")
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()["results"]
+        self.assertEqual({r["title"] for r in results}, {"Gardening", "Cooking"})
+        self.assertTrue(all("<mark>" in r["snippet"] for r in results))
+
+        # Index follows renames and deletes
+        garden = Note.objects.get(owner=self.user, title="Gardening")
+        garden.content = "Only peppers now"
+        garden.save()
+        Note.objects.get(owner=self.user, title="Cooking").delete()
+        resp = self.client.get("/api/notes/search/?q=tomato")
+        self.assertEqual(resp.json()["results"], [])
+
+    def test_preview_block_mode(self):
+        self.client.login(username="apiuser", password="pw")
+        text = "# Title\n\nFirst para\n\n```\ncode\n\nstill code\n```\n\nLast [[Ref]]"
+        resp = self.client.post(
+            "/api/notes/preview/",
+            data={"text": text, "mode": "blocks"},
+            content_type="application/json",
+        )
+        blocks = resp.json()["blocks"]
+        self.assertEqual(len(blocks), 4)
+        self.assertTrue(all("html" in b for b in blocks))
+
+        # Editing one block only resends that block
+        known = [b["id"] for b in blocks]
+        resp = self.client.post(
+            "/api/notes/preview/",
+            data={"text": text.replace("First para", "First paragraph"), "mode": "blocks", "known": known},
+            content_type="application/json",
+        )
+        blocks2 = resp.json()["blocks"]
+        self.assertEqual([b["id"] for b in blocks2][::2], known[::2])
+        self.assertEqual(["html" in b for b in blocks2], [False, True, False, False])
+
+        # Resolving a link inside a block changes that block's id
+        Note.objects.create(owner=self.user, title="Ref", content="")
+        resp = self.client.post(
+            "/api/notes/preview/",
+            data={"text": text, "mode": "blocks", "known": known},
+            content_type="application/json",
+        )
+        self.assertEqual(["html" in b for b in resp.json()["blocks"]], [False, False, False, True])
+
+        def post(data):
+            return self.client.post("/api/notes/preview/", data=data, content_type="application/json")
+
+        for bad in ([["x"]], [{}], "abc"):
+            self.assertEqual(post({"text": text, "mode": "blocks", "known": bad}).status_code, 400)
+        # Notices keep the block shape the editor renders
+        resp = post({"text": "x" * 200_001, "mode": "blocks"})
+        self.assertIn("too large", resp.json()["blocks"][0]["html"])
+        from django.core.cache import cache
+
+        cache.set(f"notes_preview_rate_{self.user.pk}", 60, 60)
+        resp = post({"text": text, "mode": "blocks"})
+        self.assertEqual((resp.status_code, resp.json()["blocks"][0]["id"]), (429, "notice"))
+        cache.delete(f"notes_preview_rate_{self.user.pk}")
+
+    def test_list_keyset_pagination_and_fields(self):
+        self.client.login(username="apiuser", password="pw")
+        for i in range(5):
+            Note.objects.create(owner=self.user, title=f"N{i}", content="x" * 100)
+
+        seen = []
+        cursor = ""
+        while True:
+            resp = self.client.get(f"/api/notes/?limit=2&fields=id,title&cursor={cursor}")
+            self.assertEqual(resp.status_code, 200)
+            body = resp.json()
+            for row in body["results"]:
+                self.assertEqual(set(row), {"id", "title"})
+            seen.extend(r["title"] for r in body["results"])
+            cursor = body["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, [f"N{i}" for i in reversed(range(5))])
+
+        self.assertEqual(self.client.get("/api/notes/?fields=secret").status_code, 400)
+        self.assertEqual(self.client.get("/api/notes/?cursor=@@@").status_code, 400)
+
+    def test_export_streams_zip_with_links_manifest(self):
+        import io
+        import json
+        import zipfile
+
+        self.client.login(username="apiuser", password="pw")
+        b = Note.objects.create(owner=self.user, title="Beta", content="beta body")
+        a = Note.objects.create(owner=self.user, title="Alpha", content="See [[Beta]]")
+
+        resp = self.client.get("/api/notes/export/?all=1&links=1")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content)))
+        self.assertEqual(archive.read(f"{b.pk}-Beta.md").decode(), "beta body")
+        self.assertEqual(json.loads(archive.read("links.json")), [{"from": a.pk, "to": b.pk}])
+
+        resp = self.client.get(f"/api/notes/export/?ids={b.pk}")
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content)))
+        self.assertEqual(archive.namelist(), [f"{b.pk}-Beta.md"])
+
+    def test_bulk_import_zip_and_ndjson(self):
+        import io
+        import json
+        import zipfile
+
+        self.client.login(username="apiuser", password="pw")
+        Note.objects.create(owner=self.user, title="Alpha", content="existing")
+
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("12-Alpha.md", "Imported alpha, see [[Beta]]")
+            zf.writestr("vault/Beta.md", "Back to [[Alpha (2)]]")
+            zf.writestr("image.png", b"\x89PNG")
+        resp = self.client.post("/api/notes/import/", data=buf.getvalue(), content_type="application/zip")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual((resp.json()["created"], resp.json()["renamed"]), (2, 1))
+        alpha2 = Note.objects.get(owner=self.user, title="Alpha (2)")
+        beta = Note.objects.get(owner=self.user, title="Beta")
+        self.assertTrue(NoteLink.objects.filter(from_note=alpha2, to_note=beta).exists())
+        self.assertTrue(NoteLink.objects.filter(from_note=beta, to_note=alpha2).exists())
+
+        lines = [json.dumps({"title": "Gamma", "content": "[[Beta]]"}), "not json", ""]
+        resp = self.client.post(
+            "/api/notes/import/", data="\n".join(lines), content_type="application/x-ndjson"
+        )
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json()["created"], 1)
+        self.assertEqual(len(resp.json()["errors"]), 1)
+        gamma = Note.objects.get(owner=self.user, title="Gamma")
+        self.assertTrue(NoteLink.objects.filter(from_note=gamma, to_note=beta).exists())
+
+        # A corrupt member is reported and skipped; the rest still imports
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as zf:
+            zf.writestr("Delta.md", "delta body")
+            zf.writestr("Epsilon.md", "epsilon body")
+        data = buf.getvalue().replace(b"epsilon body", b"epsilon BODY")
+        resp = self.client.post("/api/notes/import/", data=data, content_type="application/zip")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json()["created"], 1)
+        self.assertTrue(resp.json()["errors"][0].startswith("Epsilon.md: unreadable"))
+
+        # A title taken by a concurrent write after it was read is a conflict, not a 500
+        from .bulk import BatchError, create_notes_bulk
+
+        def items():
+            Note.objects.create(owner=self.user, title="Zeta", content="")
+            yield "Zeta", "imported"
+
+        with self.assertRaises(BatchError) as caught:
+            create_notes_bulk(self.user, items())
+        self.assertEqual(caught.exception.errors[0]["status"], 409)
+        self.assertFalse(Note.objects.filter(owner=self.user, title="Zeta").exists())
+
+    def test_batch_operations(self):
+        import json
+
+        from .models import UnresolvedLink
+
+        self.client.login(username="apiuser", password="pw")
+        a = Note.objects.create(owner=self.user, title="A", content="[[B]]")
+        b = Note.objects.create(owner=self.user, title="B", content="[[A]]")
+        gone = Note.objects.create(owner=self.user, title="Gone", content="")
+        Note.objects.create(owner=self.user, title="Links gone", content="[[Gone]]")
+
+        def batch(ops):
+            return self.client.post("/api/notes/batch/", json.dumps({"operations": ops}),
+                                    content_type="application/json")
+
+        cursor = self.client.get("/api/notes/changes/").json()["cursor"]
+        resp = batch([
+            {"op": "create", "title": "A", "content": "[[New]] and [[B2]]"},
+            {"op": "create", "title": "New", "content": "[[A (2)]]"},
+            {"op": "update", "id": b.pk, "title": "B2"},
+            {"op": "update", "id": b.pk, "content": "[[New]]"},
+            {"op": "delete", "id": gone.pk},
+        ])
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()["results"]
+        self.assertEqual([r["op"] for r in results], ["create", "create", "update", "update", "delete"])
+        self.assertEqual(results[0]["title"], "A (2)")
+        a2 = Note.objects.get(pk=results[0]["id"])
+        new = Note.objects.get(pk=results[1]["id"])
+        b.refresh_from_db()
+        self.assertEqual((b.title, b.content), ("B2", "[[New]]"))
+        self.assertFalse(Note.objects.filter(pk=gone.pk).exists())
+        links = set(NoteLink.objects.values_list("from_note_id", "to_note_id"))
+        self.assertEqual(links, {(a2.pk, new.pk), (a2.pk, b.pk), (new.pk, a2.pk), (b.pk, new.pk)})
+        # A linked to B by its old title; Links gone pointed at the deleted note
+        self.assertEqual(set(UnresolvedLink.objects.values_list("title", flat=True)), {"B", "Gone"})
+        self.assertEqual(a.unresolved_links.get().title, "B")
+        self.assertIn(b.pk, [h["id"] for h in self.client.get("/api/notes/search/", {"q": "B2"}).json()["results"]])
+        feed = self.client.get("/api/notes/changes/", {"since": cursor}).json()["changes"]
+        self.assertEqual(len(feed), 4)
+        tombstone = next(c for c in feed if c["id"] == gone.pk)
+        self.assertEqual((tombstone["op"], tombstone["title"]), ("delete", "Gone"))
+        self.assertEqual(next(c for c in feed if c["id"] == b.pk)["renamed_from"], "B")
+
+        # One bad operation rejects the whole batch
+        resp = batch([
+            {"op": "update", "id": a.pk, "content": "changed"},
+            {"op": "update", "id": new.pk, "title": "B2"},
+            {"op": "delete", "id": 999999},
+        ])
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual([(e["index"], e["status"]) for e in resp.json()["errors"]], [(1, 409), (2, 404)])
+        a.refresh_from_db()
+        self.assertEqual(a.content, "[[B]]")
+        resp = batch([{"op": "delete", "id": [a.pk]}, {"op": "update", "id": {}}, {"op": "delete", "id": True}])
+        self.assertEqual([(e["index"], e["status"]) for e in resp.json()["errors"]], [(0, 400), (1, 400), (2, 400)])
+        self.assertEqual(batch({"op": "create"}).status_code, 400)
+
+    def test_change_feed_with_tombstones_and_renames(self):
+        import json
+
+        self.client.login(username="apiuser", password="pw")
+        a = Note.objects.create(owner=self.user, title="A", content="one")
+        b = Note.objects.create(owner=self.user, title="B", content="two")
+        feed = self.client.get("/api/notes/changes/").json()
+        self.assertEqual([(c["op"], c["id"]) for c in feed["changes"]], [("upsert", a.pk), ("upsert", b.pk)])
+        self.assertFalse(feed["has_more"])
+        # Sequence numbers are per owner and gapless
+        Note.objects.create(owner=User.objects.create_user(username="feed-other", password="pw"), title="X")
+        self.assertEqual([c["seq"] for c in feed["changes"]], [1, 2])
+        cursor = feed["cursor"]
+
+        # Nothing changed: empty page, same cursor
+        feed = self.client.get("/api/notes/changes/", {"since": cursor}).json()
+        self.assertEqual((feed["changes"], feed["cursor"]), ([], cursor))
+
+        self.client.patch(f"/api/notes/{a.pk}/", json.dumps({"title": "A2"}), content_type="application/json")
+        self.client.patch(f"/api/notes/{a.pk}/", json.dumps({"content": "edited"}), content_type="application/json")
+        self.client.delete(f"/api/notes/{b.pk}/")
+        c = Note.objects.create(owner=self.user, title="C")
+        feed = self.client.get("/api/notes/changes/", {"since": cursor, "fields": "id,title,content"}).json()
+        self.assertEqual(feed["changes"], [
+            {"op": "upsert", "seq": feed["changes"][0]["seq"], "id": a.pk, "title": "A2", "content": "edited",
+             "renamed_from": "A"},
+            {"op": "delete", "seq": feed["changes"][1]["seq"], "id": b.pk, "title": "B"},
+            {"op": "upsert", "seq": feed["cursor"], "id": c.pk, "title": "C", "content": ""},
+        ])
+
+        # Paging walks the log in order without gaps
+        seen, since = [], cursor
+        while True:
+            page = self.client.get("/api/notes/changes/", {"since": since, "limit": 1}).json()
+            seen += [ch["id"] for ch in page["changes"]]
+            since = page["cursor"]
+            if not page["has_more"]:
+                break
+        self.assertEqual(seen, [a.pk, a.pk, b.pk, c.pk])
+        self.assertEqual(since, 6)
+        self.assertEqual(self.client.get("/api/notes/changes/", {"since": "x"}).status_code, 400)
+
+    def test_conditional_get(self):
+        import json
+
+        self.client.login(username="apiuser", password="pw")
+        note = Note.objects.create(owner=self.user, title="Cached", content="[[Other]]")
+        url = f"/api/notes/{note.pk}/"
+
+        resp = self.client.get(url)
+        etag, last_modified = resp["ETag"], resp["Last-Modified"]
+        self.assertEqual(resp["Cache-Control"], "private, no-cache")
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((resp.status_code, resp.content, resp["ETag"]), (304, b"", etag))
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        listing = self.client.get("/api/notes/", {"limit": 5})
+        other_query = self.client.get("/api/notes/", {"limit": 6})
+        self.assertNotEqual(listing["ETag"], other_query["ETag"])
+        self.assertEqual(self.client.get("/api/notes/", {"limit": 5}, HTTP_IF_NONE_MATCH=listing["ETag"]).status_code, 304)
+
+        page = self.client.get(f"/{note.pk}/")
+        self.assertFalse(page.has_header("Last-Modified"))
+        self.assertEqual(self.client.get(f"/{note.pk}/", HTTP_IF_NONE_MATCH=page["ETag"]).status_code, 304)
+
+        # A new backlink changes the page but not the note itself
+        Note.objects.create(owner=self.user, title="Other", content="[[Cached]]")
+        self.assertEqual(self.client.get(f"/{note.pk}/", HTTP_IF_NONE_MATCH=page["ETag"]).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(
+            self.client.get("/api/notes/", {"limit": 5}, HTTP_IF_NONE_MATCH=listing["ETag"]).status_code, 200
+        )
+
+        self.client.patch(url, json.dumps({"content": "changed"}), content_type="application/json")
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((resp.status_code, resp.json()["content"]), (200, "changed"))
+        self.assertNotEqual(resp["ETag"], etag)
+        self.assertEqual(self.client.get("/api/notes/999999/", HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+        # A write from another process, whose cache counters this one never sees
+        from unittest import mock
+
+        listing = self.client.get("/api/notes/", {"limit": 5})
+        page = self.client.get(f"/{note.pk}/")
+        with mock.patch("notes.signals.bump_version"):
+            Note.objects.create(owner=self.user, title="Elsewhere", content="[[Cached]]")
+        self.assertEqual(
+            self.client.get("/api/notes/", {"limit": 5}, HTTP_IF_NONE_MATCH=listing["ETag"]).status_code, 200
+        )
+        self.assertEqual(self.client.get(f"/{note.pk}/", HTTP_IF_NONE_MATCH=page["ETag"]).status_code, 200)
+
+    def test_versioned_patch_edits(self):
+        import json
+
+        self.client.login(username="apiuser", password="pw")
+        note = Note.objects.create(owner=self.user, title="Draft", content="The quick fox")
+        url = f"/api/notes/{note.pk}/"
+
+        def patch(body, **headers):
+            return self.client.patch(url, json.dumps(body), content_type="application/json", **headers)
+
+        etag = self.client.get(url)["ETag"]
+        resp = patch({"patch": [{"offset": 4, "delete": 5, "insert": "slow"}]}, HTTP_IF_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {"id": note.pk, "title": "Draft", "version": 2})
+        self.assertNotEqual(resp["ETag"], etag)
+        note.refresh_from_db()
+        self.assertEqual(note.content, "The slow fox")
+
+        # A second device still holding version 1 is refused, with the current version
+        resp = patch({"content": "overwrite"}, HTTP_IF_MATCH=etag)
+        self.assertEqual((resp.status_code, resp.json()["version"]), (409, 2))
+        self.assertEqual(patch({"patch": [{"offset": 0, "insert": "x"}], "version": 1}).status_code, 409)
+        resp = patch({"patch": [{"offset": 12, "insert": "!"}], "version": 2})
+        self.assertEqual(resp.json()["version"], 3)
+
+        # Patches need a known base; bad patches change nothing
+        self.assertEqual(patch({"patch": [{"offset": 0, "insert": "x"}]}).status_code, 428)
+        self.assertEqual(patch({"patch": [{"offset": 99, "insert": "x"}], "version": 3}).status_code, 400)
+        self.assertEqual(patch({"patch": [], "content": "x", "version": 3}).status_code, 400)
+        # Unconditional writes still work and advance the version
+        self.assertEqual(patch({"content": "replaced"}).json()["version"], 4)
+        self.assertEqual(self.client.get(url).json()["version"], 4)
+
+        resp = self.client.post("/api/notes/batch/", json.dumps({"operations": [
+            {"op": "update", "id": note.pk, "version": 4, "patch": [{"offset": 0, "delete": 1, "insert": "R"}]},
+        ]}), content_type="application/json")
+        self.assertEqual(resp.json()["results"][0]["version"], 5)
+        resp = self.client.post("/api/notes/batch/", json.dumps({"operations": [
+            {"op": "delete", "id": note.pk, "version": 4},
+        ]}), content_type="application/json")
+        self.assertEqual(resp.status_code, 409)
+        note.refresh_from_db()
+        self.assertEqual((note.content, note.version), ("Replaced", 5))
+        for bad in ("5", True):
+            resp = self.client.post("/api/notes/batch/", json.dumps({"operations": [
+                {"op": "update", "id": note.pk, "version": bad, "content": "x"},
+            ]}), content_type="application/json")
+            self.assertEqual(resp.status_code, 400)
+
+        # A write landing between the batch's read and its transaction fails the batch
+        from unittest import mock
+
+        from django.db.models import F
+
+        from . import bulk
+
+        def sneak_in():
+            Note.objects.filter(pk=note.pk).update(content="elsewhere", version=F("version") + 1)
+            return get_search_backend()
+
+        get_search_backend = bulk.get_search_backend
+        with mock.patch("notes.bulk.get_search_backend", side_effect=sneak_in):
+            resp = self.client.post("/api/notes/batch/", json.dumps({"operations": [
+                {"op": "update", "id": note.pk, "content": "batch"},
+            ]}), content_type="application/json")
+        self.assertEqual(resp.status_code, 409)
+        note.refresh_from_db()
+        self.assertEqual((note.content, note.version), ("elsewhere", 6))
+
+        # Deletes honour the same preconditions
+        self.assertEqual(self.client.delete(url, HTTP_IF_MATCH=etag).status_code, 409)
+        resp = self.client.delete(url, json.dumps({"version": 5}), content_type="application/json")
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(self.client.delete(url, HTTP_IF_MATCH=f'"note-{note.pk}-v6"').status_code, 204)
+
+        # A note deleted between the load and the conditional write is gone, not a conflict
+        other = Note.objects.create(owner=self.user, title="Other", content="")
+
+        def delete_first(expected):
+            Note.objects.filter(pk=other.pk).delete()
+            return False
+
+        with mock.patch.object(Note, "save_if_version", side_effect=delete_first):
+            resp = self.client.patch(f"/api/notes/{other.pk}/", json.dumps({"content": "x", "version": 1}),
+                                     content_type="application/json")
+        self.assertEqual(resp.status_code, 404)
+
+    @override_settings(NOTES_REVISION_COALESCE_SECONDS=0)
+    def test_revision_history(self):
+        import json
+
+        self.client.login(username="apiuser", password="pw")
+        note = Note.objects.create(owner=self.user, title="Plan", content="one\ntwo\n")
+        url = f"/api/notes/{note.pk}/"
+        self.client.patch(url, json.dumps({"content": "one\n2\n"}), content_type="application/json")
+        self.client.patch(url, json.dumps({"title": "Plan B", "content": "one\n2\nthree\n"}),
+                          content_type="application/json")
+
+        data = self.client.get(f"{url}revisions/").json()
+        self.assertEqual(data["current_version"], 3)
+        self.assertEqual([(r["version"], r["title"]) for r in data["revisions"]], [(2, "Plan"), (1, "Plan")])
+        page = self.client.get(f"{url}revisions/", {"limit": 1}).json()
+        self.assertEqual((len(page["revisions"]), page["next"]), (1, 2))
+        self.assertEqual(self.client.get(f"{url}revisions/", {"before": 2}).json()["revisions"][0]["version"], 1)
+
+        self.assertEqual(self.client.get(f"{url}revisions/1/").json()["content"], "one\ntwo\n")
+        self.assertEqual(self.client.get(f"{url}revisions/3/").status_code, 404)
+        diff = self.client.get(f"{url}revisions/diff/", {"from": 1}).json()
+        self.assertEqual((diff["to"], diff["title"]), (3, {"from": "Plan", "to": "Plan B"}))
+        self.assertIn("-two\n+2\n+three\n", diff["diff"])
+        self.assertEqual(self.client.get(f"{url}revisions/diff/", {"from": 1, "to": 2}).json()["title"], None)
+        self.assertEqual(self.client.get(f"{url}revisions/diff/").status_code, 400)
+        self.assertEqual(self.client.get(f"{url}revisions/diff/", {"from": 7}).status_code, 404)
+
+        # Revisions go with the note
+        other = User.objects.create_user(username="other-rev", password="pw")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f"{url}revisions/1/").status_code, 404)
+        note.delete()
+        self.assertFalse(NoteRevision.objects.exists())
+
+    def test_graph_endpoint(self):
+        self.client.login(username="apiuser", password="pw")
+        a = Note.objects.create(owner=self.user, title="A", content="[[B]]")
+        b = Note.objects.create(owner=self.user, title="B", content="[[C]]")
+        c = Note.objects.create(owner=self.user, title="C", content="")
+        d = Note.objects.create(owner=self.user, title="D", content="")
+
+        data = self.client.get("/api/graph/").json()
+        self.assertEqual({n["title"] for n in data["nodes"]}, {"A", "B", "C", "D"})
+        self.assertEqual(sorted(data["edges"]), sorted([[a.pk, b.pk], [b.pk, c.pk]]))
+
+        data = self.client.get(f"/api/graph/?note={a.pk}&hops=1&format=compact").json()
+        self.assertEqual(data["ids"], [a.pk, b.pk])
+        self.assertEqual((data["offsets"], data["targets"]), ([0, 1, 1], [1]))
+
+        # Link changes invalidate the cached graph once they commit
+        d.content = "[[A]]"
+        with self.captureOnCommitCallbacks(execute=True):
+            d.save()
+        data = self.client.get(f"/api/graph/?note={a.pk}&hops=2").json()
+        self.assertEqual({n["id"] for n in data["nodes"]}, {a.pk, b.pk, c.pk, d.pk})
+        self.assertEqual(self.client.get("/api/graph/?note=999999").status_code, 404)
+
+    def test_import_url_is_queued_and_processed_by_worker(self):
+        from unittest import mock
+
+        from .jobs import run_pending_jobs
+        from .models import ImportJob
+
+        self.client.login(username="apiuser", password="pw")
+        resp = self.client.post(
+            "/api/notes/import_url/", data={"url": "https://example.com/a"}, content_type="application/json"
+        )
+        self.assertEqual(resp.status_code, 202)
+        job_id = resp.json()["job_id"]
+        self.assertEqual(resp.json()["status"], "queued")
+
+        html = "<html><head><title>Example Page</title></head><body><p>Hello</p></body></html>"
+        from .http import Page
+
+        with mock.patch("notes.importer.fetch_url", return_value=Page(html, "https://example.com/a")):
+            self.assertEqual(run_pending_jobs(), 1)
+        data = self.client.get(f"/api/jobs/{job_id}/").json()
+        self.assertEqual(data["status"], "succeeded")
+        self.assertEqual(Note.objects.get(pk=data["note_id"]).title, "Example Page")
+        self.assertEqual(ImportJob.objects.get(pk=job_id).locked_by, "")
+
+        # Failures are retried with backoff, then marked failed
+        from .importer import ImportFailed
+
+        job = ImportJob.objects.create(owner=self.user, url="https://example.com/b", max_attempts=2)
+        with mock.patch("notes.importer.fetch_url", side_effect=ImportFailed("fetch failed: boom")):
+            run_pending_jobs()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ("queued", 1))
+            ImportJob.objects.filter(pk=job.pk).update(run_after=job.created_at)
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ("failed", "fetch failed: boom"))
+
+        # Client errors are permanent and fail without a retry
+        import urllib.error
+
+        from .http import FetchError, _error_status
+
+        not_found = urllib.error.HTTPError("https://example.com/c", 404, "Not Found", {}, None)
+        job = ImportJob.objects.create(owner=self.user, url="https://example.com/c", max_attempts=3)
+        with mock.patch("notes.importer.fetch_page", side_effect=FetchError("404", _error_status(not_found))):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 1))
+
+        # A job whose outcome cannot be saved does not stop the worker
+        from .jobs import run_worker
+
+        ImportJob.objects.create(owner=self.user, url="https://example.com/d")
+        ImportJob.objects.create(owner=self.user, url="https://example.com/e")
+        with mock.patch("notes.jobs.run_job", side_effect=[RuntimeError("db down"), None]) as run, \
+                mock.patch("notes.jobs.connection"), self.assertLogs("notes.jobs", level="ERROR"):
+            run_worker(concurrency=1, poll_interval=0.01, once=True)
+        self.assertEqual(run.call_count, 2)
+
+        # Jobs left running by a dead worker are requeued until their attempts run out
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from .jobs import requeue_stale_jobs
+
+        long_ago = timezone.now() - timedelta(hours=1)
+        retry = ImportJob.objects.create(
+            owner=self.user, url="https://example.com/f", status="running", attempts=1, locked_at=long_ago,
+        )
+        spent = ImportJob.objects.create(
+            owner=self.user, url="https://example.com/g", status="running", attempts=3, locked_at=long_ago,
+        )
+        self.assertEqual(requeue_stale_jobs(), 1)
+        retry.refresh_from_db()
+        spent.refresh_from_db()
+        self.assertEqual((retry.status, spent.status, spent.locked_at), ("queued", "failed", None))
+
+    def test_import_url_quota(self):
+        self.client.login(username="apiuser", password="pw")
+        with override_settings(NOTES_IMPORT_MAX_ACTIVE_PER_USER=1):
+            first = self.client.post(
+                "/api/notes/import_url/", data={"url": "https://example.com/1"}, content_type="application/json"
+            )
+            second = self.client.post(
+                "/api/notes/import_url/", data={"url": "https://example.com/2"}, content_type="application/json"
+            )
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.status_code, 429)
+
+    def test_import_urls_batch_against_stub_server(self):
+        base = self.start_stub_server()
+        Note.objects.create(owner=self.user, title="Page", content="")
+        self.client.login(username="apiuser", password="pw")
+        urls = [f"{base}/one", f"{base}/two", f"{base}/missing", "ftp://nope", f"{base}/one"]
+        with override_settings(NOTES_IMPORT_PROCESS_WORKERS=0):
+            resp = self.client.post("/api/notes/import_urls/", data={"urls": urls}, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        data = resp.json()
+        self.assertEqual(data["created"], 2)
+        statuses = [r["status"] for r in data["results"]]
+        self.assertEqual(statuses, ["created", "created", "failed", "failed", "created"])
+        # Duplicate URLs are fetched once and share a result
+        self.assertEqual(data["results"][0], data["results"][4])
+        titles = {data["results"][0]["title"], data["results"][1]["title"]}
+        self.assertEqual(titles, {"Page (2)", "Page (3)"})
+        self.assertIn("/two", Note.objects.get(pk=data["results"][1]["id"]).content)
+        self.assertEqual(Note.objects.filter(owner=self.user).count(), 3)
+
+        resp = self.client.post("/api/notes/import_urls/", data={"urls": []}, content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+
+        # An unexpected error fails only its own URL
+        from unittest import mock
+
+        from . import importer
+
+        def build_content(title, final_url, *args):
+            if final_url.endswith("/four"):
+                raise RuntimeError("boom")
+            return build_content.real(title, final_url, *args)
+
+        build_content.real = importer.build_content
+        with override_settings(NOTES_IMPORT_PROCESS_WORKERS=0), \
+                mock.patch("notes.importer.build_content", side_effect=build_content), \
+                self.assertLogs("notes.importer", level="ERROR"):
+            resp = self.client.post(
+                "/api/notes/import_urls/", data={"urls": [f"{base}/three", f"{base}/four"]},
+                content_type="application/json",
+            )
+        results = resp.json()["results"]
+        self.assertEqual([r["status"] for r in results], ["created", "failed"])
+        self.assertEqual(results[1]["error"], "import failed")
+
+    def test_import_url_revalidates_fetch_cache(self):
+        from unittest import mock
+
+        from . import importer
+        from .models import FetchCache
+
+        base = self.start_stub_server()
+        self.client.login(username="apiuser", password="pw")
+        with override_settings(NOTES_IMPORT_ASYNC=False, NOTES_FETCH_CACHE_MAX_AGE=0), \
+                mock.patch("notes.importer.extract_article", wraps=importer.extract_article) as extract:
+            for url in (f"{base}/article#intro", f"{base}/article?utm_source=feed"):
+                resp = self.client.post("/api/notes/import_url/", data={"url": url}, content_type="application/json")
+                self.assertEqual(resp.status_code, 201)
+        # Both URLs normalize to one entry; the second import sent the ETag,
+        # got a 304 and reused the stored article without extracting again
+        self.assertEqual(StubPageHandler.requests, [("/article", None), ("/article?utm_source=feed", '"v1"')])
+        self.assertEqual(extract.call_count, 1)
+        self.assertEqual(FetchCache.objects.get().etag, '"v1"')
+        titles = sorted(Note.objects.filter(owner=self.user).values_list("title", flat=True))
+        self.assertEqual(titles, ["Page", "Page (2)"])
+
+        # Within the freshness window the network is skipped entirely
+        importer.import_url(self.user, f"{base}/article")
+        self.assertEqual(len(StubPageHandler.requests), 2)
+
+    def test_server_timing_and_metrics(self):
+        from .instrumentation import registry
+
+        registry.reset()
+        note = Note.objects.create(owner=self.user, title="Timed", content="# Hello")
+        self.client.login(username="apiuser", password="pw")
+        resp = self.client.get(f"/{note.pk}/")
+        self.assertEqual(resp.status_code, 200)
+        sections = {part.split(";")[0] for part in resp["Server-Timing"].split(", ")}
+        self.assertTrue({"db", "render", "template", "total"} <= sections)
+
+        resp = self.client.patch(
+            f"/api/notes/{note.pk}/", data={"content": "[[Elsewhere]]"}, content_type="application/json"
+        )
+        self.assertIn("links;dur=", resp["Server-Timing"])
+
+        metrics = self.client.get("/metrics").content.decode()
+        self.assertIn('notes_http_requests_total{view="notes:detail",method="GET",status="200"} 1', metrics)
+        self.assertIn('notes_section_calls_total{view="notes:detail",section="render"}', metrics)
+        self.assertIn('notes_http_request_duration_seconds_count{view="notes:api_notes_detail"} 1', metrics)
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.0.0.1").status_code, 403)
+
+    def test_title_index_etag_and_suggest(self):
+        import gzip
+        import json
+
+        self.client.login(username="apiuser", password="pw")
+        Note.objects.create(owner=self.user, title="Beta", content="")
+        alpha = Note.objects.create(owner=self.user, title="Alpha", content="")
+        resp = self.client.get("/api/notes/titles/")
+        self.assertEqual(resp.json()["titles"], ["Alpha", "Beta"])
+        etag = resp["ETag"]
+        self.assertEqual(self.client.get("/api/notes/titles/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        resp = self.client.get("/api/notes/titles/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(resp.content))["titles"], ["Alpha", "Beta"])
+
+        # Renames, creates and deletes all change the ETag; content edits do not
+        alpha.content = "edited"
+        with self.captureOnCommitCallbacks(execute=True):
+            alpha.save()
+        self.assertEqual(self.client.get("/api/notes/titles/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        alpha.title = "Alpine"
+        with self.captureOnCommitCallbacks(execute=True):
+            alpha.save()
+        resp = self.client.get("/api/notes/titles/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["titles"], ["Alpine", "Beta"])
+        with self.captureOnCommitCallbacks(execute=True):
+            alpha.delete()
+        self.assertEqual(self.client.get("/api/notes/titles/").json()["titles"], ["Beta"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Note.objects.create(owner=self.user, title="Bet", content="")
+            Note.objects.create(owner=self.user, title="Gamma", content="")
+        resp = self.client.get("/api/notes/titles/suggest/", {"q": "Be"})
+        self.assertEqual([r["title"] for r in resp.json()["results"]], ["Bet", "Beta"])
+        resp = self.client.get("/api/notes/titles/suggest/", {"q": "Be", "limit": 1})
+        self.assertEqual(len(resp.json()["results"]), 1)
+
+
+class AsyncNotesApiTests(TestCase):
+    def setUp(self):
+        from django.test import RequestFactory
+
+        self.user = User.objects.create_user(username="asyncuser", password="pw")
+        self.factory = RequestFactory()
+
+    def call(self, view_cls, method, path, data=None, headers=None, **kwargs):
+        import json
+        from asgiref.sync import async_to_sync
+
+        body = json.dumps(data) if data is not None else None
+        factory_method = getattr(self.factory, method)
+        if body is not None:
+            request = factory_method(path, data=body, content_type="application/json", headers=headers)
+        else:
+            request = factory_method(path, headers=headers)
+        request.user = self.user
+        return async_to_sync(view_cls.as_view())(request, **kwargs)
+
+    def test_async_crud_and_preview(self):
+        import json
+
+        from . import async_views
+
+        resp = self.call(async_views.NotesListCreate, "post", "/api/notes/", {"title": "A", "content": "[[B]]"})
+        self.assertEqual(resp.status_code, 201)
+        a_id = json.loads(resp.content)["id"]
+        self.call(async_views.NotesListCreate, "post", "/api/notes/", {"title": "B", "content": ""})
+
+        resp = self.call(async_views.NotesListCreate, "get", "/api/notes/?fields=title&limit=1")
+        body = json.loads(resp.content)
+        self.assertEqual(body["results"], [{"title": "B"}])
+        self.assertIsNotNone(body["next_cursor"])
+
+        resp = self.call(async_views.NotesDetail, "patch", f"/api/notes/{a_id}/", {"content": "[[B]] edited"}, pk=a_id)
+        self.assertEqual(json.loads(resp.content)["content"], "[[B]] edited")
+        self.assertTrue(Note.objects.get(pk=a_id).outbound_links.exists())
+
+        etag = self.call(async_views.NotesDetail, "get", f"/api/notes/{a_id}/", pk=a_id)["ETag"]
+        resp = self.call(async_views.NotesDetail, "get", f"/api/notes/{a_id}/", headers={"If-None-Match": etag}, pk=a_id)
+        self.assertEqual(resp.status_code, 304)
+
+        resp = self.call(async_views.NotesPreview, "post", "/api/notes/preview/", {"text": "**x**"})
+        self.assertIn("<strong>", json.loads(resp.content)["html"])
+
+        resp = self.call(async_views.NotesDetail, "delete", f"/api/notes/{a_id}/", {"version": 1}, pk=a_id)
+        self.assertEqual(resp.status_code, 409)
+        resp = self.call(async_views.NotesDetail, "delete", f"/api/notes/{a_id}/", pk=a_id)
+        self.assertEqual(resp.status_code, 204)
+        self.assertFalse(Note.objects.filter(pk=a_id).exists())
+
+    def test_async_import_url(self):
+        import json
+        from unittest import mock
+
+        from . import async_views
+
+        html = "<html><head><title>Async Page</title></head><body><p>Body</p></body></html>"
+
+        from .http import Page
+
+        async def fake_fetch(url, headers=None):
+            return Page(html, url)
+
+        with mock.patch("notes.importer.afetch_page", side_effect=fake_fetch):
+            resp = self.call(async_views.NotesImportUrl, "post", "/api/notes/import_url/", {"url": "https://example.com/x"})
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(json.loads(resp.content)["title"], "Async Page")
@@ -0,0 +1,279 @@
+"""Query-count guards: every view must issue a fixed number of queries no
+matter how many notes, links or backlinks the owner has.
+
+Each endpoint is measured against a small and a large corpus; the counts
+must match and stay within the endpoint's budget. On failure the message
+lists the SQL of both runs so the new query is easy to spot.
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .bulk import create_notes_bulk
+from .models import ImportJob, Note
+
+User = get_user_model()
+
+SMALL = 3
+LARGE = 30
+
+
+def format_queries(captured) -> str:
+    return "\n".join(f"  {i}. {q['sql']}" for i, q in enumerate(captured, 1))
+
+
+# Every update stores a revision; coalescing an autosave into the previous
+# one only swaps that insert for an update, so it is left out of the counts
+@override_settings(NOTES_REVISION_COALESCE_SECONDS=0)
+class QueryBudgetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="q", password="pw")
+        self.client.force_login(self.user)
+        self.hub = Note.objects.create(owner=self.user, title="Hub", content="# Hub\n\n[[Leaf 0]] [[Missing]]")
+        self.size = 0
+
+    def grow(self, total: int) -> None:
+        """Add linked notes until the owner has ``total`` leaves.
+
+        Every leaf links to the hub and its neighbour, so the hub's backlinks,
+        the graph and the search index all grow with the corpus.
+        """
+        items = [
+            (f"Leaf {i}", f"Leaf {i} mentions hub. [[Hub]] [[Leaf {i + 1}]]\n\n" + "text " * 50)
+            for i in range(self.size, total)
+        ]
+        create_notes_bulk(self.user, items)
+        self.size = total
+        # Each measurement starts cold so cached results cannot hide queries
+        cache.clear()
+
+    def capture(self, request):
+        with CaptureQueriesContext(connection) as ctx:
+            response = request()
+            if getattr(response, "streaming", False):
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, getattr(response, "content", b"")[:200])
+        return ctx.captured_queries
+
+    def assertConstantQueries(self, budget: int, request, setup=None):
+        """``request()`` must run ``<= budget`` queries for both corpus sizes.
+
+        ``setup`` runs unmeasured before each request, for requests that need
+        the same starting state every time.
+        """
+        self.grow(SMALL)
+        if setup:
+            setup()
+        small = self.capture(request)
+        self.grow(LARGE)
+        if setup:
+            setup()
+        large = self.capture(request)
+        report = (
+            f"\n--- {SMALL} notes: {len(small)} queries\n{format_queries(small)}"
+            f"\n--- {LARGE} notes: {len(large)} queries\n{format_queries(large)}"
+        )
+        self.assertEqual(len(small), len(large), "query count grows with the corpus" + report)
+        self.assertLessEqual(len(large), budget, f"query budget of {budget} exceeded" + report)
+
+
+class PageQueryTests(QueryBudgetTestCase):
+    def test_list(self):
+        self.assertConstantQueries(3, lambda: self.client.get("/"))
+
+    def test_list_search(self):
+        self.assertConstantQueries(4, lambda: self.client.get("/", {"q": "hub"}))
+
+    def test_detail(self):
+        self.assertConstantQueries(6, lambda: self.client.get(f"/{self.hub.pk}/"))
+
+    def test_detail_not_modified(self):
+        self.grow(LARGE)
+        etag = self.client.get(f"/{self.hub.pk}/")["ETag"]
+        queries = self.capture(lambda: self.client.get(f"/{self.hub.pk}/", HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(len(queries), 4, format_queries(queries))
+
+    def test_edit_form(self):
+        self.assertConstantQueries(3, lambda: self.client.get(f"/{self.hub.pk}/edit/"))
+
+    def test_create_form(self):
+        self.assertConstantQueries(2, lambda: self.client.get("/create/"))
+
+
+class ApiQueryTests(QueryBudgetTestCase):
+    def post_json(self, path, data):
+        return self.client.post(path, json.dumps(data), content_type="application/json")
+
+    def test_list(self):
+        self.assertConstantQueries(4, lambda: self.client.get("/api/notes/", {"limit": 10}))
+
+    def test_not_modified(self):
+        self.grow(LARGE)
+        # The collection is revalidated from the change sequence alone
+        etag = self.client.get("/api/notes/", {"limit": 10})["ETag"]
+        queries = self.capture(lambda: self.client.get("/api/notes/", {"limit": 10}, HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(len(queries), 3, format_queries(queries))
+        # A note only needs its timestamp
+        etag = self.client.get(f"/api/notes/{self.hub.pk}/")["ETag"]
+        queries = self.capture(lambda: self.client.get(f"/api/notes/{self.hub.pk}/", HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(len(queries), 3, format_queries(queries))
+
+    def test_list_with_fields(self):
+        self.assertConstantQueries(4, lambda: self.client.get("/api/notes/", {"fields": "id,title,content"}))
+
+    def test_list_search(self):
+        self.assertConstantQueries(5, lambda: self.client.get("/api/notes/", {"q": "hub"}))
+
+    def test_changes(self):
+        self.assertConstantQueries(4, lambda: self.client.get("/api/notes/changes/", {"since": 1, "limit": 20}))
+
+    def test_search(self):
+        self.assertConstantQueries(3, lambda: self.client.get("/api/notes/search/", {"q": "mentions"}))
+
+    def test_detail(self):
+        self.assertConstantQueries(3, lambda: self.client.get(f"/api/notes/{self.hub.pk}/"))
+
+    def test_create(self):
+        counter = iter(range(100))
+        # Session, user, INSERT; link title lookup and link insert (a new note has
+        # no rows to reconcile); sequence bump and change row; pending-link
+        # lookup; search index
+        self.assertConstantQueries(
+            9, lambda: self.post_json("/api/notes/", {"title": f"New {next(counter)}", "content": "[[Hub]] [[Leaf 1]]"})
+        )
+
+    def test_update(self):
+        def reset():
+            hub = Note.objects.get(pk=self.hub.pk)
+            hub.content = "[[Leaf 0]] [[Missing]]"
+            hub.save()
+
+        # Swaps one resolved and one dangling link. Session, user, load; locked
+        # read of the stored state (revision base and version) and UPDATE; link
+        # title lookup, then read/delete/insert for links and for dangling
+        # links; newest revision and revision insert; sequence bump and change
+        # row; search index
+        self.assertConstantQueries(
+            17, lambda: self.client.patch(
+                f"/api/notes/{self.hub.pk}/",
+                json.dumps({"content": "[[Leaf 1]] [[Missing too]]"}),
+                content_type="application/json",
+            ),
+            setup=reset,
+        )
+
+    def test_versioned_patch(self):
+        def reset():
+            hub = Note.objects.get(pk=self.hub.pk)
+            hub.content = "[[Leaf 0]] [[Missing]]"
+            hub.save()
+            self.version = hub.version
+
+        # Same link swap as test_update, sent as a splice against a known version.
+        # The version check reuses the locked read, so only the SAVEPOINT and
+        # RELEASE of its atomic block are added (inside the test transaction)
+        self.assertConstantQueries(
+            19, lambda: self.client.patch(
+                f"/api/notes/{self.hub.pk}/",
+                json.dumps({"version": self.version, "patch": [{"offset": 7, "delete": 15, "insert": "1]] [[Missing too]]"}]}),
+                content_type="application/json",
+            ),
+            setup=reset,
+        )
+
+    def test_delete(self):
+        def create_target():
+            self.target = Note.objects.create(owner=self.user, title="Target", content="[[Hub]]")
+            hub = Note.objects.get(pk=self.hub.pk)
+            hub.content = "[[Target]] [[Leaf 0]]"
+            hub.save()
+
+        # Session, user, load; inbound link sources; links, dangling links,
+        # revisions, import job and note row; sequence bump and change row;
+        # re-pend the hub's link (existence check and insert); search index
+        self.assertConstantQueries(
+            14, lambda: self.client.delete(f"/api/notes/{self.target.pk}/"), setup=create_target
+        )
+
+    def test_import(self):
+        counter = iter(range(100))
+
+        def ndjson():
+            n = next(counter)
+            lines = [json.dumps({"title": f"Batch {n}-{i}", "content": "[[Hub]] [[Leaf 2]]"}) for i in range(5)]
+            return self.client.post("/api/notes/import/", "\n".join(lines), content_type="application/x-ndjson")
+
+        # Session, user, SAVEPOINT/RELEASE; taken titles; one INSERT, one index
+        # statement; sequence bump and change rows; link title lookup and link
+        # insert; pending-link lookup
+        self.assertConstantQueries(12, ndjson)
+
+    def test_batch(self):
+        counter = iter(range(100))
+
+        def batch():
+            n = next(counter)
+            leaf = Note.objects.create(owner=self.user, title=f"Doomed {n}", content="[[Hub]]")
+            ops = [{"op": "create", "title": f"Batch {n}-{i}", "content": "[[Hub]] [[Leaf 2]]"} for i in range(5)]
+            ops += [
+                {"op": "update", "id": self.hub.pk, "title": f"Hub {n}", "content": f"[[Leaf 1]] [[Batch {n}-0]]"},
+                {"op": "delete", "id": leaf.pk},
+            ]
+            return lambda: self.post_json("/api/notes/batch/", {"operations": ops})
+
+        requests = []
+
+        def setup():
+            hub = Note.objects.get(pk=self.hub.pk)
+            hub.title, hub.content = "Hub", "[[Leaf 0]] [[Missing]]"
+            hub.save()
+            requests.append(batch())
+
+        # Deletes a linked note, renames and relinks the hub, creates five linked notes:
+        # session, user, load, owner titles (4); SAVEPOINT/RELEASE (2); version
+        # lock (1); delete with its inbound links, cascades and index (8); rename
+        # re-pends inbound links (4); UPDATE, index, revision lookup and insert (4);
+        # INSERT and index (2); sequence bump and change rows (2); link sync (7);
+        # pending-link lookup (1)
+        self.assertConstantQueries(35, lambda: requests[-1](), setup=setup)
+
+    def test_revisions(self):
+        hub = Note.objects.get(pk=self.hub.pk)
+        for n in range(3):
+            hub.content += f"\nedit {n}"
+            hub.save()
+        url = f"/api/notes/{self.hub.pk}/revisions/"
+        self.assertConstantQueries(4, lambda: self.client.get(url))
+        self.assertConstantQueries(4, lambda: self.client.get(f"{url}1/"))
+        self.assertConstantQueries(5, lambda: self.client.get(f"{url}diff/", {"from": 1, "to": 2}))
+
+    def test_preview(self):
+        text = "[[Hub]] and [[Leaf 1]]\n\nsecond block [[Nowhere]]"
+        self.assertConstantQueries(3, lambda: self.post_json("/api/notes/preview/", {"text": text}))
+        self.assertConstantQueries(3, lambda: self.post_json("/api/notes/preview/", {"text": text, "mode": "blocks"}))
+
+    def test_export(self):
+        self.assertConstantQueries(4, lambda: self.client.get("/api/notes/export/", {"all": 1, "links": 1}))
+
+    def test_graph(self):
+        self.assertConstantQueries(4, lambda: self.client.get("/api/graph/"))
+        self.assertConstantQueries(4, lambda: self.client.get("/api/graph/", {"note": self.hub.pk, "hops": 2}))
+
+    def test_titles(self):
+        self.assertConstantQueries(3, lambda: self.client.get("/api/notes/titles/"))
+        # Revalidation is answered from the version counter alone
+        etag = self.client.get("/api/notes/titles/")["ETag"]
+        queries = self.capture(lambda: self.client.get("/api/notes/titles/", HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(len(queries), 2, format_queries(queries))
+
+    def test_title_suggest(self):
+        self.assertConstantQueries(3, lambda: self.client.get("/api/notes/titles/suggest/", {"q": "Leaf"}))
+
+    def test_import_job_status(self):
+        job = ImportJob.objects.create(owner=self.user, url="https://example.com/")
+        self.assertConstantQueries(3, lambda: self.client.get(f"/api/jobs/{job.pk}/"))
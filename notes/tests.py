@@ -1,8 +1,9 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
 from .models import Note, NoteLink
-from .utils import extract_wikilinks
+from .utils import extract_wikilinks, render_markdown_safe
 
 User = get_user_model()
 
@@ -23,3 +24,423 @@ class WikiLinkTests(TestCase):
         self.assertTrue(NoteLink.objects.filter(from_note=b, to_note=a).exists())
         html = a.render_content()
         self.assertIn(f"/{b.pk}/", html)
+
+    def test_render_cache_follows_link_targets(self):
+        from unittest import mock
+
+        cache.clear()
+        a = Note.objects.create(owner=self.user, title="Alpha", content="See [[Gamma]]")
+        with mock.patch("notes.utils.render_markdown_safe", wraps=render_markdown_safe) as rendered:
+            first = a.render_content()
+            a.render_content()
+            self.assertEqual(rendered.call_count, 1)
+            self.assertNotIn("<a ", first)
+
+            # Creating the target changes the resolved set -> fresh render
+            g = Note.objects.create(owner=self.user, title="Gamma", content="")
+            self.assertIn(f"/{g.pk}/", a.render_content())
+            self.assertEqual(rendered.call_count, 2)
+
+            # Renaming the target unlinks it again
+            g.title = "Delta"
+            g.save()
+            self.assertNotIn(f"/{g.pk}/", a.render_content())
+
+    def test_detail_page_links_self_and_survives_stale_links(self):
+        me = Note.objects.create(owner=self.user, title="Me", content="see [[Me]] and [[Other]]")
+        other = Note.objects.create(owner=self.user, title="Other", content="")
+        self.client.force_login(self.user)
+        html = self.client.get(f"/{me.pk}/").context["rendered"]
+        self.assertIn(f"/{me.pk}/", html)
+        self.assertIn(f"/{other.pk}/", html)
+        # Link rows lost (e.g. a failed rebuild): titles are looked up instead
+        NoteLink.objects.filter(from_note=me).delete()
+        Note.objects.filter(pk=me.pk).update(links_hash="")
+        self.assertIn(f"/{other.pk}/", self.client.get(f"/{me.pk}/").context["rendered"])
+
+
+class RenderMemoTests(TestCase):
+    def test_lru_bounds_and_counters(self):
+        from .utils import LRUCache
+
+        lru = LRUCache(max_entries=2, max_bytes=10)
+        lru.set("a", "1234")
+        lru.set("b", "5678")
+        self.assertEqual(lru.get("a"), "1234")  # a is now most recent
+        lru.set("c", "90")  # evicts b (entry limit)
+        self.assertIsNone(lru.get("b"))
+        lru.set("d", "123456")  # evicts a (byte limit)
+        self.assertIsNone(lru.get("a"))
+        lru.set("huge", "x" * 11)  # larger than max_bytes, never stored
+        self.assertIsNone(lru.get("huge"))
+        info = lru.info()
+        self.assertEqual((info["hits"], info["misses"]), (1, 3))
+        self.assertLessEqual(info["bytes"], 10)
+
+    def test_render_markdown_safe_memoizes(self):
+        from .utils import get_render_lru
+
+        get_render_lru().clear()
+        first = render_markdown_safe("**memo** text")
+        second = render_markdown_safe("**memo** text")
+        self.assertEqual(first, second)
+        self.assertIn("<strong>", first)
+        self.assertEqual(get_render_lru().info()["hits"], 1)
+
+
+class LinkSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="u2", password="x")
+        self.targets = [Note.objects.create(owner=self.user, title=f"T{i}") for i in range(30)]
+
+    def test_links_rebuilt_in_constant_queries_and_skipped_when_unchanged(self):
+        body = " ".join(f"[[T{i}]]" for i in range(30))
+        note = Note.objects.create(owner=self.user, title="Hub", content=body)
+        self.assertEqual(note.outbound_links.count(), 30)
+
+        # Same link set: locked read and UPDATE, revision lookup and insert,
+        # sequence bump and change row, search index
+        note.content = body + " more text"
+        with self.assertNumQueries(7):
+            note.save()
+
+        # Changed link set: title lookup, read links, delete, insert
+        note.content = " ".join(f"[[T{i}]]" for i in range(10, 40))
+        note.save()
+        self.assertEqual(
+            set(note.outbound_links.values_list("to_note__title", flat=True)),
+            {f"T{i}" for i in range(10, 30)},
+        )
+
+    def test_rebuild_can_be_deferred_to_commit(self):
+        with override_settings(NOTES_DEFER_LINK_REBUILD=True):
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                note = Note.objects.create(owner=self.user, title="Later", content="[[T1]]")
+            self.assertFalse(note.outbound_links.exists())
+            for cb in callbacks:
+                cb()
+        self.assertTrue(note.outbound_links.filter(to_note=self.targets[1]).exists())
+
+    def test_dangling_links_follow_create_rename_delete(self):
+        from .models import UnresolvedLink
+
+        a = Note.objects.create(owner=self.user, title="A", content="[[Later]]")
+        self.assertTrue(UnresolvedLink.objects.filter(source=a, title="Later").exists())
+
+        later = Note.objects.create(owner=self.user, title="Later")
+        self.assertTrue(NoteLink.objects.filter(from_note=a, to_note=later).exists())
+        self.assertFalse(UnresolvedLink.objects.filter(source=a).exists())
+
+        # Renaming the target away leaves the reference pending again
+        later = Note.objects.get(pk=later.pk)
+        later.title = "Sooner"
+        later.save()
+        self.assertFalse(NoteLink.objects.filter(from_note=a).exists())
+        self.assertTrue(UnresolvedLink.objects.filter(source=a, title="Later").exists())
+
+        # ...and renaming something else into that title resolves it
+        other = Note.objects.create(owner=self.user, title="Other")
+        other.title = "Later"
+        other.save()
+        self.assertTrue(NoteLink.objects.filter(from_note=a, to_note=other).exists())
+
+        other.delete()
+        self.assertTrue(UnresolvedLink.objects.filter(source=a, title="Later").exists())
+
+
+class SummaryServiceTests(TestCase):
+    class SlowSummarizer:
+        name = "slow"
+
+        def __init__(self):
+            import threading
+
+            self.calls = 0
+            self.release = threading.Event()
+
+        def summarize(self, text):
+            self.calls += 1
+            self.release.wait(5)
+            return text.upper()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_results_are_cached_by_content(self):
+        from .summaries import ExtractiveSummarizer, SummaryService
+
+        service = SummaryService(ExtractiveSummarizer(), cache=cache)
+        text = "\n".join(f"Sentence {i} talks about caching summaries." for i in range(10))
+        first = service.summarize(text)
+        self.assertEqual(len(first.split("\n")), 5)
+        self.assertEqual(service.summarize(text), first)
+        stats = service.stats()
+        self.assertEqual((stats["requests"], stats["cache_hits"], stats["backend_calls"]), (2, 1, 1))
+
+    def test_identical_concurrent_requests_are_coalesced(self):
+        import threading
+        import time
+        from .summaries import SummaryService
+
+        backend = self.SlowSummarizer()
+        service = SummaryService(backend)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(service.summarize("same text"))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        while service.stats().get("coalesced", 0) < 3:
+            time.sleep(0.01)
+        backend.release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ["SAME TEXT"] * 4)
+        self.assertEqual(backend.calls, 1)
+
+    def test_backend_failure_uses_uncached_fallback(self):
+        from .summaries import BaseSummarizer, NaiveSummarizer, SummaryService
+
+        class Broken(BaseSummarizer):
+            name = "broken"
+
+            def summarize(self, text):
+                raise RuntimeError("down")
+
+        service = SummaryService(Broken(), fallback=NaiveSummarizer(), cache=cache)
+        self.assertEqual(service.summarize("a\nb\nc\nd"), "a\nb\nc")
+        self.assertIsNone(cache.get(service.cache_key("a\nb\nc\nd")))
+        self.assertEqual(service.stats()["fallbacks"], 1)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_benchmark_writes_results_and_rolls_back_corpus(self):
+        import json
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.json")
+            call_command(
+                "benchmark", users=1, notes=20, iterations=2, warmup=0, import_size=3,
+                output=path, stdout=StringIO(),
+            )
+            with open(path, encoding="utf-8") as f:
+                report = json.load(f)
+        self.assertEqual(report["corpus"]["notes_per_user"], 20)
+        for name in ("list", "search", "detail", "preview", "export", "import"):
+            self.assertEqual(report["results"][name]["errors"], 0, name)
+            self.assertGreater(report["results"][name]["queries_max"], 0)
+        self.assertFalse(Note.objects.exists())
+
+
+class TitleIndexTests(TestCase):
+    def setUp(self):
+        from .titles import clear_title_indexes
+
+        cache.clear()
+        clear_title_indexes()
+        self.user = User.objects.create_user(username="t", password="pw")
+        for title in ("Project Plan", "project notes", "Weekly Planning", "Prague trip", "Other"):
+            Note.objects.create(owner=self.user, title=title)
+
+    def titles(self, query, **kwargs):
+        from .titles import suggest_titles
+
+        return [(r["title"], r["match"]) for r in suggest_titles(self.user.pk, query, **kwargs)]
+
+    def test_prefix_word_and_fuzzy_matches(self):
+        # Case-insensitive, alphabetical within a match kind
+        self.assertEqual(self.titles("proj"), [("project notes", "prefix"), ("Project Plan", "prefix")])
+        self.assertEqual(self.titles("plan", fuzzy=False), [("Project Plan", "word"), ("Weekly Planning", "word")])
+        self.assertEqual(self.titles("prj"), [("project notes", "fuzzy"), ("Project Plan", "fuzzy")])
+        self.assertEqual(self.titles("p", limit=1), [("Prague trip", "prefix")])
+
+    def test_signals_update_the_index_in_place(self):
+        self.titles("x")  # build
+        with self.captureOnCommitCallbacks(execute=True):
+            note = Note.objects.create(owner=self.user, title="Zebra facts")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles("zeb"), [("Zebra facts", "prefix")])
+        with self.captureOnCommitCallbacks(execute=True):
+            note.title = "Yak facts"
+            note.save()
+            note.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles("facts"), [])
+
+    def test_rolled_back_save_leaves_no_title(self):
+        from django.db import IntegrityError, transaction
+
+        self.titles("x")  # build
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Note.objects.create(owner=self.user, title="Phantom")
+                    Note.objects.create(owner=self.user, title="Phantom")
+            except IntegrityError:
+                pass
+        self.assertEqual(self.titles("phan"), [])
+
+    def test_index_rebuilds_when_another_process_changes_titles(self):
+        from .versions import TITLES, bump_version
+
+        self.titles("x")
+        # Simulate a write elsewhere: the row changes and the counter moves
+        Note.objects.filter(title="Other").update(title="Orchard")
+        bump_version(TITLES, self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.titles("orch"), [("Orchard", "prefix")])
+
+
+class AsyncHttpClientTests(TestCase):
+    def test_client_is_closed_and_forgotten_when_its_loop_shuts_down(self):
+        import asyncio
+        import sys
+        import types
+        from unittest import mock
+
+        from . import http
+
+        class FakeClient:
+            def __init__(self, **kwargs):
+                self.is_closed = False
+
+            async def aclose(self):
+                self.is_closed = True
+
+        fake_httpx = types.SimpleNamespace(AsyncClient=FakeClient, Limits=lambda **kwargs: None)
+
+        async def fetch_twice():
+            first = http.get_async_client()
+            http._host_semaphore("https://example.com/a")
+            self.assertIs(http.get_async_client(), first)
+            return first
+
+        with mock.patch.dict(sys.modules, {"httpx": fake_httpx}):
+            clients = [asyncio.run(fetch_twice()) for _ in range(3)]
+        self.assertEqual(len({id(c) for c in clients}), 3)
+        self.assertTrue(all(c.is_closed for c in clients))
+        self.assertEqual((http._async_clients, http._host_limits), ({}, {}))
+
+
+class TextPatchTests(TestCase):
+    def test_apply_splices_in_code_points(self):
+        from .textpatch import apply_patch
+
+        base = "héllo 🙂 world"
+        ops = [
+            {"offset": 0, "delete": 5, "insert": "hi"},
+            {"offset": 6, "delete": 1, "insert": "🎉🎉"},
+            {"offset": 13, "insert": "!"},
+        ]
+        self.assertEqual(apply_patch(base, ops), "hi 🎉🎉 world!")
+        self.assertEqual(apply_patch(base, []), base)
+        for bad in ({"offset": 1}, [{"offset": 5}, {"offset": 2}], [{"offset": 10, "delete": 9}],
+                    [{"offset": "1"}], [{"offset": 0, "insert": 3}], [{"offset": True}]):
+            with self.assertRaises(ValueError):
+                apply_patch(base, bad)
+
+    def test_save_if_version_is_compare_and_set(self):
+        user = User.objects.create_user(username="cas", password="x")
+        note = Note.objects.create(owner=user, title="CAS", content="v1")
+        self.assertEqual(note.version, 1)
+        stale = Note.objects.get(pk=note.pk)
+
+        note.content = "v2"
+        self.assertTrue(note.save_if_version(1))
+        self.assertEqual(note.version, 2)
+        stale.content = "lost"
+        self.assertFalse(stale.save_if_version(1))
+        note.refresh_from_db()
+        self.assertEqual((note.content, note.version), ("v2", 2))
+        # Plain saves advance the version too
+        note.save(update_fields=["content"])
+        self.assertEqual(Note.objects.get(pk=note.pk).version, 3)
+
+
+@override_settings(NOTES_REVISION_COALESCE_SECONDS=0, NOTES_REVISION_SNAPSHOT_EVERY=3)
+class RevisionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="rev", password="x")
+        self.lines = [f"line {i} " + "lorem ipsum " * 5 + "\n" for i in range(200)]
+
+    def text(self, n):
+        lines = list(self.lines)
+        lines[n * 7 % 200] = f"edit {n}\n"
+        return "".join(lines)
+
+    def test_every_version_is_reconstructed_from_deltas_and_snapshots(self):
+        from .models import NoteRevision
+        from .revisions import get_revision
+
+        note = Note.objects.create(owner=self.user, title="Doc", content=self.text(0))
+        for n in range(1, 10):
+            note.content = self.text(n)
+            note.title = f"Doc {n // 4}"
+            note.save()
+        note.save()  # unchanged: no revision
+        revisions = list(note.revisions.all())
+        self.assertEqual([r.version for r in revisions], list(range(9, 0, -1)))
+        self.assertEqual({r.kind for r in revisions}, {NoteRevision.SNAPSHOT, NoteRevision.DELTA})
+        deltas = [r for r in revisions if r.kind == NoteRevision.DELTA]
+        self.assertLess(max(len(r.data) for r in deltas) * 20, len(self.text(0)))
+        for n in range(9):
+            revision, text = get_revision(note, n + 1)
+            self.assertEqual((text, revision.title), (self.text(n), f"Doc {n // 4}" if n else "Doc"))
+        self.assertIsNone(get_revision(note, 11))
+
+        # A stale copy overwrites the newer state, which is kept rather than lost
+        stale = Note.objects.get(pk=note.pk)
+        note.content = "newer"
+        note.save()
+        stale.content = "stale"
+        stale.save()
+        self.assertEqual((stale.version, get_revision(note, 12)[1]), (13, "newer"))
+
+    def test_autosaves_within_the_window_are_coalesced(self):
+        from .revisions import get_revision
+
+        note = Note.objects.create(owner=self.user, title="Doc", content=self.text(0))
+        with self.settings(NOTES_REVISION_COALESCE_SECONDS=60):
+            for n in range(1, 5):
+                note.content = self.text(n)
+                note.save()
+        self.assertEqual(list(note.revisions.values_list("version", flat=True)), [1])
+        self.assertEqual(get_revision(note, 1)[1], self.text(0))
+
+    def test_compaction_thins_old_history(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from .revisions import compact_note_revisions, get_revision
+
+        note = Note.objects.create(owner=self.user, title="Doc", content=self.text(0))
+        for n in range(1, 13):
+            note.content = self.text(n)
+            note.save()
+        # Versions 1-8 are two per day, 10-40 days old; 9-12 are recent
+        now = timezone.now()
+        for version in range(1, 9):
+            note.revisions.filter(version=version).update(created_at=now - timedelta(days=40 - (version - 1) // 2 * 10))
+        # Compaction re-reads the head, so a copy loaded before a later save is fine
+        stale = Note.objects.get(pk=note.pk)
+        note.content = self.text(13)
+        note.save()
+        with self.settings(NOTES_REVISION_MAX_AGE_DAYS=35):
+            self.assertEqual(compact_note_revisions(stale), 5)
+        self.assertEqual(list(note.revisions.values_list("version", flat=True)), [13, 12, 11, 10, 9, 8, 6, 4])
+        for version in (13, 12, 9, 8, 4):
+            self.assertEqual(get_revision(note, version)[1], self.text(version - 1))
+        self.assertEqual(compact_note_revisions(note), 0)
+
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        out = StringIO()
+        note.revisions.filter(version=4).update(created_at=now - timedelta(days=400))
+        call_command("compact_revisions", stdout=out)
+        self.assertIn("Removed 1 revisions from 1 notes", out.getvalue())
+        self.assertEqual(get_revision(note, 6)[1], self.text(5))
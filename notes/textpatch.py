@@ -0,0 +1,39 @@
+"""Splice patches for note content.
+
+A patch is a list of ``{"offset": int, "delete": int, "insert": str}``
+operations against the base text the client edited. Offsets count Unicode
+code points in that base text, and operations must be in ascending order
+and must not overlap. That is what a diff of the base against the edited
+text produces, and an autosave usually needs a single operation. Callers
+must make sure the base is the stored content (see the ``If-Match`` checks
+in the views): the format carries no context to detect a wrong base.
+"""
+
+MAX_OPERATIONS = 1000
+
+
+def apply_patch(text: str, operations) -> str:
+    """Apply ``operations`` to ``text``; raises ValueError if they are malformed."""
+    if not isinstance(operations, list):
+        raise ValueError("patch must be a list of operations")
+    if len(operations) > MAX_OPERATIONS:
+        raise ValueError(f"at most {MAX_OPERATIONS} patch operations")
+    pieces = []
+    pos = 0
+    for i, op in enumerate(operations):
+        if not isinstance(op, dict):
+            raise ValueError(f"patch operation {i} must be an object")
+        offset, delete, insert = op.get("offset"), op.get("delete", 0), op.get("insert", "")
+        if not _is_int(offset) or not _is_int(delete) or not isinstance(insert, str):
+            raise ValueError(f"patch operation {i} needs integer offset/delete and string insert")
+        if offset < pos or delete < 0 or offset + delete > len(text):
+            raise ValueError(f"patch operation {i} is out of order or out of range")
+        pieces.append(text[pos:offset])
+        pieces.append(insert)
+        pos = offset + delete
+    pieces.append(text[pos:])
+    return "".join(pieces)
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
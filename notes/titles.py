@@ -0,0 +1,241 @@
+"""Per-owner title index for client-side wikilink checks and autocomplete.
+
+``title_index`` serves every title of an owner as one JSON document, cached
+under the owner's ``TITLES`` version together with a pre-gzipped copy, so
+the endpoint can answer ``If-None-Match`` revalidations from the version
+counter alone and never re-compresses the same body.
+
+``suggest_titles`` answers autocomplete queries from an in-process
+``TitleIndex`` per owner: sorted arrays searched with ``bisect``, built
+lazily from the database and updated in place by the note signals. An index
+is only trusted while its version matches the owner's ``TITLES`` counter, so
+changes made by other processes trigger a rebuild on the next lookup.
+"""
+import bisect
+import gzip
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+
+from django.core.cache import cache
+
+from .models import Note
+from .versions import TITLES, get_version
+
+TITLE_INDEX_TIMEOUT = 24 * 3600
+DEFAULT_SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+DEFAULT_MAX_INDEXES = 256
+FUZZY_MIN_LENGTH = 2
+# Ranking stops after this many fuzzy hits so broad queries stay cheap
+FUZZY_MAX_CANDIDATES = 200
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def title_etag(version: int) -> str:
+    return f'"titles-{version}"'
+
+
+def title_index(owner_id) -> dict:
+    """Return ``{"version", "etag", "body", "gzip"}`` for one owner's titles."""
+    version = get_version(TITLES, owner_id)
+    key = f"notes:titles:{owner_id}:{version}"
+    index = cache.get(key)
+    if index is None:
+        titles = list(Note.objects.filter(owner_id=owner_id).order_by("title").values_list("title", flat=True))
+        body = json.dumps(
+            {"version": version, "count": len(titles), "titles": titles},
+            ensure_ascii=False, separators=(",", ":"),
+        ).encode("utf-8")
+        index = {
+            "version": version,
+            "etag": title_etag(version),
+            "body": body,
+            "gzip": gzip.compress(body, compresslevel=6, mtime=0),
+        }
+        cache.set(key, index, TITLE_INDEX_TIMEOUT)
+    return index
+
+
+def fold(title: str) -> str:
+    return title.casefold()
+
+
+def title_words(folded: str) -> set[str]:
+    # Word starts after the first one; the first word is covered by the title prefix
+    return set(WORD_RE.findall(folded)[1:])
+
+
+class TitleIndex:
+    """Sorted title and word arrays for one owner.
+
+    ``by_title`` holds ``(folded title, id)`` and ``by_word`` holds
+    ``(folded word, id)`` for every later word of each title, so prefix and
+    word-prefix lookups are a bisect plus a short scan. Fuzzy matching
+    (characters in order, gaps allowed) is a linear scan used only to top up
+    results.
+    """
+
+    def __init__(self, rows, version: Optional[int] = None):
+        self.version = version
+        self.lock = threading.Lock()
+        self.titles: dict[int, str] = {}
+        self.by_title: list[tuple[str, int]] = []
+        self.by_word: list[tuple[str, int]] = []
+        for pk, title in rows:
+            self.titles[pk] = title
+            folded = fold(title)
+            self.by_title.append((folded, pk))
+            self.by_word.extend((w, pk) for w in title_words(folded))
+        self.by_title.sort()
+        self.by_word.sort()
+        # Joined titles for fuzzy matching, rebuilt lazily after changes
+        self._blob: Optional[str] = None
+        self._offsets: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def put(self, pk: int, title: str) -> None:
+        with self.lock:
+            self._remove(pk)
+            self._blob = None
+            self.titles[pk] = title
+            folded = fold(title)
+            bisect.insort(self.by_title, (folded, pk))
+            for w in title_words(folded):
+                bisect.insort(self.by_word, (w, pk))
+
+    def remove(self, pk: int) -> None:
+        with self.lock:
+            self._remove(pk)
+
+    def _remove(self, pk: int) -> None:
+        self._blob = None
+        title = self.titles.pop(pk, None)
+        if title is None:
+            return
+        folded = fold(title)
+        _discard(self.by_title, (folded, pk))
+        for w in title_words(folded):
+            _discard(self.by_word, (w, pk))
+
+    def suggest(self, query: str, limit: int = DEFAULT_SUGGEST_LIMIT, fuzzy: bool = True) -> list[dict]:
+        """Best ``limit`` matches: title prefix, then word prefix, then fuzzy."""
+        q = fold(query.strip())
+        if not q:
+            return []
+        results: list[dict] = []
+        seen: set[int] = set()
+
+        def take(pk: int, match: str) -> bool:
+            if pk not in seen:
+                seen.add(pk)
+                results.append({"id": pk, "title": self.titles[pk], "match": match})
+            return len(results) >= limit
+
+        with self.lock:
+            for array, match in ((self.by_title, "prefix"), (self.by_word, "word")):
+                i = bisect.bisect_left(array, (q,))
+                while i < len(array) and array[i][0].startswith(q):
+                    if take(array[i][1], match):
+                        return results
+                    i += 1
+            if fuzzy and len(q) >= FUZZY_MIN_LENGTH and "\n" not in q:
+                for pk in self._fuzzy(q, limit - len(results), seen):
+                    take(pk, "fuzzy")
+        return results
+
+    def _fuzzy(self, q: str, limit: int, exclude: set) -> list[int]:
+        # One regex pass over all titles joined by newlines instead of a
+        # Python-level loop; gaps may not cross a newline
+        if self._blob is None:
+            self._offsets = []
+            pos = 0
+            for folded, _ in self.by_title:
+                self._offsets.append(pos)
+                pos += len(folded) + 1
+            self._blob = "\n".join(folded for folded, _ in self.by_title)
+        pattern = re.compile("[^\n]*?".join(map(re.escape, q)))
+        scored = {}
+        for m in pattern.finditer(self._blob):
+            i = bisect.bisect_right(self._offsets, m.start()) - 1
+            pk = self.by_title[i][1]
+            if pk in exclude or pk in scored:
+                continue
+            # Tighter and earlier matches first
+            scored[pk] = (m.end() - m.start(), m.start() - self._offsets[i], self.by_title[i][0])
+            if len(scored) >= FUZZY_MAX_CANDIDATES:
+                break
+        return sorted(scored, key=scored.get)[:limit]
+
+
+def _discard(array: list, item) -> None:
+    i = bisect.bisect_left(array, item)
+    if i < len(array) and array[i] == item:
+        del array[i]
+
+
+_indexes: "OrderedDict[int, TitleIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _max_indexes() -> int:
+    return getattr(settings, "NOTES_TITLE_INDEX_OWNERS", DEFAULT_MAX_INDEXES)
+
+
+def get_title_index(owner_id) -> TitleIndex:
+    """The owner's index, rebuilt when another process changed their titles."""
+    version = get_version(TITLES, owner_id)
+    with _indexes_lock:
+        index = _indexes.get(owner_id)
+        if index is not None and index.version == version:
+            _indexes.move_to_end(owner_id)
+            return index
+    rows = Note.objects.filter(owner_id=owner_id).values_list("id", "title")
+    index = TitleIndex(rows.iterator(), version)
+    with _indexes_lock:
+        _indexes[owner_id] = index
+        _indexes.move_to_end(owner_id)
+        while len(_indexes) > _max_indexes():
+            _indexes.popitem(last=False)
+    return index
+
+
+def _apply(owner_id, version: Optional[int], change) -> None:
+    # Only patch an index that saw every earlier change; otherwise drop it
+    with _indexes_lock:
+        index = _indexes.get(owner_id)
+        if index is None:
+            return
+        if version is None or index.version is None or version != index.version + 1:
+            del _indexes[owner_id]
+            return
+        index.version = version
+    change(index)
+
+
+def title_saved(owner_id, version: Optional[int], pk: int, title: str) -> None:
+    """Record a created or renamed note; ``version`` is the bumped TITLES version."""
+    _apply(owner_id, version, lambda index: index.put(pk, title))
+
+
+def title_deleted(owner_id, version: Optional[int], pk: int) -> None:
+    _apply(owner_id, version, lambda index: index.remove(pk))
+
+
+def clear_title_indexes() -> None:
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def suggest_titles(owner_id, query: str, limit: int = DEFAULT_SUGGEST_LIMIT, fuzzy: bool = True) -> list[dict]:
+    """Autocomplete matches for ``query`` as ``{"id", "title", "match"}`` dicts."""
+    if not query or not query.strip():
+        return []
+    limit = max(1, min(limit, MAX_SUGGEST_LIMIT))
+    return get_title_index(owner_id).suggest(query, limit, fuzzy)
@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, instrumentation, views
+
+# Serve the JSON API from the async views when running under ASGI
+api = async_views if getattr(settings, "NOTES_ASYNC_API", False) else views
 
 
 app_name = "notes"
@@ -12,9 +16,26 @@ urlpatterns = [
     path("<int:pk>/edit/", views.NoteUpdateView.as_view(), name="edit"),
     path("<int:pk>/delete/", views.NoteDeleteView.as_view(), name="delete"),
     # API endpoints (merged for simplicity)
-    path("api/notes/", views.NotesListCreate.as_view(), name="api_notes_list_create"),
-    path("api/notes/<int:pk>/", views.NotesDetail.as_view(), name="api_notes_detail"),
-    path("api/notes/preview/", views.NotesPreview.as_view(), name="api_notes_preview"),
-    path("api/notes/import_url/", views.NotesImportUrl.as_view(), name="api_notes_import_url"),
+    path("api/notes/", api.NotesListCreate.as_view(), name="api_notes_list_create"),
+    path("api/notes/changes/", views.NotesChanges.as_view(), name="api_notes_changes"),
+    path("api/notes/search/", views.NotesSearch.as_view(), name="api_notes_search"),
+    path("api/notes/titles/", views.NotesTitles.as_view(), name="api_notes_titles"),
+    path("api/notes/titles/suggest/", views.NotesTitleSuggest.as_view(), name="api_notes_title_suggest"),
+    path("api/notes/<int:pk>/", api.NotesDetail.as_view(), name="api_notes_detail"),
+    path("api/notes/<int:pk>/revisions/", views.NoteRevisions.as_view(), name="api_note_revisions"),
+    path("api/notes/<int:pk>/revisions/diff/", views.NoteRevisionDiff.as_view(), name="api_note_revision_diff"),
+    path(
+        "api/notes/<int:pk>/revisions/<int:version>/",
+        views.NoteRevisionDetail.as_view(),
+        name="api_note_revision_detail",
+    ),
+    path("api/notes/preview/", api.NotesPreview.as_view(), name="api_notes_preview"),
+    path("api/notes/import_url/", api.NotesImportUrl.as_view(), name="api_notes_import_url"),
+    path("api/notes/import_urls/", views.NotesImportUrls.as_view(), name="api_notes_import_urls"),
+    path("api/jobs/<int:pk>/", views.ImportJobStatus.as_view(), name="api_import_job"),
     path("api/notes/export/", views.NotesExport.as_view(), name="api_notes_export"),
+    path("api/notes/import/", views.NotesImport.as_view(), name="api_notes_import"),
+    path("api/notes/batch/", views.NotesBatch.as_view(), name="api_notes_batch"),
+    path("api/graph/", views.NotesGraph.as_view(), name="api_graph"),
+    path("metrics", instrumentation.metrics_view, name="metrics"),
 ]
@@ -1,8 +1,16 @@
+import hashlib
 import re
+import threading
+from collections import OrderedDict
 from typing import Iterable, Optional
 
+from .instrumentation import RENDER, timed
+
 WIKILINK_RE = re.compile(r"\[\[([^\[\]]+)\]\]")
 
+RENDER_CACHE_PREFIX = "notes:render:v1:"
+RENDER_CACHE_TIMEOUT = 7 * 24 * 3600
+
 
 def extract_wikilinks(text: str) -> list[str]:
     if not text:
@@ -10,41 +18,254 @@ def extract_wikilinks(text: str) -> list[str]:
     return list({m.group(1).strip(): None for m in WIKILINK_RE.finditer(text)}.keys())
 
 
+def substitute_wikilinks(text: str, title_map: dict) -> str:
+    """Replace [[Title]] with an anchor to the resolved note id, or plain text.
+
+    ``title_map`` maps titles to note ids (missing titles stay unlinked).
+    """
+    def repl(match):
+        title = (match.group(1) or '').strip()
+        target = title_map.get(title)
+        if target:
+            return f'<a href="/{target}/" data-wikilink="{title}">{title}</a>'
+        return title
+
+    return WIKILINK_RE.sub(repl, text or '')
+
+
+def render_cache_key(text: str, title_map: dict) -> str:
+    """Cache key for rendered note HTML.
+
+    The key covers the raw text and the resolved link targets, so creating,
+    renaming or deleting a linked note yields a different key and the stale
+    entry is simply never read again.
+    """
+    h = hashlib.sha256((text or '').encode('utf-8'))
+    for title, pk in sorted(title_map.items()):
+        h.update(f"\0{title}\0{pk}".encode('utf-8'))
+    return RENDER_CACHE_PREFIX + h.hexdigest()
+
+
+def render_wikilinked(text: str, title_map: dict) -> str:
+    """Render markdown with resolved wikilinks, memoized in the Django cache."""
+    from django.conf import settings
+    from django.core.cache import caches
+
+    if not text:
+        return ''
+    cache = caches[getattr(settings, 'NOTES_RENDER_CACHE_ALIAS', 'default')]
+    key = render_cache_key(text, title_map)
+    html = cache.get(key)
+    if html is None:
+        html = render_markdown_safe(substitute_wikilinks(text, title_map))
+        cache.set(key, html, getattr(settings, 'NOTES_RENDER_CACHE_TIMEOUT', RENDER_CACHE_TIMEOUT))
+    return html
+
+
+FENCE_RE = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+
+
+def split_markdown_blocks(text: str) -> list[str]:
+    """Split markdown into top-level blocks separated by blank lines.
+
+    Fenced code blocks are kept whole even if they contain blank lines. Blocks
+    are rendered independently, so constructs that span blocks (reference
+    links, footnotes) only resolve within their own block.
+    """
+    blocks: list[str] = []
+    current: list[str] = []
+    fence = None
+    for line in (text or '').split('\n'):
+        m = FENCE_RE.match(line)
+        if fence:
+            current.append(line)
+            if m and m.group(1)[0] == fence[0] and len(m.group(1)) >= len(fence):
+                fence = None
+            continue
+        if m:
+            fence = m.group(1)
+            current.append(line)
+        elif line.strip():
+            current.append(line)
+        elif current:
+            blocks.append('\n'.join(current))
+            current = []
+    if current:
+        blocks.append('\n'.join(current))
+    return blocks
+
+
+def render_blocks(text: str, title_map: dict) -> list[tuple[str, str, str]]:
+    """Split ``text`` into blocks and return ``(block_id, block, title_map)``.
+
+    Block ids hash the block source plus its resolved link targets, so an id
+    stays stable while neither changes; repeated identical blocks get a
+    numeric suffix to keep ids unique within a document.
+    """
+    out = []
+    seen: dict[str, int] = {}
+    for block in split_markdown_blocks(text):
+        block_map = {t: title_map[t] for t in extract_wikilinks(block) if t in title_map}
+        h = hashlib.sha1(block.encode('utf-8'))
+        for title, pk in sorted(block_map.items()):
+            h.update(f"\0{title}\0{pk}".encode('utf-8'))
+        block_id = 'b' + h.hexdigest()[:16]
+        n = seen.get(block_id, 0) + 1
+        seen[block_id] = n
+        if n > 1:
+            block_id = f"{block_id}-{n}"
+        out.append((block_id, block, block_map))
+    return out
+
+
+MARKDOWN_EXTENSIONS = ['extra', 'sane_lists', 'smarty', 'codehilite']
+ALLOWED_TAGS = frozenset([
+    'p', 'br', 'a', 'strong', 'em', 'code', 'pre',
+    'ul', 'ol', 'li', 'h1', 'h2', 'h3', 'blockquote'
+])
+ALLOWED_ATTRS = {
+    'a': ['href', 'title', 'rel', 'data-wikilink'],
+    'code': ['class'],
+}
+
+RENDER_LRU_MAX_ENTRIES = 1024
+RENDER_LRU_MAX_BYTES = 16 * 1024 * 1024
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by entry count and total value size.
+
+    Values are strings; their length is used as the byte estimate. Values
+    larger than ``max_bytes`` are never stored.
+    """
+
+    def __init__(self, max_entries: int = RENDER_LRU_MAX_ENTRIES, max_bytes: int = RENDER_LRU_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[object, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value: str) -> None:
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._data[key] = value
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
+
+
+_render_lru: Optional[LRUCache] = None
+_pipeline_local = threading.local()
+_pipeline_unavailable = False
+
+
+def get_render_lru() -> LRUCache:
+    global _render_lru
+    if _render_lru is None:
+        from django.conf import settings
+
+        _render_lru = LRUCache(
+            max_entries=getattr(settings, 'NOTES_RENDER_LRU_ENTRIES', RENDER_LRU_MAX_ENTRIES),
+            max_bytes=getattr(settings, 'NOTES_RENDER_LRU_BYTES', RENDER_LRU_MAX_BYTES),
+        )
+    return _render_lru
+
+
+def render_cache_info() -> dict:
+    return get_render_lru().info()
+
+
+def _markdown_pipeline():
+    """Return this thread's pre-configured (Markdown, Cleaner) pair.
+
+    Neither object is thread-safe, so each thread builds its own once and
+    reuses it. Returns None when python-markdown or bleach is unavailable.
+    """
+    global _pipeline_unavailable
+    if _pipeline_unavailable:
+        return None
+    pipeline = getattr(_pipeline_local, 'pipeline', None)
+    if pipeline is None:
+        try:
+            import markdown  # type: ignore
+            from bleach.sanitizer import Cleaner  # type: ignore
+
+            pipeline = (
+                markdown.Markdown(extensions=MARKDOWN_EXTENSIONS, output_format='html5'),
+                Cleaner(tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS),
+            )
+        except Exception:
+            _pipeline_unavailable = True
+            return None
+        _pipeline_local.pipeline = pipeline
+    return pipeline
+
+
 def render_markdown_safe(text: str) -> str:
     """Render markdown to safe HTML.
 
     Tries to use python-markdown + bleach if available, otherwise falls back to a
-    tiny renderer supporting headings, emphasis, code, and line breaks.
+    tiny renderer supporting headings, emphasis, code, and line breaks. Output
+    is memoized in a bounded in-process LRU keyed on the text hash.
     """
     if not text:
         return ""
+    with timed(RENDER):
+        lru = get_render_lru()
+        key = hashlib.sha256(text.encode('utf-8')).digest()
+        html = lru.get(key)
+        if html is None:
+            html = _render_markdown_uncached(text)
+            lru.set(key, html)
+    return html
+
 
+def _render_markdown_uncached(text: str) -> str:
     # Try: markdown + bleach
-    try:
-        import markdown  # type: ignore
-        import bleach  # type: ignore
-
-        html = markdown.markdown(
-            text,
-            extensions=[
-                'extra',
-                'sane_lists',
-                'smarty',
-                'codehilite',
-            ],
-            output_format='html5',
-        )
-        allowed_tags = [
-            'p', 'br', 'a', 'strong', 'em', 'code', 'pre',
-            'ul', 'ol', 'li', 'h1', 'h2', 'h3', 'blockquote'
-        ]
-        allowed_attrs = {
-            'a': ['href', 'title', 'rel', 'data-wikilink'],
-            'code': ['class'],
-        }
-        return bleach.clean(html, tags=allowed_tags, attributes=allowed_attrs)
-    except Exception:
-        pass
+    pipeline = _markdown_pipeline()
+    if pipeline is not None:
+        md, cleaner = pipeline
+        try:
+            return cleaner.clean(md.reset().convert(text))
+        except Exception:
+            pass
 
     # Fallback: minimal, escape then apply a few rules
     def escape(s: str) -> str:
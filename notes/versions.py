@@ -0,0 +1,46 @@
+"""Per-owner version counters kept in the Django cache.
+
+A counter is bumped whenever the data it guards changes, so derived data can
+be cached under ``(owner, version)`` keys and never needs explicit deletion.
+Missing counters (first use, cache flush, eviction) are seeded from the clock,
+so a restarted counter never repeats a version that is still cached elsewhere.
+"""
+import time
+from typing import Optional
+
+from django.core.cache import cache
+
+GRAPH = "graph"
+TITLES = "titles"
+
+
+def _key(scope: str, owner_id) -> str:
+    return f"notes:version:{scope}:{owner_id}"
+
+
+def _seed() -> int:
+    return time.time_ns() // 1000
+
+
+def get_version(scope: str, owner_id) -> int:
+    key = _key(scope, owner_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _seed(), None)
+        version = cache.get(key) or _seed()
+    return version
+
+
+def bump_version(scope: str, owner_id) -> Optional[int]:
+    """Advance the counter; returns the new version, or None if it was reseeded."""
+    key = _key(scope, owner_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _seed(), None)
+        return None
+
+
+def bump_versions(owner_id, *scopes: str) -> None:
+    for scope in scopes:
+        bump_version(scope, owner_id)
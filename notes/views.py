@@ -3,28 +3,63 @@ from django.urls import reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.db import OperationalError, ProgrammingError, IntegrityError
 from django.views import View
-from django.http import JsonResponse, HttpRequest
+from django.http import JsonResponse, HttpRequest, Http404
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse
-from io import BytesIO
+from django.http import StreamingHttpResponse
 import zipfile
+import zlib
 import re
-from datetime import datetime
 
+from .bulk import BatchError, apply_batch, create_notes_bulk
+from .changes import changes_since, current_seq, parse_since
+from .conditional import (
+    collection_etag,
+    is_conditional,
+    not_modified,
+    note_etag,
+    note_page_etag,
+    requested_version,
+    set_validators,
+)
 from .models import Note
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page, parse_fields, parse_page_size
+from .revisions import diff_texts, get_revision, list_revisions, state_at
+from .search import search_notes, MAX_LIMIT
+from .textpatch import apply_patch
 
 
 class NoteListView(LoginRequiredMixin, ListView):
     model = Note
     context_object_name = "notes"
+    template_name = "notes/note_list.html"
 
     def get_queryset(self):
-        qs = Note.objects.filter(owner=self.request.user)
+        qs = Note.objects.filter(owner=self.request.user).only("id", "title", "updated_at")
         q = (self.request.GET.get('q') or '').strip()
+        self.next_cursor = None
         if q:
-            qs = qs.filter(models.Q(title__icontains=q) | models.Q(content__icontains=q))
-        return qs
+            # Ranked full-text hits; keep the rank order and attach snippets
+            hits = search_notes(self.request.user, q, limit=MAX_LIMIT)
+            by_id = qs.in_bulk([h["id"] for h in hits])
+            notes = []
+            for h in hits:
+                note = by_id.get(h["id"])
+                if note:
+                    note.search_snippet = h["snippet"]
+                    notes.append(note)
+            return notes
+        try:
+            notes, self.next_cursor = keyset_page(qs, self.request.GET.get("cursor"), DEFAULT_PAGE_SIZE)
+        except ValueError:
+            raise Http404("Invalid cursor")
+        return notes
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["next_cursor"] = self.next_cursor
+        ctx["is_first_page"] = not self.request.GET.get("cursor")
+        return ctx
 
 
 class NoteDetailView(LoginRequiredMixin, DetailView):
@@ -33,21 +68,55 @@ class NoteDetailView(LoginRequiredMixin, DetailView):
     def get_queryset(self):
         return Note.objects.filter(owner=self.request.user)
 
+    def get(self, request, *args, **kwargs):
+        from .versions import GRAPH, get_version
+
+        # Read before anything is loaded, so the ETag never claims newer links than the page shows
+        graph_version = get_version(GRAPH, request.user.pk)
+        seq = current_seq(request.user.pk)
+        if is_conditional(request):
+            version = self.get_queryset().filter(pk=kwargs["pk"]).values_list("version", flat=True).first()
+            if version is not None:
+                cached = not_modified(request, note_page_etag(kwargs["pk"], version, seq, graph_version))
+                if cached is not None:
+                    return cached
+        response = super().get(request, *args, **kwargs)
+        return set_validators(response, note_page_etag(self.object.pk, self.object.version, seq, graph_version))
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        ctx["rendered"] = self.object.render_content()
         try:
-            ctx["outbound_links"] = list(self.object.outbound_links.select_related("to_note").all())
-            ctx["inbound_links"] = list(self.object.inbound_links.select_related("from_note").all())
+            # Only the linked notes' ids and titles are shown, never their content
+            outbound = list(
+                self.object.outbound_links.select_related("to_note").only("from_note", "to_note__title")
+            )
+            inbound = list(
+                self.object.inbound_links.select_related("from_note").only("to_note", "from_note__title")
+            )
         except (OperationalError, ProgrammingError):
-            ctx["outbound_links"] = []
-            ctx["inbound_links"] = []
-        # titles for client-side missing-link suggestions
-        ctx["existing_titles"] = list(
-            Note.objects.filter(owner=self.request.user).exclude(pk=self.object.pk).values_list("title", flat=True)
-        )
+            outbound, inbound = None, []
+        ctx["outbound_links"] = outbound or []
+        ctx["inbound_links"] = inbound
+        ctx["rendered"] = self.object.render_content(self._title_map(outbound))
         return ctx
 
+    def _title_map(self, outbound):
+        """The render title map from the outbound links, or None to look titles up.
+
+        Outbound links are the note's resolved wikilinks, except self-links,
+        which are not stored. They are only trusted while the note's link
+        digest matches its text (a failed rebuild clears the digest).
+        """
+        from .links import link_set_hash
+        from .utils import extract_wikilinks
+
+        note = self.object
+        if outbound is None or note.links_hash != link_set_hash(extract_wikilinks(note.content)):
+            return None
+        title_map = {link.to_note.title: link.to_note.pk for link in outbound}
+        title_map[note.title] = note.pk
+        return title_map
+
 
 class NoteCreateView(LoginRequiredMixin, CreateView):
     model = Note
@@ -65,13 +134,6 @@ class NoteCreateView(LoginRequiredMixin, CreateView):
             initial["title"] = title
         return initial
 
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        ctx["existing_titles"] = list(
-            Note.objects.filter(owner=self.request.user).values_list("title", flat=True)
-        )
-        return ctx
-
 
 class NoteUpdateView(LoginRequiredMixin, UpdateView):
     model = Note
@@ -81,13 +143,6 @@ class NoteUpdateView(LoginRequiredMixin, UpdateView):
     def get_queryset(self):
         return Note.objects.filter(owner=self.request.user)
 
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        ctx["existing_titles"] = list(
-            Note.objects.filter(owner=self.request.user).exclude(pk=self.object.pk).values_list("title", flat=True)
-        )
-        return ctx
-
 
 class NoteDeleteView(LoginRequiredMixin, DeleteView):
     model = Note
@@ -109,6 +164,14 @@ def _parse_json(request: HttpRequest):
     return {}
 
 
+def _serialize_note_row(row: dict, fields) -> dict:
+    out = {}
+    for f in fields:
+        v = row[f]
+        out[f] = v.isoformat() if hasattr(v, "isoformat") else v
+    return out
+
+
 class ApiView(View):
     def dispatch(self, request: HttpRequest, *args, **kwargs):
         if not request.user.is_authenticated:
@@ -119,21 +182,30 @@ class ApiView(View):
 @method_decorator(csrf_exempt, name="dispatch")
 class NotesListCreate(ApiView):
     def get(self, request: HttpRequest):
-        qs = Note.objects.filter(owner=request.user).order_by('-updated_at')
+        try:
+            fields = parse_fields(request.GET.get("fields"))
+            limit = parse_page_size(request.GET.get("limit"))
+        except ValueError as e:
+            return JsonResponse({"detail": str(e)}, status=400)
+        etag = collection_etag(request)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        qs = Note.objects.filter(owner=request.user).values(*set(fields) | {"id", "updated_at"})
         q = request.GET.get("q")
+        next_cursor = None
         if q:
-            qs = qs.filter(title__icontains=q)
-        data = [
-            {
-                "id": n.id,
-                "title": n.title,
-                "content": n.content,
-                "created_at": n.created_at.isoformat(),
-                "updated_at": n.updated_at.isoformat(),
-            }
-            for n in qs
-        ]
-        return JsonResponse({"results": data}, status=200)
+            # Ranked search results are a single page
+            hits = search_notes(request.user, q, limit=min(limit, MAX_LIMIT))
+            by_id = {r["id"]: r for r in qs.filter(pk__in=[h["id"] for h in hits])}
+            rows = [by_id[h["id"]] for h in hits if h["id"] in by_id]
+        else:
+            try:
+                rows, next_cursor = keyset_page(qs, request.GET.get("cursor"), limit)
+            except ValueError as e:
+                return JsonResponse({"detail": str(e)}, status=400)
+        data = [_serialize_note_row(r, fields) for r in rows]
+        return set_validators(JsonResponse({"results": data, "next_cursor": next_cursor}, status=200), etag)
 
     def post(self, request: HttpRequest):
         payload = _parse_json(request) if request.content_type == "application/json" else request.POST
@@ -156,12 +228,57 @@ class NotesListCreate(ApiView):
         return JsonResponse({"id": note.id, "title": note.title, "content": note.content}, status=201)
 
 
+class NotesChanges(ApiView):
+    """Delta sync: ``?since=<cursor>`` returns the notes changed or deleted
+    after ``cursor`` (``0`` or absent for everything), one page at a time.
+    Keep requesting with the returned ``cursor`` while ``has_more`` is true.
+    """
+
+    def get(self, request: HttpRequest):
+        try:
+            since = parse_since(request.GET.get("since"))
+            fields = parse_fields(request.GET.get("fields"))
+            limit = parse_page_size(request.GET.get("limit"))
+        except ValueError as e:
+            return JsonResponse({"detail": str(e)}, status=400)
+        return JsonResponse(changes_since(request.user.pk, since, limit, fields), status=200)
+
+
+class NotesSearch(ApiView):
+    def get(self, request: HttpRequest):
+        q = (request.GET.get("q") or "").strip()
+        try:
+            limit = int(request.GET.get("limit") or 20)
+        except ValueError:
+            return JsonResponse({"detail": "invalid limit"}, status=400)
+        hits = search_notes(request.user, q, limit=limit) if q else []
+        data = [
+            {
+                "id": h["id"],
+                "title": h["title"],
+                "snippet": h["snippet"],
+                "rank": h["rank"],
+                "updated_at": h["updated_at"].isoformat() if h["updated_at"] else None,
+            }
+            for h in hits
+        ]
+        return JsonResponse({"results": data}, status=200)
+
+
 @method_decorator(csrf_exempt, name="dispatch")
 class NotesDetail(ApiView):
     def get_object(self, request: HttpRequest, pk: int):
         return Note.objects.filter(owner=request.user, pk=pk).first()
 
     def get(self, request: HttpRequest, pk: int):
+        if is_conditional(request):
+            # Revalidation only needs the version, not the content
+            stamp = Note.objects.filter(owner=request.user, pk=pk).values_list("version", "updated_at").first()
+            if stamp is None:
+                return JsonResponse({"detail": "not found"}, status=404)
+            cached = not_modified(request, note_etag(pk, stamp[0]), stamp[1])
+            if cached is not None:
+                return cached
         note = self.get_object(request, pk)
         if not note:
             return JsonResponse({"detail": "not found"}, status=404)
@@ -169,27 +286,17 @@ class NotesDetail(ApiView):
             "id": note.id,
             "title": note.title,
             "content": note.content,
+            "version": note.version,
             "created_at": note.created_at.isoformat(),
             "updated_at": note.updated_at.isoformat(),
         }
-        return JsonResponse(data, status=200)
+        return set_validators(JsonResponse(data, status=200), note_etag(note.pk, note.version), note.updated_at)
 
     def patch(self, request: HttpRequest, pk: int):
         note = self.get_object(request, pk)
         if not note:
             return JsonResponse({"detail": "not found"}, status=404)
-        payload = _parse_json(request)
-        title = payload.get("title")
-        content = payload.get("content")
-        if title is not None:
-            note.title = (title or '').strip()
-        if content is not None:
-            note.content = content or ''
-        try:
-            note.save()
-        except IntegrityError:
-            return JsonResponse({"detail": "note with same title already exists"}, status=409)
-        return JsonResponse({"id": note.id, "title": note.title, "content": note.content}, status=200)
+        return update_note(request, note, _parse_json(request))
 
     put = patch
 
@@ -197,157 +304,541 @@ class NotesDetail(ApiView):
         note = self.get_object(request, pk)
         if not note:
             return JsonResponse({"detail": "not found"}, status=404)
+        return delete_note(request, note, _parse_json(request))
+
+
+def delete_note(request: HttpRequest, note: Note, payload: dict) -> JsonResponse:
+    """Delete ``note`` unless a precondition names an older version (shared with async views)."""
+    expected = requested_version(request, payload, note.pk, note.version)
+    if expected is None:
         note.delete()
-        return JsonResponse({}, status=204)
+    elif expected != note.version:
+        return _version_conflict(note.pk, note.version)
+    elif not note.delete_if_version(expected):
+        current = Note.objects.filter(pk=note.pk).values_list("version", flat=True).first()
+        if current is None:
+            return JsonResponse({"detail": "not found"}, status=404)
+        return _version_conflict(note.pk, current)
+    return JsonResponse({}, status=204)
+
+
+def _version_conflict(note_pk, version: int) -> JsonResponse:
+    response = JsonResponse({"detail": "version conflict", "id": note_pk, "version": version}, status=409)
+    response["ETag"] = note_etag(note_pk, version)
+    return response
+
+
+class NoteRevisions(ApiView):
+    """A note's past versions, newest first: ``?limit=`` and ``?before=<version>``."""
+
+    def get(self, request: HttpRequest, pk: int):
+        note = Note.objects.filter(owner=request.user, pk=pk).only("id", "version").first()
+        if not note:
+            return JsonResponse({"detail": "not found"}, status=404)
+        try:
+            limit = parse_page_size(request.GET.get("limit"))
+            before = int(request.GET["before"]) if request.GET.get("before") else None
+        except ValueError:
+            return JsonResponse({"detail": "invalid limit or before"}, status=400)
+        data = list_revisions(note, before, limit)
+        data["current_version"] = note.version
+        return JsonResponse(data, status=200)
+
+
+class NoteRevisionDetail(ApiView):
+    def get(self, request: HttpRequest, pk: int, version: int):
+        note = Note.objects.filter(owner=request.user, pk=pk).first()
+        if not note:
+            return JsonResponse({"detail": "not found"}, status=404)
+        found = get_revision(note, version)
+        if found is None:
+            return JsonResponse({"detail": "no such revision"}, status=404)
+        revision, text = found
+        data = {
+            "id": note.pk,
+            "version": revision.version,
+            "title": revision.title,
+            "content": text,
+            "created_at": revision.created_at.isoformat(),
+        }
+        return JsonResponse(data, status=200)
+
+
+class NoteRevisionDiff(ApiView):
+    """Unified diff between two versions: ``?from=<version>&to=<version>``.
+
+    ``to`` defaults to the current version.
+    """
+
+    def get(self, request: HttpRequest, pk: int):
+        note = Note.objects.filter(owner=request.user, pk=pk).first()
+        if not note:
+            return JsonResponse({"detail": "not found"}, status=404)
+        try:
+            old = int(request.GET["from"])
+            new = int(request.GET.get("to") or note.version)
+        except (KeyError, ValueError):
+            return JsonResponse({"detail": "from (and optionally to) must be versions"}, status=400)
+        states = [state_at(note, old), state_at(note, new)]
+        if None in states:
+            return JsonResponse({"detail": "no such revision"}, status=404)
+        (old_title, old_text), (new_title, new_text) = states
+        data = {
+            "id": note.pk,
+            "from": old,
+            "to": new,
+            "title": None if old_title == new_title else {"from": old_title, "to": new_title},
+            "diff": diff_texts(old_text, new_text, f"v{old}", f"v{new}"),
+        }
+        return JsonResponse(data, status=200)
+
+
+def update_note(request: HttpRequest, note: Note, payload: dict) -> JsonResponse:
+    """Apply a PATCH body to ``note`` (shared with async views).
+
+    ``content`` replaces the text, and ``patch`` applies splice operations to
+    it instead (see ``textpatch.py``). A patch needs a precondition (If-Match
+    or ``version``), since its offsets are only meaningful against a known
+    base. With a precondition, a write based on an older version gets 409
+    and the current version, and nothing is saved.
+    """
+    expected = requested_version(request, payload, note.pk, note.version)
+    if expected is not None and expected != note.version:
+        return _version_conflict(note.pk, note.version)
+    title = payload.get("title")
+    content = payload.get("content")
+    patch = payload.get("patch")
+    if patch is not None:
+        if content is not None:
+            return JsonResponse({"detail": "send either content or patch"}, status=400)
+        if expected is None:
+            return JsonResponse({"detail": "patch requires If-Match or version"}, status=428)
+        try:
+            content = apply_patch(note.content, patch)
+        except ValueError as e:
+            return JsonResponse({"detail": str(e)}, status=400)
+    if title is not None:
+        note.title = (title or '').strip()
+    if content is not None:
+        note.content = content or ''
+    try:
+        if expected is None:
+            note.save()
+        elif not note.save_if_version(expected):
+            current = Note.objects.filter(pk=note.pk).values_list("version", flat=True).first()
+            if current is None:
+                return JsonResponse({"detail": "not found"}, status=404)
+            return _version_conflict(note.pk, current)
+    except IntegrityError:
+        return JsonResponse({"detail": "note with same title already exists"}, status=409)
+    data = {"id": note.id, "title": note.title, "version": note.version}
+    if patch is None:
+        data["content"] = note.content
+    response = JsonResponse(data, status=200)
+    response["ETag"] = note_etag(note.pk, note.version)
+    return response
 
 
 @method_decorator(csrf_exempt, name="dispatch")
 class NotesPreview(ApiView):
     def post(self, request: HttpRequest):
-        payload = _parse_json(request)
-        text = (payload.get('text') or '')
-        # Simple per-user rate limit: 60 requests per minute
-        try:
-            from django.core.cache import cache
-            key = f"notes_preview_rate_{request.user.pk}"
-            cnt = cache.get(key, 0)
-            if cnt >= 60:
-                return JsonResponse({'html': '<p class="muted">Rate limited. Try again later.</p>'}, status=429)
-            cache.set(key, cnt + 1, 60)
-        except Exception:
-            pass
-        # Protect server from excessively large previews
-        if len(text) > 200_000:
-            return JsonResponse({'html': '<p class="muted">Preview too large.</p>'}, status=200)
-
-        # Preprocess wikilinks relative to current user (bulk map)
-        from .models import Note
-        from .utils import extract_wikilinks, render_markdown_safe
-
-        titles = extract_wikilinks(text)
-        title_map = {}
-        if titles:
-            title_map = {n.title: n for n in Note.objects.filter(owner=request.user, title__in=titles)}
-
-        def repl(m):
-            title = (m.group(1) or '').strip()
-            target = title_map.get(title)
-            if target:
-                return f'<a href="/{target.pk}/" data-wikilink="{title}">{title}</a>'
-            return title
-        pre = Note.WIKILINK_RE.sub(repl, text)
-        html = render_markdown_safe(pre)
-        return JsonResponse({'html': html})
+        data, status = build_preview(request.user.pk, _parse_json(request))
+        return JsonResponse(data, status=status)
+
+
+def build_preview(owner_id, payload: dict) -> tuple[dict, int]:
+    """Preview response body and status for ``payload`` (shared with async views)."""
+    text = (payload.get('text') or '')
+    blocks_mode = payload.get('mode') == 'blocks'
+
+    def notice(message: str, status: int):
+        html = f'<p class="muted">{message}</p>'
+        if blocks_mode:
+            # Same shape as a rendered preview, so block clients show it too
+            return {'mode': 'blocks', 'blocks': [{'id': 'notice', 'html': html}], 'html': html}, status
+        return {'html': html}, status
+
+    # Simple per-user rate limit: 60 requests per minute
+    try:
+        from django.core.cache import cache
+        key = f"notes_preview_rate_{owner_id}"
+        cnt = cache.get(key, 0)
+        if cnt >= 60:
+            return notice('Rate limited. Try again later.', 429)
+        cache.set(key, cnt + 1, 60)
+    except Exception:
+        pass
+    # Protect server from excessively large previews
+    if len(text) > 200_000:
+        return notice('Preview too large.', 200)
+    known = payload.get('known') or []
+    if blocks_mode and not (isinstance(known, list) and all(isinstance(k, str) for k in known)):
+        return {'detail': 'known must be a list of block ids'}, 400
+
+    # Resolve wikilinks relative to current user (bulk map)
+    from .utils import extract_wikilinks, render_blocks, render_wikilinked
+
+    title_map = Note.title_map(owner_id, extract_wikilinks(text))
+    if blocks_mode:
+        # Block-diff mode: only send HTML for blocks the client doesn't have
+        known = set(known)
+        blocks = []
+        for block_id, block, block_map in render_blocks(text, title_map):
+            if block_id in known:
+                blocks.append({'id': block_id})
+            else:
+                blocks.append({'id': block_id, 'html': render_wikilinked(block, block_map)})
+        return {'mode': 'blocks', 'blocks': blocks}, 200
+    return {'html': render_wikilinked(text, title_map)}, 200
 
 
 @method_decorator(csrf_exempt, name="dispatch")
 class NotesImportUrl(ApiView):
+    """Queue a URL import; returns 202 with a job id to poll.
+
+    With ``NOTES_IMPORT_ASYNC = False`` the import runs inline and returns
+    the created note (201), as before the job queue existed.
+    """
+
     def post(self, request: HttpRequest):
+        from django.conf import settings
+        from .importer import ImportFailed, import_url, is_valid_url
+        from .jobs import QuotaExceeded, enqueue_import
+
         payload = _parse_json(request)
         url = (payload.get('url') or '').strip()
         summarize = bool(payload.get('summarize'))
-        if not url or not re.match(r'^https?://', url):
+        if not is_valid_url(url):
             return JsonResponse({"detail": "valid http(s) url required"}, status=400)
 
-        # Fetch
-        html = ''
-        final_url = url
+        if not getattr(settings, 'NOTES_IMPORT_ASYNC', True):
+            try:
+                note = import_url(request.user, url, summarize)
+            except ImportFailed as e:
+                return JsonResponse({"detail": str(e)}, status=400)
+            return JsonResponse({"id": note.id, "title": note.title}, status=201)
+
         try:
-            import requests
-            headers = {"User-Agent": "NotesBot/1.0 (+https://example.local)"}
-            resp = requests.get(url, headers=headers, timeout=10, allow_redirects=True)
-            resp.raise_for_status()
-            # Limit to 2MB
-            html = resp.text[:2_000_000]
-            final_url = resp.url or url
-        except Exception as e:
-            return JsonResponse({"detail": f"fetch failed: {e}"}, status=400)
-
-        # Extract main content
-        title = ''
-        main_html = ''
+            job = enqueue_import(request.user, url, summarize)
+        except QuotaExceeded as e:
+            return JsonResponse({"detail": str(e)}, status=429)
+        return JsonResponse(_serialize_job(job), status=202)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class NotesImportUrls(ApiView):
+    """Import a list of URLs in one request; returns a result per URL."""
+
+    def post(self, request: HttpRequest):
+        from django.conf import settings
+        from .importer import import_urls, is_valid_url
+
+        payload = _parse_json(request)
+        urls = payload.get('urls')
+        if not isinstance(urls, list) or not urls:
+            return JsonResponse({"detail": "urls must be a non-empty list"}, status=400)
+        max_urls = getattr(settings, 'NOTES_IMPORT_MAX_URLS', 50)
+        if len(urls) > max_urls:
+            return JsonResponse({"detail": f"at most {max_urls} urls per request"}, status=413)
+        urls = [u.strip() if isinstance(u, str) else '' for u in urls]
+        # Fetch each distinct valid URL once
+        unique = list(dict.fromkeys(u for u in urls if is_valid_url(u)))
         try:
-            from readability import Document  # type: ignore
-            doc = Document(html)
-            title = (doc.short_title() or '').strip()
-            main_html = (doc.summary(html_partial=True) or '')
-        except Exception:
-            # Fallback: naive title
-            m = re.search(r'<title>(.*?)</title>', html, flags=re.I | re.S)
-            if m:
-                title = re.sub(r'\s+', ' ', m.group(1)).strip()
-            # As last resort keep full html
-            main_html = html
+            imported = import_urls(request.user, unique, bool(payload.get('summarize')))
+        except BatchError as e:
+            return JsonResponse({"detail": "import rejected", "errors": e.errors}, status=409)
+        by_url = {r["url"]: r for r in imported}
+        results = [
+            by_url.get(u) or {"url": u, "status": "failed", "error": "valid http(s) url required"}
+            for u in urls
+        ]
+        # Duplicate URLs share one result, so count notes rather than rows
+        created = len({r["id"] for r in results if r["status"] == "created"})
+        return JsonResponse({"created": created, "results": results}, status=201 if created else 400)
 
-        if not title:
-            title = 'Imported Note'
 
-        # Convert to markdown (best-effort)
-        markdown_body = ''
+def _serialize_job(job) -> dict:
+    from django.urls import reverse
+
+    return {
+        "job_id": job.pk,
+        "status": job.status,
+        "url": job.url,
+        "attempts": job.attempts,
+        "note_id": job.note_id,
+        "error": job.error,
+        "status_url": reverse("notes:api_import_job", args=[job.pk]),
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat(),
+    }
+
+
+class ImportJobStatus(ApiView):
+    def get(self, request: HttpRequest, pk: int):
+        from .models import ImportJob
+
+        job = ImportJob.objects.filter(owner=request.user, pk=pk).first()
+        if not job:
+            return JsonResponse({"detail": "not found"}, status=404)
+        return JsonResponse(_serialize_job(job), status=200)
+
+
+class NotesGraph(ApiView):
+    """The owner's link graph, or the ``hops``-neighbourhood of ``note``.
+
+    ``format=compact`` returns parallel id/title arrays plus CSR adjacency
+    (``offsets``/``targets`` as indices) instead of node/edge objects.
+    """
+
+    def get(self, request: HttpRequest):
+        from .graph import (
+            MAX_HOPS, encode_compact, encode_json, load_graph, neighbourhood, node_index, subgraph,
+        )
+
+        graph = load_graph(request.user.pk)
+        indices = list(range(len(graph["ids"])))
+        note_id = request.GET.get("note")
+        if note_id:
+            try:
+                note_id = int(note_id)
+                hops = max(0, min(int(request.GET.get("hops") or 1), MAX_HOPS))
+            except ValueError:
+                return JsonResponse({"detail": "invalid note or hops"}, status=400)
+            start = node_index(graph, note_id)
+            if start is None:
+                return JsonResponse({"detail": "not found"}, status=404)
+            indices = neighbourhood(graph, start, hops)
+        ids, titles, adj = subgraph(graph, indices)
+        encode = encode_compact if request.GET.get("format") == "compact" else encode_json
+        data = encode(ids, titles, adj)
+        data["version"] = graph["version"]
+        return JsonResponse(data, status=200)
+
+
+class NotesTitles(ApiView):
+    """Every title of the user, for client-side missing-link checks.
+
+    Versioned by ``ETag``: browsers revalidate with ``If-None-Match`` and get
+    a 304 without the titles being loaded. The body is served gzipped when
+    the client accepts it.
+    """
+
+    def get(self, request: HttpRequest):
+        from django.http import HttpResponse, HttpResponseNotModified
+        from django.utils.cache import patch_vary_headers
+        from .titles import title_etag, title_index
+        from .versions import TITLES, get_version
+
+        etag = title_etag(get_version(TITLES, request.user.pk))
+        if etag in request.headers.get("If-None-Match", ""):
+            response = HttpResponseNotModified()
+        else:
+            index = title_index(request.user.pk)
+            etag = index["etag"]
+            if "gzip" in request.headers.get("Accept-Encoding", ""):
+                response = HttpResponse(index["gzip"], content_type="application/json")
+                response["Content-Encoding"] = "gzip"
+            else:
+                response = HttpResponse(index["body"], content_type="application/json")
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        patch_vary_headers(response, ("Accept-Encoding", "Cookie"))
+        return response
+
+
+class NotesTitleSuggest(ApiView):
+    """Wikilink autocomplete: titles matching ``q`` by prefix, word prefix or
+    (unless ``fuzzy=0``) fuzzily, best ``limit`` first.
+    """
+
+    def get(self, request: HttpRequest):
+        from .titles import DEFAULT_SUGGEST_LIMIT, suggest_titles
+
         try:
-            import markdownify  # type: ignore
-            markdown_body = markdownify.markdownify(main_html or html)
-        except Exception:
-            # Simple strip tags
-            markdown_body = re.sub(r'<[^>]+>', '', main_html or html)
+            limit = int(request.GET.get("limit") or DEFAULT_SUGGEST_LIMIT)
+        except ValueError:
+            return JsonResponse({"detail": "invalid limit"}, status=400)
+        q = (request.GET.get("q") or "").strip()
+        fuzzy = request.GET.get("fuzzy") not in ("0", "false")
+        return JsonResponse({"results": suggest_titles(request.user.pk, q, limit, fuzzy)}, status=200)
 
-        header = f"Source: {final_url}\nFetched: {datetime.utcnow().isoformat()}Z\n\n# {title}\n\n"
-        content = header + (markdown_body or '').strip()
 
-        # Optional summarize
-        if summarize:
+@method_decorator(csrf_exempt, name="dispatch")
+class NotesBatch(ApiView):
+    """Apply ``{"operations": [...]}`` create/update/delete operations in one
+    transaction (see ``bulk.apply_batch``); any invalid operation rejects the
+    whole batch with per-operation errors.
+    """
+
+    def post(self, request: HttpRequest):
+        from django.conf import settings
+
+        payload = _parse_json(request)
+        operations = payload.get("operations") if isinstance(payload, dict) else None
+        if not isinstance(operations, list):
+            return JsonResponse({"detail": "operations must be a list"}, status=400)
+        max_ops = getattr(settings, "NOTES_BATCH_MAX_OPERATIONS", 1000)
+        if len(operations) > max_ops:
+            return JsonResponse({"detail": f"at most {max_ops} operations per batch"}, status=413)
+        try:
+            results = apply_batch(request.user, operations)
+        except BatchError as e:
+            statuses = {err["status"] for err in e.errors}
+            status = statuses.pop() if len(statuses) == 1 else 400
+            return JsonResponse({"detail": "batch rejected", "errors": e.errors}, status=status)
+        return JsonResponse({"results": results}, status=200)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class NotesImport(ApiView):
+    """Bulk import from a ZIP of ``.md`` files or NDJSON ``{"title", "content"}`` lines.
+
+    The body may be a multipart upload (field ``file``) or sent raw with an
+    ``application/zip`` / ``application/x-ndjson`` content type.
+    """
+
+    read_chunk = 64 * 1024
+    max_errors = 100
+
+    def post(self, request: HttpRequest):
+        from django.conf import settings
+
+        self.max_bytes = getattr(settings, 'NOTES_IMPORT_MAX_BYTES', 200 * 1024 * 1024)
+        self.max_notes = getattr(settings, 'NOTES_IMPORT_MAX_NOTES', 100_000)
+        self.max_note_bytes = getattr(settings, 'NOTES_IMPORT_MAX_NOTE_BYTES', 5 * 1024 * 1024)
+        self.errors = []
+
+        ctype = request.content_type or ''
+        if ctype == 'multipart/form-data':
+            upload = request.FILES.get('file')
+            if not upload:
+                return JsonResponse({"detail": "file is required"}, status=400)
+            if upload.size > self.max_bytes:
+                return JsonResponse({"detail": "archive too large"}, status=413)
+            name = (upload.name or '').lower()
+            is_zip = name.endswith('.zip') or upload.content_type == 'application/zip'
+            source = upload
+        elif ctype in ('application/zip', 'application/x-zip-compressed'):
+            is_zip = True
+            source = self._spool_body(request)
+            if source is None:
+                return JsonResponse({"detail": "archive too large"}, status=413)
+        elif ctype in ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines'):
+            is_zip = False
+            source = request
+        else:
+            return JsonResponse({"detail": "expected a ZIP archive or NDJSON"}, status=415)
+
+        if is_zip:
             try:
-                summary = self._summarize(markdown_body[:8000])
-                if summary:
-                    content += f"\n\n---\n## Summary\n\n{summary}\n"
-            except Exception:
-                pass
+                archive = zipfile.ZipFile(source)
+            except zipfile.BadZipFile:
+                return JsonResponse({"detail": "invalid zip archive"}, status=400)
+            items = self._iter_zip(archive)
+        else:
+            items = self._iter_ndjson(source)
 
-        # Create note (dedupe title if needed)
-        base, t = title, title
-        suffix = 1
+        try:
+            result = create_notes_bulk(request.user, self._limit(items))
+        except BatchError as e:
+            return JsonResponse({"detail": "import rejected", "errors": e.errors}, status=409)
+        return JsonResponse({
+            "created": len(result["created"]),
+            "renamed": result["renamed"],
+            "skipped": result["skipped"][:self.max_errors],
+            "errors": self.errors[:self.max_errors],
+        }, status=201)
+
+    def _spool_body(self, request):
+        import tempfile
+
+        buf = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        total = 0
         while True:
-            try:
-                note = Note.objects.create(owner=request.user, title=t[:200], content=content)
+            chunk = request.read(self.read_chunk)
+            if not chunk:
                 break
-            except IntegrityError:
-                suffix += 1
-                cut = 200 - len(f" ({suffix})")
-                t = f"{base[:cut]} ({suffix})"
-                if suffix > 1000:
-                    return JsonResponse({"detail": "too many duplicates"}, status=409)
+            total += len(chunk)
+            if total > self.max_bytes:
+                return None
+            buf.write(chunk)
+        buf.seek(0)
+        return buf
+
+    def _limit(self, items):
+        for i, item in enumerate(items):
+            if i >= self.max_notes:
+                self.errors.append(f"stopped after {self.max_notes} notes")
+                return
+            yield item
+
+    def _iter_zip(self, archive):
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith('.md'):
+                continue
+            if info.file_size > self.max_note_bytes:
+                self.errors.append(f"{info.filename}: too large")
+                continue
+            base = info.filename.rsplit('/', 1)[-1][:-3]
+            # Strip the "<id>-" prefix NotesExport puts on file names
+            title = re.sub(r'^\d+-', '', base).strip() or base
+            try:
+                content = archive.read(info).decode('utf-8', errors='replace')
+            except (zipfile.BadZipFile, zlib.error) as e:
+                # A corrupt member only skips that note; the stream has already started
+                self.errors.append(f"{info.filename}: unreadable ({e})")
+                continue
+            yield title, content
+
+    def _iter_ndjson(self, source):
+        import json
+
+        for lineno, line in enumerate(source, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if len(line) > self.max_note_bytes:
+                self.errors.append(f"line {lineno}: too large")
+                continue
+            try:
+                obj = json.loads(line)
+                title = (obj.get('title') or '').strip()
+                content = obj.get('content') or ''
+            except (ValueError, AttributeError):
+                self.errors.append(f"line {lineno}: invalid JSON object")
+                continue
+            if not title or not isinstance(content, str):
+                self.errors.append(f"line {lineno}: title and string content required")
+                continue
+            yield title, content
 
-        return JsonResponse({"id": note.id, "title": note.title}, status=201)
 
-    def _summarize(self, text: str) -> str:
-        try:
-            import os
-            import openai  # type: ignore
-            api_key = os.environ.get('OPENAI_API_KEY')
-            if not api_key:
-                raise RuntimeError('no api key')
-            client = openai.OpenAI(api_key=api_key) if hasattr(openai, 'OpenAI') else openai
-            prompt = (
-                "请用中文给出该文章的简要摘要（150~300字），并给出5个要点。\n\n" + text
-            )
-            # Support both new and legacy clients
-            if hasattr(client, 'chat') and hasattr(client.chat, 'completions'):
-                resp = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.4,
-                )
-                return resp.choices[0].message.content.strip()
-            else:
-                # Legacy API (very rough fallback)
-                return ""
-        except Exception:
-            # Fallback: naive summary
-            paras = [p.strip() for p in text.split('\n') if p.strip()]
-            return '\n'.join(paras[:3])
+class _ZipStream:
+    """Write-only sink for ``zipfile`` that hands back what was written so far.
+
+    It has no ``seek``/``tell``, so ``ZipFile`` writes entries with data
+    descriptors and never needs to rewind.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
 
 
 class NotesExport(ApiView):
+    chunk_size = 200
+
     def get(self, request: HttpRequest):
         ids = request.GET.get('ids')
         export_all = request.GET.get('all')
@@ -362,16 +853,46 @@ class NotesExport(ApiView):
         else:
             return JsonResponse({"detail": "specify ids or all=1"}, status=400)
 
-        buf = BytesIO()
-        with zipfile.ZipFile(buf, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
-            for n in qs:
-                name = self._safe_filename(f"{n.pk}-{n.title}.md")
-                zf.writestr(name, n.content or '')
-        buf.seek(0)
-        resp = HttpResponse(buf.read(), content_type='application/zip')
+        include_links = request.GET.get('links') in ('1', 'true')
+        resp = StreamingHttpResponse(
+            self._stream_zip(qs.only('pk', 'title', 'content'), include_links),
+            content_type='application/zip',
+        )
         resp['Content-Disposition'] = 'attachment; filename="notes_export.zip"'
         return resp
 
+    def _stream_zip(self, qs, include_links: bool):
+        """Yield the archive entry by entry; memory stays bounded by one note."""
+        sink = _ZipStream()
+        with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+            for n in qs.iterator(chunk_size=self.chunk_size):
+                name = self._safe_filename(f"{n.pk}-{n.title}.md")
+                zf.writestr(name, n.content or '')
+                yield sink.drain()
+            if include_links:
+                yield from self._write_links_manifest(zf, sink, qs)
+        yield sink.drain()
+
+    def _write_links_manifest(self, zf, sink, qs):
+        """Stream ``links.json``: links whose both ends are in the export."""
+        import json
+        from .models import NoteLink
+
+        exported = qs.order_by().values('pk')
+        links = (
+            NoteLink.objects.filter(from_note__in=exported, to_note__in=exported)
+            .values_list('from_note_id', 'to_note_id')
+            .order_by('from_note_id', 'to_note_id')
+        )
+        with zf.open('links.json', mode='w') as fp:
+            fp.write(b'[')
+            first = True
+            for from_id, to_id in links.iterator(chunk_size=self.chunk_size * 10):
+                fp.write((b'' if first else b',') + json.dumps({"from": from_id, "to": to_id}).encode('utf-8'))
+                first = False
+                yield sink.drain()
+            fp.write(b']')
+
     def _safe_filename(self, s: str) -> str:
         s = re.sub(r'[\\/:*?"<>|]', '_', s)
         return s[:180]